@@ -0,0 +1,643 @@
+"""
+asyncIngest.py
+
+Downloading texts concurrently, and handing each to the processing pool as soon as it has arrived, so the network and the workers are busy at the same time.
+
+Fetching each book in turn with a blocking urlopen(...).read(), and only then starting to tokenise, leaves the workers idle for the whole download and the network idle for the whole tokenisation.  Instead, an asyncio event loop downloads several texts at once (at most a given number of connections at a time), reads each body a block at a time as it arrives, and decodes it incrementally, so a UTF-8 character split between two blocks is decoded whole.  Each text is handed to the pool the moment it is complete, or, given a chunk size, each piece of it is handed over as soon as a safe place to cut it has arrived (see textChunking.py), while the rest is still downloading.  The results come back in the order they finish.
+
+The HTTP client is the standard library's asyncio streams, so there is nothing to install.  It speaks enough HTTP/1.1 for plain text: redirects, and bodies sized by Content-Length, chunked, or ended by closing the connection.
+
+Usage:
+  async for url, index, result in asyncIngest.ingest(urls, task, pool):   # index is the piece of the text, 0 if it was handed over whole.
+    ...
+
+  python3 asyncIngest.py [--connections n] [--latency seconds] [--rate bytes/s] [--chunk-size characters] [source ...]
+    Serve the sources from a local stand-in server, and compare the time to the first result and the total time against fetching them one after another.
+
+Each source is a path to a UTF-8 text file, or the name of a text in the corpus store (the four sample books by default).
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import asyncio # The event loop
+import codecs # Incremental UTF-8 decoding
+import http.server # The local stand-in server
+import os # Filesystem paths
+import ssl # HTTPS sources
+import sys # Command line arguments
+import threading # Running the stand-in server alongside
+import time # time library
+import urllib.parse # Splitting and joining URLs
+import urllib.request # The serial fetch, for comparison
+from collections import Counter # Counting words in the benchmark task
+import frequencyMerge # Compact counts to send back from workers
+import textChunking # Splitting texts into independently tokenisable pieces
+
+# The most connections open at once, when not given.
+defaultConnections = int(os.environ.get("NATLANG_INGEST_CONNECTIONS", "4"))
+
+# How much of a body to read at a time, in bytes.
+blockSize = 64 * 1024
+
+# How many redirects to follow before giving up.
+maxRedirects = 5
+
+async def openResponse(url):
+  """
+  This method sends a GET request, following redirects, and reads the response's status and headers.
+
+  Parameters
+  ----------
+  url: string
+    The http or https URL.
+
+  Returns
+  -------
+  tuple
+    The stream reader (positioned at the start of the body), its writer (to close when done), and the headers, with lower-cased names.
+  """
+  for redirect in range(maxRedirects + 1):
+    parts = urllib.parse.urlsplit(url)
+    secure = parts.scheme == "https"
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or (443 if secure else 80), ssl=ssl.create_default_context() if secure else None)
+    target = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+    writer.write(("GET " + target + " HTTP/1.1\r\nHost: " + parts.netloc + "\r\nUser-Agent: Mozilla/5.0\r\nAccept-Encoding: identity\r\nConnection: close\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    statusLine = (await reader.readline()).decode("latin-1").split()
+    headers = {}
+    line = await reader.readline()
+    while line.strip():
+      name, _, value = line.decode("latin-1").partition(":")
+      headers[name.strip().lower()] = value.strip()
+      line = await reader.readline()
+    status = int(statusLine[1]) if len(statusLine) > 1 and statusLine[1].isdigit() else 0
+    if status in (301, 302, 303, 307, 308) and "location" in headers:
+      writer.close()
+      url = urllib.parse.urljoin(url, headers["location"])
+      continue
+    if status != 200:
+      writer.close()
+      raise OSError("HTTP " + (" ".join(statusLine[1:]) or "response unreadable") + " from " + url)
+    return reader, writer, headers
+  raise OSError("More than " + str(maxRedirects) + " redirects from " + url)
+
+async def readSized(reader, size):
+  """
+  This method reads a known number of bytes of a body, a block at a time.
+
+  Parameters
+  ----------
+  reader: asyncio.StreamReader
+    The connection.
+  size: int
+    How many bytes to read.
+
+  Yields
+  ------
+  bytes
+    The blocks, in order.
+  """
+  while size > 0:
+    data = await reader.read(min(size, blockSize))
+    if not data:
+      raise OSError("The connection closed " + str(size) + " bytes before the end of the body")
+    size -= len(data)
+    yield data
+
+async def readBody(reader, headers):
+  """
+  This method reads a response's body a block at a time, as it arrives.
+
+  Parameters
+  ----------
+  reader: asyncio.StreamReader
+    The connection, positioned at the start of the body.
+  headers: dict
+    The response's headers.
+
+  Yields
+  ------
+  bytes
+    The body, in blocks of any size.
+  """
+  if "chunked" in headers.get("transfer-encoding", "").lower():
+    size = int((await reader.readline()).split(b";")[0], 16)
+    while size > 0:
+      async for data in readSized(reader, size):
+        yield data
+      await reader.readline() # The line break after the chunk.
+      size = int((await reader.readline()).split(b";")[0], 16)
+    line = await reader.readline()
+    while line.strip(): # Trailers.
+      line = await reader.readline()
+  elif "content-length" in headers:
+    async for data in readSized(reader, int(headers["content-length"])):
+      yield data
+  else:
+    data = await reader.read(blockSize)
+    while data:
+      yield data
+      data = await reader.read(blockSize)
+
+async def streamText(url):
+  """
+  This method downloads a UTF-8 text, decoding it as it arrives.
+
+  Parameters
+  ----------
+  url: string
+    Where to download it from.
+
+  Yields
+  ------
+  string
+    The text, in blocks of any size.  A leading byte order mark is dropped, as corpusStore.addText drops it.
+  """
+  reader, writer, headers = await openResponse(url)
+  decoder = codecs.getincrementaldecoder("utf-8-sig")()
+  try:
+    async for data in readBody(reader, headers):
+      text = decoder.decode(data) # Holds back the start of a character split between blocks.
+      if text:
+        yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+      yield text
+  finally:
+    writer.close()
+
+def settle(future, result, error):
+  """
+  This method, run in the event loop, completes the future of a task handed to the pool.
+
+  Parameters
+  ----------
+  future: asyncio.Future
+    The task's future.
+  result: object
+    What the task returned.
+  error: Exception
+    What the task raised, or None.
+  """
+  if future.done(): # Cancelled while it ran.
+    return
+  if error is not None:
+    future.set_exception(error)
+  else:
+    future.set_result(result)
+
+def deliver(loop, future, result, error):
+  """
+  This method, run in the pool's result thread, passes a task's outcome to the event loop.
+
+  Parameters
+  ----------
+  loop: asyncio.AbstractEventLoop
+    The event loop waiting for it.
+  future: asyncio.Future
+    The task's future.
+  result: object
+    What the task returned.
+  error: Exception
+    What the task raised, or None.
+  """
+  try:
+    loop.call_soon_threadsafe(settle, future, result, error)
+  except RuntimeError: # The loop has closed, so nothing is waiting for it.  Raising here would stop the pool's result thread.
+    pass
+
+def submit(pool, task, argument):
+  """
+  This method hands a task to the pool without blocking the event loop.
+
+  Parameters
+  ----------
+  pool: multiprocessing.Pool
+    The pool.
+  task: function
+    The task, which takes one argument.
+  argument: object
+    Its argument.
+
+  Returns
+  -------
+  asyncio.Future
+    What the task returns, once it has run.
+  """
+  loop = asyncio.get_running_loop()
+  future = loop.create_future()
+  pool.apply_async(task, (argument,), callback=lambda result: deliver(loop, future, result, None), error_callback=lambda error: deliver(loop, future, None, error))
+  return future
+
+async def fetchAndSubmit(url, task, pool, connections, chunkSize, finished, state):
+  """
+  This method downloads a text, and hands it, or each piece of it as it arrives, to the pool.
+
+  Parameters
+  ----------
+  url: string
+    Where to download it from.
+  task: function
+    The task to run on the text, or on each piece.
+  pool: multiprocessing.Pool
+    The pool.
+  connections: asyncio.Semaphore
+    Held while downloading, to bound the connections open at once.
+  chunkSize: int
+    The least size of each piece, in characters.  The text is handed over whole if None.
+  finished: asyncio.Queue
+    Where each task's url, index and future are put as it finishes.
+  state: dict
+    Counts the tasks handed over, as "submitted".
+  """
+  def handOver(index, text):
+    future = submit(pool, task, text)
+    future.add_done_callback(lambda future: finished.put_nowait((url, index, future)))
+    state["submitted"] += 1
+
+  async with connections:
+    if chunkSize is None:
+      blocks = [text async for text in streamText(url)]
+      handOver(0, "".join(blocks))
+      return
+    chunker = textChunking.StreamChunker(chunkSize)
+    index = 0
+    async for text in streamText(url):
+      for piece in chunker.feed(text):
+        handOver(index, piece)
+        index += 1
+    for piece in chunker.finish():
+      handOver(index, piece)
+
+async def ingest(urls, task, pool, connections=None, chunkSize=None):
+  """
+  This method downloads texts concurrently, runs a task on each across the pool as soon as it has arrived, and gives the results as they finish.
+
+  Parameters
+  ----------
+  urls: list
+    Where to download the texts from.
+  task: function
+    The task to run on each text, or each piece of one.  It must be picklable, i.e. defined at the top level of a module.
+  pool: multiprocessing.Pool
+    The pool to run it in.
+  connections: int
+    The most connections open at once.  defaultConnections if None.
+  chunkSize: int
+    If given, each text is handed over in pieces of at least this many characters, cut at safe paragraph breaks, as they arrive.
+
+  Yields
+  ------
+  tuple
+    The url, the index of the piece (0 if handed over whole) and what the task returned, in the order they finish.  A failed download or task raises here.
+  """
+  finished = asyncio.Queue()
+  state = {"submitted": 0}
+  semaphore = asyncio.Semaphore(connections or defaultConnections)
+  fetching = asyncio.ensure_future(asyncio.gather(*[fetchAndSubmit(url, task, pool, semaphore, chunkSize, finished, state) for url in urls]))
+  received = 0
+  try:
+    while not (fetching.done() and received == state["submitted"]):
+      if fetching.done():
+        fetching.result() # Raises the first failed download, if any.
+        url, index, future = await finished.get()
+      else:
+        waiting = asyncio.ensure_future(finished.get())
+        await asyncio.wait([waiting, fetching], return_when=asyncio.FIRST_COMPLETED)
+        if not waiting.done(): # The downloads finished (or one failed) first.
+          waiting.cancel()
+          continue
+        url, index, future = waiting.result()
+      received += 1
+      yield url, index, future.result()
+    fetching.result() # Raises the first failed download, if any.
+  finally:
+    fetching.cancel()
+
+async def collect(urls, task, pool, connections=None, chunkSize=None):
+  """
+  This method runs ingest to the end, timing it.
+
+  Parameters
+  ----------
+  urls, task, pool, connections, chunkSize:
+    As for ingest.
+
+  Returns
+  -------
+  dict
+    The results (as ingest gives them, in order of finishing), the seconds until the first result, and the total seconds.
+  """
+  startTime = time.time()
+  firstResult = None
+  results = []
+  async for result in ingest(urls, task, pool, connections, chunkSize):
+    if firstResult is None:
+      firstResult = time.time() - startTime
+    results.append(result)
+  return {"results": results, "firstResult": firstResult, "seconds": time.time() - startTime}
+
+def ingestAll(urls, task, pool, connections=None, chunkSize=None):
+  """
+  This method runs ingest in a new event loop, for callers which aren't already in one.
+
+  Parameters
+  ----------
+  urls, task, pool, connections, chunkSize:
+    As for ingest.
+
+  Returns
+  -------
+  dict
+    As collect gives it.
+  """
+  return asyncio.run(collect(urls, task, pool, connections, chunkSize))
+
+async def fetchOne(url, connections):
+  """
+  This method downloads a whole text, while holding one of the connections.
+
+  Parameters
+  ----------
+  url: string
+    Where to download it from.
+  connections: asyncio.Semaphore
+    Bounds the connections open at once.
+
+  Returns
+  -------
+  tuple
+    The text, and the seconds it took to download, not counting waiting for a connection.
+  """
+  async with connections:
+    startTime = time.time()
+    blocks = [text async for text in streamText(url)]
+    return "".join(blocks), time.time() - startTime
+
+async def fetchAll(urls, connections=None):
+  """
+  This method downloads texts concurrently.
+
+  Parameters
+  ----------
+  urls: list
+    Where to download them from.
+  connections: int
+    The most connections open at once.  defaultConnections if None.
+
+  Returns
+  -------
+  list
+    The text and download time of each, in the order of urls.
+  """
+  semaphore = asyncio.Semaphore(connections or defaultConnections)
+  return await asyncio.gather(*[fetchOne(url, semaphore) for url in urls])
+
+def fetchTexts(urls, connections=None):
+  """
+  This method downloads texts concurrently, for callers which aren't already in an event loop.
+
+  Parameters
+  ----------
+  urls: list
+    Where to download them from.
+  connections: int
+    The most connections open at once.  defaultConnections if None.
+
+  Returns
+  -------
+  list
+    The text and download time of each, in the order of urls.
+  """
+  return asyncio.run(fetchAll(urls, connections))
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+  '''
+  StandInHandler
+
+  Serves the texts of a StandInServer, slowly enough to stand in for a real source.
+  '''
+  protocol_version = "HTTP/1.1"
+
+  # How much to send at a time.  Not a round number, so UTF-8 characters are split between blocks.
+  sendSize = 16 * 1024 + 3
+
+  def do_GET(self):
+    '''
+    Sends the text named by the path, after the server's latency, at the server's rate.
+    '''
+    data = self.server.texts.get(urllib.parse.unquote(self.path.lstrip("/")))
+    time.sleep(self.server.latency)
+    if data is None:
+      self.send_error(404)
+      return
+    self.send_response(200)
+    self.send_header("Content-Type", "text/plain; charset=utf-8")
+    if self.server.chunked:
+      self.send_header("Transfer-Encoding", "chunked")
+    else:
+      self.send_header("Content-Length", str(len(data)))
+    self.send_header("Connection", "close")
+    self.end_headers()
+    for start in range(0, len(data), self.sendSize):
+      block = data[start:start + self.sendSize]
+      self.wfile.write(b"%x\r\n%s\r\n" % (len(block), block) if self.server.chunked else block)
+      if self.server.rate:
+        time.sleep(len(block) / self.server.rate)
+    if self.server.chunked:
+      self.wfile.write(b"0\r\n\r\n")
+
+  def log_message(self, *arguments):
+    '''
+    Keeps requests out of the output.
+    '''
+    pass
+
+class StandInServer:
+  '''
+  StandInServer
+
+  A local HTTP server, in a thread of this process, standing in for the sources of the texts in tests: it serves each by name, after a delay, at a limited rate per connection.
+  '''
+
+  def __init__(self, texts, latency=0.2, rate=None, chunked=False):
+    '''
+    Constructor: starts the server on a free port.
+
+    Parameters
+    ----------
+    texts: dict
+      The texts to serve, by name, as strings or UTF-8 bytes.
+    latency: float
+      The seconds to wait before answering each request.
+    rate: float
+      The bytes per second to send each response at.  As fast as possible if None.
+    chunked: boolean
+      Whether to send bodies with chunked transfer encoding, rather than a Content-Length.
+    '''
+    self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    self.server.daemon_threads = True
+    self.server.texts = {name: text.encode("utf-8") if isinstance(text, str) else text for name, text in texts.items()}
+    self.server.latency = latency
+    self.server.rate = rate
+    self.server.chunked = chunked
+    self.thread = threading.Thread(target=self.server.serve_forever, name="standInServer", daemon=True)
+    self.thread.start()
+
+  def url(self, name):
+    '''
+    Where a text is served.
+
+    Parameters
+    ----------
+    name: string
+      The text's name.
+
+    Returns
+    -------
+    string
+      Its URL.
+    '''
+    return "http://127.0.0.1:" + str(self.server.server_address[1]) + "/" + urllib.parse.quote(name)
+
+  def close(self):
+    '''
+    Stops the server.
+    '''
+    self.server.shutdown()
+    self.server.server_close()
+    self.thread.join()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception):
+    self.close()
+    return False
+
+def countTokens(text):
+  """
+  This method, run in a worker, tokenises a text and counts its words.
+
+  Parameters
+  ----------
+  text: string
+    The text, or a piece of one.
+
+  Returns
+  -------
+  tuple
+    The packed word counts (see frequencyMerge.py).
+  """
+  import wordTokenisers # Word tokenisation engines
+  return frequencyMerge.packCounts(Counter(wordTokenisers.tokeniseText(text)))
+
+def serialIngest(urls, task, pool):
+  """
+  This method downloads the texts the old way, one after another with a blocking read, then runs the task on them across the pool.
+
+  Parameters
+  ----------
+  urls: list
+    Where to download the texts from.
+  task: function
+    The task to run on each text.
+  pool: multiprocessing.Pool
+    The pool to run it in.
+
+  Returns
+  -------
+  dict
+    As collect gives it.
+  """
+  startTime = time.time()
+  texts = []
+  for url in urls:
+    response = urllib.request.urlopen(urllib.request.Request(url=url, headers={'User-Agent': 'Mozilla/5.0'}))
+    texts.append(response.read().decode("utf-8-sig"))
+  firstResult = None
+  results = []
+  for url, result in zip(urls, pool.imap(task, texts)):
+    if firstResult is None:
+      firstResult = time.time() - startTime
+    results.append((url, 0, result))
+  return {"results": results, "firstResult": firstResult, "seconds": time.time() - startTime}
+
+def mergedCounts(results):
+  """
+  This method merges the packed counts of every text and piece, for checking that the ways of ingesting agree.
+
+  Parameters
+  ----------
+  results: list
+    The results, as collect gives them.
+
+  Returns
+  -------
+  FreqDist
+    The merged counts.
+  """
+  return frequencyMerge.treeMerge([result for url, index, result in results])
+
+def runTests(texts, connections=None, latency=0.2, rate=None, chunkSize=textChunking.defaultChunkSize, pool=None):
+  """
+  This method serves texts from a stand-in server, and compares fetching them one after another with ingesting them concurrently, whole and in pieces.
+
+  Parameters
+  ----------
+  texts: dict
+    The texts, by name.
+  connections: int
+    The most connections open at once.  defaultConnections if None.
+  latency: float
+    The stand-in server's delay before answering, in seconds.
+  rate: float
+    The stand-in server's bytes per second per connection.  Unlimited if None.
+  chunkSize: int
+    The size of the pieces, in characters.
+  pool: multiprocessing.Pool
+    The pool to run the tasks in.  The shared pool if None.
+  """
+  import workerResources # The shared pool
+  pool = pool or workerResources.getPool(["punkt"])
+  connections = connections or defaultConnections
+  print ("  " + str(len(texts)) + " texts, " + str(sum(len(text) for text in texts.values())) + " characters, latency " + str(latency) + "s, rate " + (str(rate) + " bytes/s" if rate else "unlimited") + ", " + str(connections) + " connections: ")
+  with StandInServer(texts, latency, rate, chunked=True) as server:
+    urls = [server.url(name) for name in texts]
+    runs = {
+      "serial fetch, then pool.imap": serialIngest(urls, countTokens, pool),
+      "asyncio ingest, whole texts": ingestAll(urls, countTokens, pool, connections),
+      "asyncio ingest, " + str(chunkSize) + "-character pieces": ingestAll(urls, countTokens, pool, connections, chunkSize)
+    }
+  expected = None
+  for name, run in runs.items():
+    counts = mergedCounts(run["results"])
+    expected = expected if expected is not None else counts
+    print ("  " + name + ": \ttime to first result: \t", run["firstResult"], "\ttotal time: \t", run["seconds"], "\tresults: \t", len(run["results"]), "\tcounts differing by: \t", sum(abs(counts[word] - expected[word]) for word in set(counts) | set(expected))) # Only ever non-zero for pieces cut at a fallback break (see textChunking.py).
+
+def main():
+  """
+  Entrypoint: compares serial and concurrent ingest of the sources given on the command line, or the sample books.
+  """
+  arguments = sys.argv[1:]
+  options = {"--connections": None, "--latency": "0.2", "--rate": None, "--chunk-size": str(textChunking.defaultChunkSize)}
+  for option in options:
+    if option in arguments:
+      position = arguments.index(option)
+      options[option] = arguments[position + 1]
+      del arguments[position:position + 2]
+  import corpusStore # Offline corpus store
+  texts = {}
+  for source in (arguments or ["kjv", "shakespeare", "timeMachine", "lesMiserables"]):
+    if os.path.exists(source):
+      with open(source, "r", encoding="utf-8-sig", newline="") as file:
+        texts[os.path.basename(source)] = file.read()
+    else:
+      texts[source] = corpusStore.loadText(source)
+  runTests(texts, int(options["--connections"]) if options["--connections"] else None, float(options["--latency"]), float(options["--rate"]) if options["--rate"] else None, int(options["--chunk-size"]))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,507 @@
+"""
+benchmarkSuite.py
+
+A reproducible benchmark of every stage of the scripts' pipelines, on synthetic text which is the same on every machine and every run.
+
+The scripts time themselves with a single time.time() around each stage, on whatever Project Gutenberg served, with the first run paying for every cold cache.  Here each stage is timed with time.perf_counter, after warm-up runs, over repeated trials, and the median, mean, spread and throughput are reported as JSON.
+The text is a synthetic corpus: words drawn from a fixed vocabulary with Zipfian frequencies (as natural language has), made into sentences and paragraphs, from a seeded generator.  Its SHA-256 is recorded with the results, so two sets of results can be checked to be of the same text.
+
+Each stage which can be split across documents is also run across the shared pool, on the same pieces it is run on serially, so the two can be compared.
+
+Usage:
+  python3 benchmarkSuite.py [--sizes 10000,100000] [--stages name,...] [--warmups 1] [--repeats 5] [--serial] [--output results.json] [--save baseline.json] [--compare baseline.json]
+
+--sizes gives the corpus sizes, in words.  --serial skips the pooled runs.  --output writes the results; --save writes them as a baseline; --compare flags any stage whose median time has grown by more than a quarter (and more than 5ms) since a baseline, and exits with status 1 if any did.
+
+Stages:
+  tokenise          nltk.word_tokenize, as the scripts call it.
+  tokeniseFast      wordTokenisers.py's fast engine.
+  stripPunctuation  Removing punctuation from the text.
+  filterStopwords   Removing stopwords from the tokens.
+  stem              Porter stemming, memoised per distinct word (a fresh memo cache each run).
+  lemmatise         WordNet lemmatisation, memoised the same way.
+  posTag            The perceptron tagger.
+  similar           The similar words of every distinct word (pOSTagging/similarityIndex.py).
+  freqDist          Counting the tokens into a FreqDist.
+  cLex              Lexing C source with CLexer (cSourceCodeTokenisation/cLexer.py), about as many bytes of it as there are of text.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import hashlib # Fingerprinting the corpus
+import json # Results and baseline format
+import os # Filesystem paths
+import platform # Describing the machine
+import random # The seeded corpus generator
+import statistics # Summarising repeated trials
+import sys # Command line arguments, and the module search path
+import time # time library
+import textChunking # Splitting texts into independently tokenisable pieces
+import wordTokenisers # Word tokenisation engines, and the punctuation table
+import workerResources # NLTK resources loaded once per process, and the shared pool
+
+rootPath = os.path.dirname(os.path.abspath(__file__))
+for directory in ["stemmingAndLemmatising", "pOSTagging", "cSourceCodeTokenisation"]: # The stages' own modules.
+  sys.path.insert(0, os.path.join(rootPath, directory))
+
+# The corpus sizes, in words, benchmarked when none are given.
+defaultSizes = [10000, 100000]
+
+# The seed of the corpus generator.  Changing it changes every corpus, so results from different seeds can't be compared.
+corpusSeed = 1
+
+# Common English words, the most frequent in the corpus in this order, so the stopword filter and tagger have real words to work with.
+commonWords = [
+  "the", "of", "and", "to", "a", "in", "that", "he", "was", "it", "his", "i", "is", "with", "as", "for", "had", "you", "not", "be",
+  "her", "on", "at", "by", "which", "have", "or", "from", "this", "him", "but", "all", "she", "they", "were", "my", "are", "me", "one", "their",
+  "so", "an", "said", "them", "we", "who", "would", "been", "will", "no", "when", "there", "if", "more", "out", "up", "into", "do", "any", "your",
+  "what", "has", "man", "could", "other", "than", "our", "some", "very", "time", "upon", "about", "may", "its", "only", "now", "like", "little", "then", "can"]
+
+# The pieces the rest of the vocabulary is made of.
+syllables = [consonant + vowel for consonant in "bcdfghklmnprstvw" for vowel in "aeiou"]
+suffixes = ["", "", "", "s", "ed", "ing", "ly", "ness", "er", "ation"]
+
+def syntheticVocabulary(size, generator):
+  """
+  This method makes a vocabulary: the common words, then made-up words of one to three syllables and an English suffix.
+
+  Parameters
+  ----------
+  size: int
+    The number of distinct words.
+  generator: random.Random
+    The seeded generator.
+
+  Returns
+  -------
+  list
+    The words, most frequent first.
+  """
+  vocabulary = list(commonWords[:size])
+  seen = set(vocabulary)
+  while len(vocabulary) < size:
+    word = "".join(generator.choice(syllables) for _ in range(generator.randint(1, 3))) + generator.choice(suffixes)
+    if word not in seen:
+      seen.add(word)
+      vocabulary.append(word)
+  return vocabulary
+
+def syntheticCorpus(words, seed=corpusSeed, exponent=1.1):
+  """
+  This method makes a synthetic English-like text, the same for the same arguments on any machine.  Its words follow Zipf's law: the word of rank r turns up in proportion to 1 / r^exponent.
+
+  Parameters
+  ----------
+  words: int
+    The number of words in the text.
+  seed: int
+    The seed of the generator.
+  exponent: float
+    The Zipfian exponent.
+
+  Returns
+  -------
+  string
+    The text: sentences of 4 to 24 words, some with commas, in paragraphs separated by blank lines.
+  """
+  generator = random.Random(seed)
+  vocabulary = syntheticVocabulary(max(200, int(words ** 0.75)), generator) # Vocabulary grows with the text, as Heaps' law says it does.
+  weights = [1 / rank ** exponent for rank in range(1, len(vocabulary) + 1)]
+  cumulativeWeights = []
+  total = 0.0
+  for weight in weights:
+    total += weight
+    cumulativeWeights.append(total)
+  drawn = generator.choices(vocabulary, cum_weights=cumulativeWeights, k=words)
+
+  paragraphs = []
+  sentences = []
+  position = 0
+  while position < words:
+    length = generator.randint(4, 24)
+    sentence = drawn[position:position + length]
+    position += length
+    for i in range(1, len(sentence) - 1):
+      if generator.random() < 0.06:
+        sentence[i] += ","
+    sentences.append(sentence[0].capitalize() + (" " + " ".join(sentence[1:]) if len(sentence) > 1 else "") + generator.choice([".", ".", ".", ".", "?", "!"]))
+    if len(sentences) >= generator.randint(3, 8) or position >= words:
+      paragraphs.append(" ".join(sentences))
+      sentences = []
+  return "\n\n".join(paragraphs) + "\n"
+
+def syntheticCSource(size):
+  """
+  This method makes C source of about a given size, by repeating the example program.
+
+  Parameters
+  ----------
+  size: int
+    The size, in characters.
+
+  Returns
+  -------
+  list
+    The lines of the source.
+  """
+  with open(os.path.join(rootPath, "cSourceCodeTokenisation", "exampleText.c"), "r") as file:
+    example = file.read()
+  return (example * (size // len(example) + 1)).split("\n")
+
+def prepareInputs(text):
+  """
+  This method runs the pipeline over a corpus once, untimed, to get the input of each stage.
+
+  Parameters
+  ----------
+  text: string
+    The corpus.
+
+  Returns
+  -------
+  dict
+    The text, its tokens, its tokens without punctuation (words), those without stopwords (unstopped), and C source lines of about the same size (cSource).
+  """
+  import nltk # Natural Language Processing Toolkit
+  words = nltk.word_tokenize(stripPunctuationStage(text))
+  return {
+    "text": text,
+    "tokens": nltk.word_tokenize(text),
+    "words": words,
+    "unstopped": filterStopwordsStage(words),
+    "cSource": syntheticCSource(len(text))
+  }
+
+def tokeniseStage(text):
+  """
+  This method is the tokenise stage.
+  """
+  import nltk
+  return nltk.word_tokenize(text)
+
+def tokeniseFastStage(text):
+  """
+  This method is the tokeniseFast stage.
+  """
+  return wordTokenisers.tokeniseText(text, "fast")
+
+def stripPunctuationStage(text):
+  """
+  This method is the stripPunctuation stage.
+  """
+  return text.translate(wordTokenisers.punctuationTable)
+
+def filterStopwordsStage(tokens):
+  """
+  This method is the filterStopwords stage.
+  """
+  stopWords = workerResources.get("stopwords")
+  return [word for word in tokens if word.lower() not in stopWords]
+
+def stemStage(tokens):
+  """
+  This method is the stem stage.
+  """
+  import memoCache # Memoised stemming
+  return memoCache.MemoCache().mapWords("porter", workerResources.get("porter").stem, tokens)
+
+def lemmatiseStage(tokens):
+  """
+  This method is the lemmatise stage.
+  """
+  import memoCache
+  return memoCache.MemoCache().mapWords("wordnet", workerResources.get("lemmatiser").lemmatize, tokens)
+
+def posTagStage(tokens):
+  """
+  This method is the posTag stage.
+  """
+  return workerResources.get("tagger").tag(tokens)
+
+def similarStage(tokens):
+  """
+  This method is the similar stage.
+  """
+  import similarityIndex # Similar words, from an index built once per text
+  return similarityIndex.SimilarityIndex(tokens).similarToAll(tokens, 5)
+
+def freqDistStage(tokens):
+  """
+  This method is the freqDist stage.
+  """
+  from nltk import FreqDist
+  return FreqDist(tokens)
+
+def cLexStage(lines):
+  """
+  This method is the cLex stage.
+  """
+  from cLexer import CLexer # The C lexer
+  return list(CLexer().iterateTokens(lines))
+
+# Each stage: the input it takes (see prepareInputs), the function which runs it, and whether it can be split across the pool (the similar words of a text need the whole text).
+stages = {
+  "tokenise": ("text", tokeniseStage, True),
+  "tokeniseFast": ("text", tokeniseFastStage, True),
+  "stripPunctuation": ("text", stripPunctuationStage, True),
+  "filterStopwords": ("words", filterStopwordsStage, True),
+  "stem": ("unstopped", stemStage, True),
+  "lemmatise": ("unstopped", lemmatiseStage, True),
+  "posTag": ("tokens", posTagStage, True),
+  "similar": ("tokens", similarStage, False),
+  "freqDist": ("words", freqDistStage, True),
+  "cLex": ("cSource", cLexStage, True)
+}
+
+# The unit each kind of input is counted in, for throughput.
+inputUnits = {"text": "characters", "tokens": "tokens", "words": "tokens", "unstopped": "tokens", "cSource": "lines"}
+
+def runPiece(job):
+  """
+  This method runs a stage on one piece of its input, in a pool worker.
+
+  Parameters
+  ----------
+  job: tuple
+    The stage's name, and the piece.
+
+  Returns
+  -------
+  object
+    The stage's output for the piece.
+  """
+  name, piece = job
+  return stages[name][1](piece)
+
+def splitInput(data, pieces):
+  """
+  This method splits a stage's input into pieces, for the pool.
+
+  Parameters
+  ----------
+  data: string or list
+    The input.  A text is cut only where it can be tokenised separately (see textChunking.py).
+  pieces: int
+    About how many pieces to split it into.
+
+  Returns
+  -------
+  list
+    The pieces, in order.
+  """
+  size = len(data) // pieces + 1
+  if isinstance(data, str):
+    return textChunking.splitText(data, size)
+  return [data[start:start + size] for start in range(0, len(data), size)]
+
+def measure(function, warmups, repeats):
+  """
+  This method times a function over repeated trials, after warming it up.
+
+  Parameters
+  ----------
+  function: function
+    The function, taking no arguments.
+  warmups: int
+    The untimed runs first, to fill caches and load resources.
+  repeats: int
+    The timed runs.
+
+  Returns
+  -------
+  dict
+    The median, mean, standard deviation, minimum and maximum times, in seconds, and every trial's time.
+  """
+  for _ in range(warmups):
+    function()
+  times = []
+  for _ in range(repeats):
+    startTime = time.perf_counter()
+    function()
+    times.append(time.perf_counter() - startTime)
+  return {
+    "median": statistics.median(times),
+    "mean": statistics.mean(times),
+    "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    "min": min(times),
+    "max": max(times),
+    "trials": times
+  }
+
+def benchmarkStage(name, inputs, warmups, repeats, pool=None):
+  """
+  This method benchmarks one stage, serially and, if it can be split, across the pool.
+
+  Parameters
+  ----------
+  name: string
+    The stage's name.
+  inputs: dict
+    The inputs of every stage, as prepareInputs gives them.
+  warmups: int
+    The untimed runs before timing.
+  repeats: int
+    The timed runs.
+  pool: multiprocessing.Pool
+    The pool to compare with.  Not compared if None.
+
+  Returns
+  -------
+  dict
+    The serial timings, and the pooled timings (or None), each with the throughput of the median run.
+  """
+  inputName, function, splittable = stages[name]
+  data = inputs[inputName]
+  items = len(data)
+  serial = measure(lambda: function(data), warmups, repeats)
+  serial["itemsPerSecond"] = items / serial["median"]
+  pooled = None
+  if pool is not None and splittable:
+    pieces = [(name, piece) for piece in splitInput(data, 4 * (os.cpu_count() or 1))]
+    pooled = measure(lambda: pool.map(runPiece, pieces, chunksize=1), warmups, repeats)
+    pooled["itemsPerSecond"] = items / pooled["median"]
+    pooled["pieces"] = len(pieces)
+  return {"items": items, "unit": inputUnits[inputName], "serial": serial, "pooled": pooled}
+
+def runBenchmarks(sizes, names, warmups, repeats, pool=None):
+  """
+  This method benchmarks the stages on a corpus of each size.
+
+  Parameters
+  ----------
+  sizes: list
+    The corpus sizes, in words.
+  names: list
+    The stages to benchmark.
+  warmups: int
+    The untimed runs before timing each stage.
+  repeats: int
+    The timed runs of each stage.
+  pool: multiprocessing.Pool
+    The pool to compare with.  Not compared if None.
+
+  Returns
+  -------
+  dict
+    The run's metadata (the machine, versions, and settings) and the results, by corpus size and then stage.
+  """
+  import nltk
+  results = {
+    "metadata": {
+      "python": platform.python_version(),
+      "nltk": nltk.__version__,
+      "platform": platform.platform(),
+      "cpus": os.cpu_count(),
+      "pooled": pool is not None,
+      "seed": corpusSeed,
+      "warmups": warmups,
+      "repeats": repeats,
+      "timer": "time.perf_counter"
+    },
+    "corpora": {},
+    "results": {}
+  }
+  for size in sizes:
+    text = syntheticCorpus(size)
+    results["corpora"][str(size)] = {"characters": len(text), "sha256": hashlib.sha256(text.encode("utf-8")).hexdigest()}
+    inputs = prepareInputs(text)
+    results["results"][str(size)] = sizeResults = {}
+    print ("Corpus of " + str(size) + " words (" + str(len(text)) + " characters): ")
+    for name in names:
+      sizeResults[name] = result = benchmarkStage(name, inputs, warmups, repeats, pool)
+      line = "  " + name + ": \tmedian: \t" + str(result["serial"]["median"]) + "\tstdev: \t" + str(result["serial"]["stdev"]) + "\t" + result["unit"] + "/s: \t" + str(result["serial"]["itemsPerSecond"])
+      if result["pooled"] is not None:
+        line += "\tpooled median: \t" + str(result["pooled"]["median"]) + "\tspeed-up: \t" + str(result["serial"]["median"] / result["pooled"]["median"])
+      print (line)
+  return results
+
+def compareWithBaseline(results, baseline):
+  """
+  This method finds the stages which have regressed since a baseline.  Only corpora and stages in both are compared, and only if the corpora are identical.
+
+  Parameters
+  ----------
+  results: dict
+    The results, as measured now.
+  baseline: dict
+    The results, as measured before.
+
+  Returns
+  -------
+  list
+    A description of each stage (corpus size, stage, and serial or pooled) whose median time has grown by more than a quarter, and by more than 5ms.
+  """
+  regressions = []
+  for size, sizeResults in results["results"].items():
+    if baseline.get("corpora", {}).get(size, {}).get("sha256") != results["corpora"][size]["sha256"]:
+      continue
+    for name, result in sizeResults.items():
+      before = baseline["results"].get(size, {}).get(name)
+      if before is None:
+        continue
+      for mode in ["serial", "pooled"]:
+        if result[mode] is None or before.get(mode) is None:
+          continue
+        now, then = result[mode]["median"], before[mode]["median"]
+        if now > then * 1.25 and now - then > 0.005:
+          regressions.append(size + " words, " + name + " (" + mode + "): " + str(then) + "s to " + str(now) + "s")
+  return regressions
+
+def optionValue(arguments, name, default):
+  """
+  This method gets the value given for a command line option.
+
+  Parameters
+  ----------
+  arguments: list
+    The command line arguments.
+  name: string
+    The option, e.g. --sizes.
+  default: string
+    The value if the option isn't given.
+
+  Returns
+  -------
+  string
+    The argument after the option, or the default.
+  """
+  return arguments[arguments.index(name) + 1] if name in arguments else default
+
+def main():
+  """
+  Entrypoint: benchmarks the stages on each corpus size, and writes, saves or compares the results.
+  """
+  arguments = sys.argv[1:]
+  sizes = [int(size) for size in optionValue(arguments, "--sizes", ",".join(map(str, defaultSizes))).split(",")]
+  names = optionValue(arguments, "--stages", ",".join(stages)).split(",")
+  warmups = int(optionValue(arguments, "--warmups", "1"))
+  repeats = int(optionValue(arguments, "--repeats", "5"))
+  outputPath = optionValue(arguments, "--output", None)
+  savePath = optionValue(arguments, "--save", None)
+  comparePath = optionValue(arguments, "--compare", None)
+  unknown = [name for name in names if name not in stages]
+  if unknown:
+    print ("Unknown stages: " + ", ".join(unknown) + ".  The stages are: " + ", ".join(stages) + ".")
+    sys.exit(2)
+
+  pool = None if "--serial" in arguments else workerResources.getPool()
+  results = runBenchmarks(sizes, names, warmups, repeats, pool)
+
+  failed = False
+  if comparePath is not None:
+    with open(comparePath, "r") as file:
+      regressions = compareWithBaseline(results, json.load(file))
+    for regression in regressions:
+      print ("REGRESSION: " + regression)
+    failed = bool(regressions)
+  for path in [outputPath, savePath]:
+    if path is not None:
+      with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+  sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+  main()
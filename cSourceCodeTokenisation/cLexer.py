@@ -1,8 +1,143 @@
+import re # Regular expressions
+from bisect import bisect_left, bisect_right # Finding the tokens in a directive
+from collections import namedtuple # Token records
+from itertools import accumulate, compress, count, islice, repeat # Lexing a chunk of matches at a time, and picking out the lines which end paragraphs
+from operator import add, attrgetter, sub # Reading the matches without a Python loop per token
+from cSynter import CSynter # The grammatical symbols
+
+__all__ = ["Token", "CLexer", "IncrementalLexer", "codeState", "blockCommentState", "lineCommentState", "stringState", "characterState", "directiveState", "spliceState", "tokenPositions"]
+
+# A lexical token: its kind (keyword, identifier, number, string, character, comment, punctuator, directive, header, or other), its text, and the line and column (both counted from 1) it starts at.
+Token = namedtuple("Token", ["kind", "text", "line", "column"])
+
+# The states the lexer can be in at the start of a line, carried over from the line before.
+codeState = "code" # Ordinary code.
+blockCommentState = "blockComment" # Inside a /* comment.
+lineCommentState = "lineComment" # A // comment continued by a backslash at the end of the line before.
+stringState = "string" # A string literal continued by a backslash at the end of the line before.
+characterState = "character" # A character constant continued by a backslash at the end of the line before.
+directiveState = "directive" # A preprocessor directive continued by a backslash at the end of the line before.
+spliceState = "splice" # Code continued by a backslash at the end of the line before, so the line can't start a directive.
+
+# The directives followed by a header name.
+headerDirectives = frozenset(["include", "include_next", "import", "embed"])
+
+def buildTokenPattern(lineStart=False):
+  '''
+  Builds the scanner which recognises every kind of token, as one compiled automaton.  It is run over a whole buffer at once: each match is one token, with the whitespace, newlines and line splices before it.
+  The alternatives are tried in order at each position, the commonest first.  Punctuators are grouped by their first character, longest first, so the longest one which matches wins (maximal munch) without trying each of them in turn; a / or . which starts a comment or a number is left to those.  The quoted kinds are only tried at a quote.
+  A directive is only recognised after a newline which isn't spliced, or with lineStart, at the start of the buffer.  Tokens which carry on past the end of their line (block comments, and comments, strings and character constants continued by a line splice) are matched whole, as their long kinds, and split into a token per line after.
+
+  Parameters
+  ----------
+  lineStart: boolean
+    Whether the scanner starts at the start of a line, for the first token of a buffer.
+
+  Returns
+  -------
+  re.Pattern
+    The scanner.  The name of the group which matched is the kind of token.
+  '''
+  symbols = [symbol for symbol in CSynter.grammaticalSymbolList + CSynter.compoundSymbolList if symbol not in CSynter.literalSymbolList]
+  rests = {}
+  for symbol in sorted(set(symbols), key=len, reverse=True):
+    rests.setdefault(symbol[0], []).append(symbol[1:])
+  guards = {"/": "(?![/*])", ".": r"(?!\d)"} # Not the start of a comment, or of a number.
+  punctuators = "[" + "".join(re.escape(first) for first in rests if rests[first] == [""]) + "]|" + "|".join(re.escape(first) + guards.get(first, "") + "(?:" + "|".join(re.escape(rest) for rest in rests[first] if rest) + ")?" for first in rests if rests[first] != [""])
+  space = r"[ \t\f\v\r]*+(?:\\(?:\n|\Z)[ \t\f\v\r]*+)*+" # Whitespace within a line, and line splices.
+  directive = r"(?P<headerDirective>(?:\#|%:)[ \t\f\v\r]*+(?:" + "|".join(sorted(headerDirectives, key=len, reverse=True)) + r")(?!\w)[ \t\f\v\r]*+<[^>\n]*>)|(?P<directive>(?:\#|%:)[ \t\f\v\r]*+(?:[^\W\d]\w*+)?)" # A directive with a header name after it is matched with it, and split from it after.
+  return re.compile(space + r"(?:(?:\n" + space + ")" + ("*+" if lineStart else "++") + "(?:" + directive + r")|(?:\n" + space + r""")*+(?:
+     (?P<punctuator>""" + punctuators + r""")
+    |(?=(?:u8|[uUL])?["'])(?:
+       (?P<string>(?:u8|[uUL])?"[^"\\\n]*+(?:\\.[^"\\\n]*+)*+(?:"|(?=\n)|\\?\Z))      # Unterminated strings end at the end of the line.
+      |(?P<character>(?:u8|[uUL])?'[^'\\\n]*+(?:\\.[^'\\\n]*+)*+(?:'|(?=\n)|\\?\Z))
+      |(?P<longString>(?:u8|[uUL])?"(?:[^"\\\n]|\\(?s:.))*+(?:"|(?=\n)|\\?\Z))
+      |(?P<longCharacter>(?:u8|[uUL])?'(?:[^'\\\n]|\\(?s:.))*+(?:'|(?=\n)|\\?\Z))
+    )
+    |(?P<identifier>(?:[^\W\d]|\$)(?:\w|\$)*+)
+    |(?P<number>\.?\d(?:[eEpP][+-]|[\w.]|'(?=\w))*+)                                 # A preprocessing number, which covers every form of integer and floating constant.
+    |(?P<comment>//[^\n]*+(?:(?<!\\)|\Z)|/\*[^\n]*?\*/)
+    |(?P<longComment>(?s:/\*.*?(?:\*/|\Z))|//(?:[^\n]*\\\n)++[^\n]*)                  # Unterminated block comments end at the end of the buffer.
+    |(?P<other>.)
+  ))""", re.VERBOSE)
+
+# The scanner, built once, and the one for the first token of a buffer which starts a line.
+tokenPattern = buildTokenPattern()
+lineStartTokenPattern = buildTokenPattern(True)
+
+# The rest of a token carried over from the line before, by the state it carries over in.
+continuationPatterns = {
+  blockCommentState: re.compile(r"(?s:.*?(?:\*/|\Z))"),
+  lineCommentState: re.compile(r"(?:[^\n]*\\\n)*+[^\n]*"),
+  stringState: re.compile(r'(?:[^"\\\n]|\\(?s:.))*+(?:"|(?=\n)|\\?\Z)'),
+  characterState: re.compile(r"(?:[^'\\\n]|\\(?s:.))*+(?:'|(?=\n)|\\?\Z)")
+}
+
+# The kinds the scanner gives tokens which span several lines, and the kind of each line of them.
+longKinds = {"longComment": "comment", "longString": "string", "longCharacter": "character"}
+
+# The long kind each continued state carries on.
+stateKinds = {blockCommentState: "longComment", lineCommentState: "longComment", stringState: "longString", characterState: "longCharacter"}
+
+# The kinds which are split into several tokens after scanning: the long kinds, and directives with a header name after them.
+splitKinds = frozenset(["headerDirective"] + list(longKinds))
+
+# How many matches are read from the scanner at once.  Enough that the loop over the chunks costs nothing, and few enough that they are freed before the garbage collector looks at them.
+matchChunk = 512
+
+# The punctuators which end a command: semicolons and braces (and the digraphs of braces).
+sentenceEnds = frozenset([";", "{", "}", "<%", "%>"])
+
+# The punctuators which open and close a block (and their digraphs), and which brace each is.
+braceKinds = {"{": "{", "<%": "{", "}": "}", "%>": "}"}
+
+def isOpen(text):
+  '''
+  Checks whether a string or character constant at the end of a line carries on to the next: whether it ends in a line splice, an odd number of backslashes.
+
+  Parameters
+  ----------
+  text: string
+    The token.
+
+  Returns
+  -------
+  boolean
+    Does it carry on?
+  '''
+  return (len(text) - len(text.rstrip("\\"))) % 2 == 1
+
+def tokenPositions(text, offsets, lineNumber=1):
+  '''
+  Finds the line and column each token lexed from a buffer starts at, from its offset.  Kept apart from lexing, so tokens which are only counted never pay for it.
+
+  Parameters
+  ----------
+  text: string
+    The buffer the tokens were lexed from.
+  offsets: list
+    The offset of each token, as CLexer.lexText gives.
+  lineNumber: int
+    The number of the buffer's first line.
+
+  Returns
+  -------
+  tuple
+    The line of each token, and its column (both counted from 1), as lists.
+  '''
+  newlines = accumulate(map(add, map(len, text.split("\n")), repeat(1)), initial=-1) # The offset of the newline before each line.
+  lineNumbers = dict(zip(newlines, count(lineNumber)))
+  previous = list(map(text.rfind, repeat("\n"), repeat(0), offsets))
+  return (list(map(lineNumbers.__getitem__, previous)), list(map(sub, offsets, previous)))
+
 class CLexer:
   '''
   CLexer
 
   Basic tools for lexical analysis of the C Programming Language, up to C17 and the proposed standards for C23.
+
+  The lexer works on a whole buffer (a file, or a large block of its lines) at a time, with one pass of a compiled scanner over it, and keeps the tokens in columns (their kinds, texts and offsets) rather than building an object for each.  All it carries from one buffer to the next is its state (see codeState and the rest), so any line can be lexed again on its own given the state it started in.
+  Comments, strings and directives which span several lines give a token on each line.
   '''
 
   # A lexicon of valid words in the language, in this case, C 'Keywords'.
@@ -41,13 +176,22 @@ class CLexer:
     "fortran"
   ]
 
+  # The fixed lexica as sets, for constant-time lookups.
+  preprocessorExtendedLexiconSet = frozenset(preprocessorExtendedLexicon)
+  nonPreprocessorExtendedLexiconSet = frozenset(nonPreprocessorExtendedLexicon)
+  compilerSpecificLanguageExtensionLexiconSet = frozenset(compilerSpecificLanguageExtensionLexicon)
+
   def __init__(self):
     '''
     Constructor for the lexical analyser.
     '''
-    #for words in self.lexicon:
-    #  print(words)
-    pass
+    self.lexicon = list(CLexer.lexicon) # This lexer's own copy, as words can be added to it.
+    self.lexiconSet = set(self.lexicon)
+    self.codeKeywords = self.lexiconSet | self.nonPreprocessorExtendedLexiconSet | self.compilerSpecificLanguageExtensionLexiconSet # Keywords outside a directive.
+    self.directiveKeywords = self.codeKeywords | self.preprocessorExtendedLexiconSet # Keywords inside one.
+    self.codeKeywordKinds = dict.fromkeys(self.codeKeywords, "keyword") # The same, for reclassifying a whole column of identifiers at once.
+    self.directiveKeywordKinds = dict.fromkeys(self.directiveKeywords, "keyword")
+    self.document = None # The IncrementalLexer tokeniseParagraph keeps between calls.
 
   def isWordInLexicon(self, word):
     '''
@@ -63,10 +207,7 @@ class CLexer:
     boolean
       Is the word in the lexicon?
     '''
-    for words in self.lexicon:
-      if (word == words):
-        return True
-    return False
+    return word in self.lexiconSet
 
   def isWordInPreprocessorExtendedLexicon(self, word):
     '''
@@ -82,10 +223,7 @@ class CLexer:
     boolean
       Is the word in the lexicon?
     '''
-    for words in self.preprocessorExtendedLexicon:
-      if (word == words):
-        return True
-    return False
+    return word in self.preprocessorExtendedLexiconSet
 
   def isWordInNonPreprocessorExtendedLexicon(self, word):
     '''
@@ -101,10 +239,7 @@ class CLexer:
     boolean
       Is the word in the lexicon?
     '''
-    for words in self.nonPreprocessorExtendedLexicon:
-      if (word == words):
-        return True
-    return False
+    return word in self.nonPreprocessorExtendedLexiconSet
 
   def isWordInCompilerSpecificLanguageExtensionLexicon(self, word):
     '''
@@ -120,10 +255,7 @@ class CLexer:
     boolean
       Is the word in the lexicon?
     '''
-    for words in self.compilerSpecificLanguageExtensionLexicon:
-      if (word == words):
-        return True
-    return False
+    return word in self.compilerSpecificLanguageExtensionLexiconSet
 
   def isWordInLanguage(self, word):
     '''
@@ -139,13 +271,8 @@ class CLexer:
     boolean
       Is the word... a word?
     '''
-    if(self.isWordInLexicon(word) 
-      or self.isWordInPreprocessorExtendedLexicon(word)
-      or self.isWordInNonPreprocessorExtendedLexicon(word)
-      or self.isWordInCompilerSpecificLanguageExtensionLexicon(word)):
-        return True
-    return False
-  
+    return word in self.directiveKeywords
+
   def addWordToLexicon(self, word):
     '''
     Adds a given word to the lexicon.  This would be called when a word is #define-d.
@@ -160,15 +287,239 @@ class CLexer:
     boolean
       True if it added, false if it's already in there.
     '''
-    for words in self.lexicon:
-      if (word == words):
-        return False
-    lexicon.append(word)
+    if word in self.lexiconSet:
+      return False
+    self.lexicon.append(word)
+    self.lexiconSet.add(word)
+    self.codeKeywords.add(word)
+    self.directiveKeywords.add(word)
+    self.codeKeywordKinds[word] = "keyword"
+    self.directiveKeywordKinds[word] = "keyword"
     return True
 
+  def lexText(self, text, state=codeState):
+    '''
+    Lexes a buffer of source code, in a single pass of the scanner over the whole of it.  The matches are read a chunk at a time, and each chunk's kinds, texts and offsets are read out of them with map, so there is no Python loop per token: only the tokens splitTokens splits, and identifiers which are keywords in a directive, are looked at one by one.
+
+    Parameters
+    ----------
+    text: string
+      The source, its lines separated by newlines (without carriage returns).
+    state: string
+      The state the buffer starts in: the state the buffer before ended in, or codeState for the first.
+
+    Returns
+    -------
+    tuple
+      The kind of each token, its text, and its offset into text (see tokenPositions for its line and column), as lists; and the state the buffer ends in.
+    '''
+    kinds = []
+    texts = []
+    offsets = []
+    last = None # The last token, as the scanner matched it, before splitTokens.
+    position = 0
+    if state in continuationPatterns: # The rest of a token from the line before.
+      position = continuationPatterns[state].match(text).end()
+      last = (stateKinds[state], text[:position], 0)
+      kinds.append(last[0])
+      texts.append(last[1])
+      offsets.append(0)
+      self.splitTokens(kinds, texts, offsets)
+      if position == len(text) and (not text.endswith("*/") if state == blockCommentState else text.endswith("\\") if state == lineCommentState else isOpen(text)):
+        return (kinds, texts, offsets, state)
+    if state == codeState and position == 0:
+      first = lineStartTokenPattern.match(text)
+      matches = tokenPattern.finditer(text, first.end()) if first else iter(())
+      chunk = [first] if first else []
+    else:
+      matches = tokenPattern.finditer(text, position)
+      chunk = []
+    lastGroup = attrgetter("lastgroup")
+    while True:
+      chunk.extend(islice(matches, matchChunk))
+      if not chunk:
+        break
+      chunkGroups = list(map(lastGroup, chunk))
+      chunkTexts = list(map(re.Match.group, chunk, chunkGroups))
+      chunkKinds = list(map(self.codeKeywordKinds.get, chunkTexts, chunkGroups))
+      chunkOffsets = list(map(re.Match.start, chunk, chunkGroups))
+      last = (chunkKinds[-1], chunkTexts[-1], chunkOffsets[-1])
+      if not splitKinds.isdisjoint(chunkGroups):
+        self.splitTokens(chunkKinds, chunkTexts, chunkOffsets)
+      kinds += chunkKinds
+      texts += chunkTexts
+      offsets += chunkOffsets
+      chunk = []
+
+    # Only the preprocessor's own keywords are lexed differently in a directive, so only the identifiers which are one need their directive found.
+    for index in compress(count(), map(self.preprocessorExtendedLexiconSet.__contains__, texts)):
+      start = self.directiveStart(text, offsets[index], state, kinds, offsets)
+      if kinds[index] == "identifier" and start is not None and start <= offsets[index] < self.directiveEnd(text, start, texts, offsets):
+        kinds[index] = "keyword"
+
+    endState = codeState
+    lastKind, lastText, lastOffset = last or (None, "", 0)
+    atEnd = last is not None and lastOffset + len(lastText) == len(text)
+    if atEnd and lastText.startswith("/*") and (len(lastText) < 4 or not lastText.endswith("*/")):
+      endState = blockCommentState
+    elif text.endswith("\\"):
+      directive = self.directiveStart(text, len(text), state, kinds, offsets) # The directive on the last line, which may carry on into the next buffer.
+      if atEnd and lastText.startswith("//"):
+        endState = lineCommentState
+      elif atEnd and lastKind in ("string", "longString") and isOpen(lastText):
+        endState = stringState
+      elif atEnd and lastKind in ("character", "longCharacter") and isOpen(lastText):
+        endState = characterState
+      elif directive is not None and self.directiveEnd(text, directive, texts, offsets) == len(text):
+        endState = directiveState
+      elif last is not None or state == spliceState: # A line splice after a token: the next line carries on this one, rather than starting its own.
+        endState = spliceState
+    return (kinds, texts, offsets, endState)
+
+  def directiveStart(self, text, offset, state, kinds, offsets):
+    '''
+    Finds the directive on the line an offset is on, following line splices back to the start of the line.
+
+    Parameters
+    ----------
+    text: string
+      The source.
+    offset: int
+      The offset.
+    state: string
+      The state the source started in.
+    kinds: list
+      The kind of each token lexed from text.
+    offsets: list
+      Their offsets.
+
+    Returns
+    -------
+    int
+      The offset of the directive's token, 0 for a directive carried on from the buffer before, or None if the line isn't a directive.
+    '''
+    start = text.rfind("\n", 0, offset)
+    while start > 0 and text[start - 1] == "\\":
+      start = text.rfind("\n", 0, start - 1)
+    index = bisect_left(offsets, start + 1)
+    if index < len(kinds) and kinds[index] == "directive":
+      return offsets[index]
+    if start < 0 and state == directiveState:
+      return 0
+    return None
+
+  def directiveEnd(self, text, offset, texts, offsets):
+    '''
+    Finds where a directive ends: at the first newline after it which isn't spliced, or which a comment, string or character constant spans (as the lexer then carries on in that token's state, as if the directive had ended).  Only a line of one of those can end in the backslash of a splice; any other splice is whitespace between tokens.
+
+    Parameters
+    ----------
+    text: string
+      The source.
+    offset: int
+      Where the directive starts.
+    texts: list
+      The text of each token lexed from text.
+    offsets: list
+      Their offsets.
+
+    Returns
+    -------
+    int
+      The offset of the newline which ends the directive, or len(text) if it carries on to the end.
+    '''
+    end = text.find("\n", offset)
+    while end > 0 and text[end - 1] == "\\":
+      index = bisect_right(offsets, end) - 1
+      if index >= 0 and offsets[index] + len(texts[index]) == end:
+        return end
+      end = text.find("\n", end + 1)
+    return end if end >= 0 else len(text)
+
+  def splitTokens(self, kinds, texts, offsets):
+    '''
+    Splits the tokens which the scanner matches whole, but which are more than one token, in place: tokens which span lines, into a token for each line, and directives, from the header name after them.
+
+    Parameters
+    ----------
+    kinds: list
+      The kind of each token, as the scanner gave it.
+    texts: list
+      Their texts.
+    offsets: list
+      Their offsets.
+    '''
+    for index in reversed(list(compress(count(), map(splitKinds.__contains__, kinds)))): # From the end, so the indices before each split stay the same.
+      text = texts[index]
+      offset = offsets[index]
+      if kinds[index] == "headerDirective":
+        header = text.index("<")
+        kinds[index:index + 1] = ("directive", "header")
+        texts[index:index + 1] = (text[:header].rstrip(" \t\f\v\r"), text[header:])
+        offsets[index:index + 1] = (offset, offset + header)
+        continue
+      lines = text.split("\n")
+      lineOffsets = list(compress(accumulate(map(add, map(len, lines), repeat(1)), initial=offset), lines)) # Empty lines have no token.
+      lines = list(filter(None, lines))
+      kinds[index:index + 1] = [longKinds[kinds[index]]] * len(lines)
+      texts[index:index + 1] = lines
+      offsets[index:index + 1] = lineOffsets
+
+  def lexLine(self, line, lineNumber=1, state=codeState):
+    '''
+    Lexes one line of source code.
+
+    Parameters
+    ----------
+    line: string
+      The line, without its line ending.
+    lineNumber: int
+      The line's number, for the tokens' positions.
+    state: string
+      The state the line starts in: the state the line before ended in, or codeState for the first line.
+
+    Returns
+    -------
+    tuple
+      The list of Tokens on the line, and the state it ends in.
+    '''
+    kinds, texts, offsets, endState = self.lexText(line, state)
+    return (list(map(Token, kinds, texts, repeat(lineNumber), map(add, offsets, repeat(1)))), endState)
+
+  def iterateTokens(self, lines, state=codeState, blockLines=1 << 14):
+    '''
+    Lexes source code a large block of lines at a time, so files of any size can be lexed without reading them in whole.
+
+    Parameters
+    ----------
+    lines: iterable
+      The lines of the source code, e.g. an open file.  Line endings are ignored.
+    state: string
+      The state the first line starts in.
+    blockLines: int
+      How many lines to lex at once.
+
+    Yields
+    ------
+    Token
+      Each token, in order.
+    '''
+    lines = iter(lines)
+    lineNumber = 1
+    while True:
+      block = [line.rstrip("\r\n") for line in islice(lines, blockLines)]
+      if not block:
+        return
+      text = "\n".join(block)
+      kinds, texts, offsets, state = self.lexText(text, state)
+      tokenLines, columns = tokenPositions(text, offsets, lineNumber)
+      yield from map(tuple.__new__, repeat(Token), zip(kinds, texts, tokenLines, columns)) # Token's own constructor is a Python function; tuple's isn't.
+      lineNumber += len(block)
+
   def tokeniseParagraph(self, data):
     '''
-    Tokenises paragraphs (or in C's case, functions), when given sample data (source code)
+    Tokenises paragraphs (or in C's case, functions), when given sample data (source code).  A paragraph ends with the line which closes a block at the top level (a function body, or a struct, enum or initialiser), and takes in everything since the paragraph before: the function's comments, prototypes and directives.
+    The lexer keeps the source it was last given, so calling this again on an edited copy only re-lexes the lines the edit changed (see IncrementalLexer).
 
     Parameters
     ----------
@@ -180,11 +531,14 @@ class CLexer:
     list
       A list of the paragraphs.
     '''
-    pass
+    if self.document is None:
+      self.document = IncrementalLexer(self)
+    self.document.update(data)
+    return self.document.paragraphs()
 
   def tokeniseSentence(self, paragraph):
     '''
-    Tokenises sentences (or in C's case, commands), when given a sample paragraph (C function)
+    Tokenises sentences (or in C's case, commands), when given a sample paragraph (C function).  A command ends with a semicolon or a brace, and a directive with its line.
 
     Parameters
     ----------
@@ -194,9 +548,31 @@ class CLexer:
     Returns
     -------
     list
-      A list of the sentences.
+      A list of the sentences, each a list of Tokens.  Comments are left out.
     '''
-    pass
+    sentences = []
+    sentence = []
+    state = codeState
+    for lineNumber, line in enumerate(paragraph.split("\n"), 1):
+      tokens, endState = self.lexLine(line.rstrip("\r"), lineNumber, state)
+      inDirective = state == directiveState or (bool(tokens) and tokens[0].kind == "directive")
+      for token in tokens:
+        if token.kind == "comment":
+          continue
+        if token.kind == "directive" and sentence:
+          sentences.append(sentence)
+          sentence = []
+        sentence.append(token)
+        if not inDirective and token.text in sentenceEnds:
+          sentences.append(sentence)
+          sentence = []
+      if inDirective and endState != directiveState and sentence: # The directive ends with its last continued line.
+        sentences.append(sentence)
+        sentence = []
+      state = endState
+    if sentence:
+      sentences.append(sentence)
+    return sentences
 
   def tokeniseWords(self, sentence):
     '''
@@ -210,6 +586,200 @@ class CLexer:
     Returns
     -------
     list
-      A list of the words.
+      A list of the words, as Tokens.
+    '''
+    return list(self.iterateTokens(sentence.split("\n")))
+
+class IncrementalLexer:
+  '''
+  IncrementalLexer
+
+  A source file held as lines, with each line's tokens, the state it ends in, and the brace depth it starts at.  After an edit, only the edited lines are lexed again, and then the lines after them until they start in the same state and at the same depth as they did before, so the tokens are always the same as lexing the whole file again.
+  Lines are lexed through a cache keyed by their text and the state they start in, so lines which were lexed before (in this file or any other) are not lexed again.
+  '''
+
+  def __init__(self, lexer=None, maxCacheEntries=1 << 20):
+    '''
+    Constructor for an empty source file.
+
+    Parameters
+    ----------
+    lexer: CLexer
+      The lexer to lex lines with.  A new one if None.
+    maxCacheEntries: int
+      The most lines to cache.  The cache is emptied when it fills.
+    '''
+    self.lexer = lexer if lexer is not None else CLexer()
+    self.maxCacheEntries = maxCacheEntries
+    self.cache = {} # (state, line) to the line's tokens (without their line number), the state it ends in, and its braces.
+    self.lexiconSize = len(self.lexer.lexicon) # The cached keywords are stale if words are added to the lexicon.
+    self.lines = []
+    self.entries = [] # The cache entry of each line.
+    self.depths = [0] # The brace depth each line starts at, and the depth at the end.
+    self.closes = [] # Whether each line closes a block at the top level.
+    self.hits = 0
+    self.misses = 0
+    self.linesLexed = 0 # Lines lexed by edits, whether they hit the cache or not.
+
+  def lexLine(self, line, state):
+    '''
+    Lexes a line, or finds it in the cache.
+
+    Parameters
+    ----------
+    line: string
+      The line, without its line ending.
+    state: string
+      The state the line starts in.
+
+    Returns
+    -------
+    tuple
+      The line's tokens as (kind, text, column) tuples, the state it ends in, and its braces outside directives, as a string of "{" and "}".
+    '''
+    key = (state, line)
+    entry = self.cache.get(key)
+    if entry is not None:
+      self.hits += 1
+      return entry
+    self.misses += 1
+    kinds, texts, offsets, endState = self.lexer.lexText(line.rstrip("\r"), state)
+    braces = ""
+    if state != directiveState and not (kinds and kinds[0] == "directive"):
+      braces = "".join(map(braceKinds.__getitem__, filter(braceKinds.__contains__, texts)))
+    entry = (tuple(zip(kinds, texts, map(add, offsets, repeat(1)))), endState, braces)
+    if len(self.cache) >= self.maxCacheEntries:
+      self.cache.clear()
+    self.cache[key] = entry
+    return entry
+
+  def edit(self, first, last, newLines):
+    '''
+    Replaces some of the lines, and re-lexes as few lines as it can.
+
+    Parameters
+    ----------
+    first: int
+      The index (from 0) of the first line to replace.
+    last: int
+      The index after the last line to replace.  first, to insert lines without replacing any.
+    newLines: list
+      The new lines, without their line endings.
+
+    Returns
+    -------
+    tuple
+      The range of line indices (first, end) which were lexed again, after the edit.
+    '''
+    if len(self.lexer.lexicon) != self.lexiconSize: # Keywords have changed, so every line has to be lexed again.
+      self.lexiconSize = len(self.lexer.lexicon)
+      self.cache.clear()
+      newLines = self.lines[:first] + list(newLines) + self.lines[last:]
+      first, last = 0, len(self.lines)
+    entries = self.entries
+    depths = self.depths
+    state = entries[first - 1][1] if first else codeState
+    depth = depths[first]
+    newEntries = []
+    newDepths = []
+    newCloses = []
+    lines = list(newLines)
+    position = last
+    while True:
+      if len(newEntries) >= len(lines): # Past the edit: stop once a line starts as it did before.
+        if position == len(self.lines) or (state == (entries[position - 1][1] if position else codeState) and depth == depths[position]):
+          break
+        lines.append(self.lines[position])
+        position += 1
+      entry = self.lexLine(lines[len(newEntries)], state)
+      newEntries.append(entry)
+      newDepths.append(depth)
+      closes = False
+      for brace in entry[2]:
+        if brace == "{":
+          depth += 1
+        elif depth: # A stray closing brace is ignored.
+          depth -= 1
+          closes = not depth
+      newCloses.append(closes and not depth)
+      state = entry[1]
+    self.linesLexed += len(newEntries)
+    self.lines[first:position] = lines
+    entries[first:position] = newEntries
+    depths[first:position + 1] = newDepths + [depth]
+    self.closes[first:position] = newCloses
+    return (first, first + len(newEntries))
+
+  def update(self, text):
+    '''
+    Replaces the whole source with a new version, re-lexing only the lines between the first and last lines which differ.
+
+    Parameters
+    ----------
+    text: string
+      The new source.
+
+    Returns
+    -------
+    tuple
+      The range of line indices which were lexed again.
+    '''
+    newLines = text.split("\n")
+    oldLines = self.lines
+    prefix = 0
+    limit = min(len(oldLines), len(newLines))
+    while prefix < limit and oldLines[prefix] == newLines[prefix]:
+      prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and oldLines[-1 - suffix] == newLines[-1 - suffix]:
+      suffix += 1
+    return self.edit(prefix, len(oldLines) - suffix, newLines[prefix:len(newLines) - suffix])
+
+  def text(self):
+    '''
+    The whole source.
+    '''
+    return "\n".join(self.lines)
+
+  def iterateTokens(self):
+    '''
+    Every token in the source, in order, the same as CLexer.iterateTokens gives for the whole source.
+
+    Yields
+    ------
+    Token
+      Each token, in order.
+    '''
+    for lineNumber, entry in enumerate(self.entries, 1):
+      for kind, text, column in entry[0]:
+        yield Token(kind, text, lineNumber, column)
+
+  def paragraphRanges(self):
+    '''
+    The lines of each paragraph (see CLexer.tokeniseParagraph).
+
+    Returns
+    -------
+    list
+      The range of line indices (first, end) of each paragraph, in order.
+    '''
+    ranges = []
+    start = 0
+    for end in compress(range(1, len(self.lines) + 1), self.closes):
+      ranges.append((start, end))
+      start = end
+    if any(line.strip() for line in self.lines[start:]): # Whatever follows the last block.
+      ranges.append((start, len(self.lines)))
+    return ranges
+
+  def paragraphs(self):
+    '''
+    The text of each paragraph (see CLexer.tokeniseParagraph).
+
+    Returns
+    -------
+    list
+      The paragraphs, in order.
     '''
-    pass
\ No newline at end of file
+    return ["\n".join(self.lines[start:end]) for start, end in self.paragraphRanges()]
@@ -12,10 +12,14 @@ Authors
 """
 
 import nltk # Natural Language Processing Toolkit
+import os # Filesystem paths
 import string # String lib - used to remove punctuation
-from nltk.text import Text # Text class - methods for parsing a text.
-from cLexer import *
-from cSynter import *
+import sys # Module search path
+from cLexer import CLexer # The C lexer
+import concordanceIndex # Positional index for concordance queries
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # The shared modules live in the repository root.
+import wordTokenisers # Word tokenisation engines
 
 # nltk.download() # Open NLTK package Downloader
 
@@ -31,14 +35,28 @@ def lexer(text):
   Returns
   -------
   list
-    The list of tokens.
+    The list of tokens, as strings.  Comments are left out.
   """
-  # TODO: build lexical analyser
   # SEE: https://github.com/gcc-mirror/gcc/blob/master/libcpp/lex.c
   # SEE: https://gcc.gnu.org/onlinedocs/cppinternals/Lexer.html
   # SEE: https://cs.wmich.edu/~gupta/teaching/cs4850/sumII06/The%20syntax%20of%20C%20in%20Backus-Naur%20form.htm
   clex = CLexer()
-  csyn = CSynter()
+  return [token.text for token in clex.tokeniseWords(text) if token.kind != "comment"]
+
+def splitLexer(text):
+  """
+  This method tokenises C by splitting it on spaces, newlines and braces, as lexer() did before CLexer could tokenise words.  Kept for comparison.
+  
+  Parameters
+  ----------
+  text: string
+    The string of language.
+    
+  Returns
+  -------
+  list
+    The list of tokens.
+  """
   textList = text.split(" ")
   textList = [y  for x in textList for y in x.split('\n')]
   textList = [y  for x in textList for y in x.split('{')]
@@ -54,7 +72,7 @@ def tokeniseText(text, method):
   text: string
     The text to tokenise.
   method: string
-    The method by which to tokenise the text (word_native, word_naive_with_spaces, lexical_analysis).
+    The method by which to tokenise the text (word_native, word_fast, word_naive_with_spaces, lexical_analysis).
     
   Returns
   -------
@@ -67,6 +85,8 @@ def tokeniseText(text, method):
     # Strip out punctuation tokens
     tokItems = ["".join(j.lower() for j in i if j not in string.punctuation)
       for i in tokens]
+  elif (method == "word_fast"): # The same tokens as word_native, from the fast engine in wordTokenisers.py
+    tokItems = wordTokenisers.tokeniseText(text, "fast")
   elif (method == "word_naive_with_spaces"):
     tokItems = text.split(" ")
   elif (method == "lexical_analysis"):
@@ -104,6 +124,24 @@ def pullText():
     data = file.read()
   return data
   
+def buildIndex(tokenisedItems):
+  """
+  This method, given a list of tokens, builds the positional index which answers concordance queries on them.
+  
+  Parameters
+  ----------
+  tokenisedItems: list
+    The tokens.
+    
+  Returns
+  -------
+  PositionalIndex
+    The index (see concordanceIndex.py).  Build it once and query it as often as needed.
+  """
+  index = concordanceIndex.PositionalIndex()
+  index.addDocument("exampleText.c", tokenisedItems)
+  return index
+
 def runTests(sampleData):
   """
   This method times and runs the two tests: tokenisation and frequency distribution.
@@ -112,35 +150,29 @@ def runTests(sampleData):
   ----------
   sampleData: string
     The test data to run the tests on.
+    
+  Returns
+  -------
+  dict
+    The concordance lines found for each tokenisation method, then each query.
   """
+  concordances = {}
   # Run tests using NLTK's native word tokenisation.
   tokenisedItems = tokeniseText(sampleData, "word_native")
   freq = buildFrequencyDistributionData(tokenisedItems)
   freq.plot(50, cumulative=False) # Plot a frequency graph (first 50 words)
-  print("Finding concordance data for word-tokeinsed C")
-  dataText = Text(tokenisedItems)
-  print("Finding \"include\"")
-  dataText.concordance("include")
-  print("Finding \"#include\"")
-  dataText.concordance("#include")
-
-  # Run tests using a naive method of tokenisation with spaces.
-  tokenisedItems = tokeniseText(sampleData, "word_naive_with_spaces")
-  print("Finding concordance data for naively-tokenised C")
-  dataText = Text(tokenisedItems)
-  print("Finding \"include\"")
-  dataText.concordance("include")
-  print("Finding \"#include\"")
-  dataText.concordance("#include")
-
-  # Run tests using custom lexical analysis.
-  tokenisedItems = tokeniseText(sampleData, "lexical_analysis")
-  print("Finding concordance data for lexical-analysis-tokenised C")
-  dataText = Text(tokenisedItems)
-  print("Finding \"include\"")
-  dataText.concordance("include")
-  print("Finding \"#include\"")
-  dataText.concordance("#include")
+
+  for method, description in [("word_native", "word-tokeinsed"), ("word_naive_with_spaces", "naively-tokenised"), ("lexical_analysis", "lexical-analysis-tokenised")]:
+    if method != "word_native":
+      tokenisedItems = tokeniseText(sampleData, method)
+    print("Finding concordance data for " + description + " C")
+    index = buildIndex(tokenisedItems) # Indexed once, for every query.
+    concordances[method] = {}
+    for query in ["include", "#include"]:
+      print("Finding \"" + query + "\"")
+      concordances[method][query] = index.findConcordance(query)
+      index.printConcordance(query)
+  return concordances
 
 def main():
   """
@@ -5,11 +5,22 @@ class CSynter:
   Basic tools for syntactic analysis of the C Programming Language, up to C17 and the proposed standards for C23.
   '''
   # A list of grammatical symbols used in the C Programming language
-  # TODO: Complete this list.  THere must be symbols I'm missing.
   grammaticalSymbolList = [
-    "!", "\"", "\\", "%", "^", "&", "*", "(", 
-    ")", "|", "[", "]", "{", "}", "-", "+", 
-    "=", "/", ",", ".", ":", ";", "?", "<", 
-    ">", "'"]
-  
-  
\ No newline at end of file
+    "!", "\"", "\\", "%", "^", "&", "*", "(",
+    ")", "|", "[", "]", "{", "}", "-", "+",
+    "=", "/", ",", ".", ":", ";", "?", "<",
+    ">", "'", "~", "#"]
+
+  # The grammatical symbols made of more than one character.  A lexer must match the longest one it can (maximal munch), so "<<=" is one symbol, not "<" "<" "=".
+  compoundSymbolList = [
+    # Up to C17:
+    "->", "++", "--", "<<", ">>", "<=", ">=", "==", "!=", "&&", "||",
+    "*=", "/=", "%=", "+=", "-=", "<<=", ">>=", "&=", "^=", "|=",
+    "...", "##",
+    # Digraphs, the alternative spellings of [ ] { } # and ##:
+    "<:", ":>", "<%", "%>", "%:", "%:%:",
+    # To be added in C23:
+    "::"]
+
+  # Symbols which are part of other tokens (string and character literals, and line splices), rather than symbols in their own right.
+  literalSymbolList = ["\"", "'", "\\"]
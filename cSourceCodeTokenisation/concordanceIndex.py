@@ -0,0 +1,284 @@
+"""
+concordanceIndex.py
+
+A positional inverted index of a token stream, for concordance (keyword in context) queries.
+
+nltk.Text.concordance builds an index of every token's offsets the first time it is called on a Text, and then prints its results.  PositionalIndex builds the same index (keyed by lower-cased token, as Text.concordance's is) once, can be saved to disk and loaded again, and returns its results as the same ConcordanceLine tuples nltk.Text.concordance prints.
+A query only looks at the offsets of its words, so its cost depends on the number of hits, not the length of the stream.  An index may hold several documents (e.g. every file of a codebase) one after another; documentOf gives the document a hit is in.
+
+Usage:
+  python3 concordanceIndex.py build index method source [source ...]   Tokenise each C file (or every .c and .h file under each directory) and save the index.
+  python3 concordanceIndex.py query index word [word ...]              Print the concordance of each word from a saved index.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import bisect # Finding the document an offset is in
+import os # Filesystem paths
+import pickle # Saving the index
+import sys # Command line arguments
+import time # time library
+from array import array # Compact arrays of offsets
+
+class PositionalIndex:
+  '''
+  PositionalIndex
+
+  The offsets at which each (lower-cased) token occurs in a stream of tokens.
+  '''
+
+  def __init__(self):
+    '''
+    Constructor for an empty index.
+    '''
+    self.tokens = [] # The whole stream, for the context of each hit.
+    self.postings = {} # Lower-cased token to an array of its offsets, in order.
+    self.documents = [] # The name of each document in the stream.
+    self.documentStarts = [] # The offset each document starts at.
+
+  def addDocument(self, name, tokens):
+    '''
+    Adds a document's tokens to the end of the stream and indexes them.
+
+    Parameters
+    ----------
+    name: string
+      The name of the document, e.g. its path.
+    tokens: list
+      The document's tokens.
+    '''
+    start = len(self.tokens)
+    self.documents.append(name)
+    self.documentStarts.append(start)
+    self.tokens.extend(tokens)
+    postings = self.postings
+    for offset, token in enumerate(tokens, start):
+      key = token.lower()
+      offsets = postings.get(key)
+      if offsets is None:
+        offsets = postings[key] = array("q")
+      offsets.append(offset)
+
+  def offsets(self, word):
+    '''
+    The offsets at which a word occurs, ignoring case.
+
+    Parameters
+    ----------
+    word: string
+      The word.
+
+    Returns
+    -------
+    array
+      The offsets, in order.
+    '''
+    return self.postings.get(word.lower(), array("q"))
+
+  def documentOf(self, offset):
+    '''
+    The name of the document an offset is in.
+
+    Parameters
+    ----------
+    offset: int
+      An offset in the stream.
+
+    Returns
+    -------
+    string
+      The document's name.
+    '''
+    return self.documents[bisect.bisect_right(self.documentStarts, offset) - 1]
+
+  def documentRange(self, offset):
+    '''
+    The offsets of the first token of the document an offset is in, and of the first token after it.
+
+    Parameters
+    ----------
+    offset: int
+      An offset in the stream.
+
+    Returns
+    -------
+    tuple
+      The document's start and end offsets.
+    '''
+    document = bisect.bisect_right(self.documentStarts, offset) - 1
+    start = self.documentStarts[document] if document >= 0 else 0
+    end = self.documentStarts[document + 1] if document + 1 < len(self.documentStarts) else len(self.tokens)
+    return (start, end)
+
+  def phraseOffsets(self, phrase):
+    '''
+    The offsets at which a phrase occurs within a document, ignoring case.  Only the offsets of its rarest word are visited.
+
+    Parameters
+    ----------
+    phrase: list
+      The words of the phrase.
+
+    Returns
+    -------
+    list
+      The offsets of the first word of each occurrence, in order.
+    '''
+    keys = [word.lower() for word in phrase]
+    rarest = min(range(len(keys)), key=lambda i: len(self.offsets(keys[i])))
+    tokens = self.tokens
+    found = []
+    for offset in self.offsets(keys[rarest]):
+      start = offset - rarest
+      if start >= 0 and start + len(keys) <= len(tokens) and all(tokens[start + i].lower() == keys[i] for i in range(len(keys))) and start + len(keys) <= self.documentRange(start)[1]:
+        found.append(start)
+    return found
+
+  def findConcordance(self, word, width=79):
+    '''
+    Finds every occurrence of a word or phrase with its context, as nltk.Text.concordance would print them.  The context stops at the edges of the hit's document.
+
+    Parameters
+    ----------
+    word: string or list
+      The word, or the words of a phrase.
+    width: int
+      The width of each line, in characters.
+
+    Returns
+    -------
+    list
+      A ConcordanceLine for each occurrence, in order.
+    '''
+    import unicodedata # Text.concordance doesn't count combining characters in the width
+    from nltk.text import ConcordanceLine # The results, as NLTK gives them
+    from nltk.util import cut_string
+    phrase = word if isinstance(word, list) else [word]
+    phraseLength = sum(1 for character in " ".join(phrase) if not unicodedata.combining(character))
+    halfWidth = (width - phraseLength - 2) // 2
+    context = width // 4 # Roughly how many words of context fit.
+    tokens = self.tokens
+    lines = []
+    for offset in self.phraseOffsets(phrase):
+      queryWord = " ".join(tokens[offset:offset + len(phrase)])
+      documentStart, documentEnd = self.documentRange(offset)
+      leftContext = tokens[max(documentStart, offset - context):offset]
+      rightContext = tokens[offset + len(phrase):min(documentEnd, offset + context)]
+      leftPrint = cut_string(" ".join(leftContext), -halfWidth).rjust(halfWidth)
+      rightPrint = cut_string(" ".join(rightContext), halfWidth)
+      lines.append(ConcordanceLine(leftContext, queryWord, rightContext, offset, leftPrint, rightPrint, " ".join([leftPrint, queryWord, rightPrint])))
+    return lines
+
+  def printConcordance(self, word, width=79, lines=25):
+    '''
+    Prints the concordance of a word or phrase, as nltk.Text.concordance does.
+
+    Parameters
+    ----------
+    word: string or list
+      The word, or the words of a phrase.
+    width: int
+      The width of each line, in characters.
+    lines: int
+      The most lines to print.
+    '''
+    concordanceList = self.findConcordance(word, width)
+    if not concordanceList:
+      print("no matches")
+    else:
+      lines = min(lines, len(concordanceList))
+      print("Displaying " + str(lines) + " of " + str(len(concordanceList)) + " matches:")
+      for concordanceLine in concordanceList[:lines]:
+        print(concordanceLine.line)
+
+  def save(self, path):
+    '''
+    Saves the index to a file, replacing it atomically.
+
+    Parameters
+    ----------
+    path: string
+      The file.
+    '''
+    temporaryPath = path + "." + str(os.getpid()) + ".tmp"
+    with open(temporaryPath, "wb") as file:
+      pickle.dump({"tokens": self.tokens, "postings": self.postings, "documents": self.documents, "documentStarts": self.documentStarts}, file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporaryPath, path)
+
+  @classmethod
+  def load(cls, path):
+    '''
+    Loads an index saved by save.
+
+    Parameters
+    ----------
+    path: string
+      The file.
+
+    Returns
+    -------
+    PositionalIndex
+      The index.
+    '''
+    with open(path, "rb") as file:
+      saved = pickle.load(file)
+    index = cls()
+    index.tokens = saved["tokens"]
+    index.postings = saved["postings"]
+    index.documents = saved["documents"]
+    index.documentStarts = saved["documentStarts"]
+    return index
+
+def sourceFiles(sources):
+  """
+  This method lists the C files to index, expanding each directory into the .c and .h files under it.
+
+  Parameters
+  ----------
+  sources: list
+    Files and directories.
+
+  Returns
+  -------
+  list
+    The file paths, in order.
+  """
+  paths = []
+  for source in sources:
+    if os.path.isdir(source):
+      for directory, subdirectories, files in os.walk(source):
+        subdirectories.sort()
+        paths.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith((".c", ".h")))
+    else:
+      paths.append(source)
+  return paths
+
+def main():
+  """
+  Entrypoint: builds an index, or queries a saved one.
+  """
+  arguments = sys.argv[1:]
+  if arguments[:1] == ["build"] and len(arguments) >= 4:
+    from cSourceCodeTokenisationTest import tokeniseText # The tokenisation methods being compared
+    startTime = time.time()
+    index = PositionalIndex()
+    for path in sourceFiles(arguments[3:]):
+      with open(path, "r", encoding="utf-8", errors="replace") as file:
+        index.addDocument(path, tokeniseText(file.read(), arguments[2]))
+    index.save(arguments[1])
+    print ("Indexed " + str(len(index.tokens)) + " tokens (" + str(len(index.postings)) + " distinct) in " + str(len(index.documents)) + " files in: \t", time.time() - startTime)
+  elif arguments[:1] == ["query"] and len(arguments) >= 3:
+    startTime = time.time()
+    index = PositionalIndex.load(arguments[1])
+    print ("Loaded in: \t", time.time() - startTime)
+    for word in arguments[2:]:
+      print ("Finding \"" + word + "\"")
+      index.printConcordance(word)
+  else:
+    print(__doc__)
+
+if __name__ == "__main__":
+  main()
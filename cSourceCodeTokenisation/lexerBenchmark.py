@@ -0,0 +1,129 @@
+"""
+lexerBenchmark.py
+
+Benchmarking CLexer against the old split-based lexer, in MB/s, and re-lexing after small edits with IncrementalLexer against lexing the whole file again.
+
+Both lexers are given each file whole.  CLexer is timed twice: lexing it into columns with lexText, and streaming it from disk into Tokens with iterateTokens.
+
+Usage:
+  python3 lexerBenchmark.py [source ...]
+
+Each source is a C file, or a directory whose .c and .h files are all lexed.  The incremental benchmark edits the largest file.  By default, exampleText.c is repeated to make a file of a few megabytes.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import os # Filesystem paths
+import random # Choosing the lines to edit
+import sys # Command line arguments
+import tempfile # The default benchmark file
+import time # time library
+from collections import Counter # Counting token kinds
+from cLexer import CLexer, IncrementalLexer # The lexers being benchmarked
+from cSourceCodeTokenisationTest import splitLexer # The lexer it replaces
+from concordanceIndex import sourceFiles # Expanding directories into files
+
+def runTests(paths):
+  """
+  This method lexes each file with both lexers, and reports their throughput.
+
+  Parameters
+  ----------
+  paths: list
+    The C files.
+  """
+  totalBytes = sum(os.path.getsize(path) for path in paths)
+
+  startTime = time.time()
+  splitTokens = 0
+  for path in paths:
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+      splitTokens += len(splitLexer(file.read()))
+  splitTime = time.time() - startTime
+
+  clex = CLexer()
+  kinds = Counter()
+  startTime = time.time()
+  for path in paths:
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+      kinds.update(clex.lexText(file.read())[0])
+  lexTime = time.time() - startTime
+
+  streamedTokens = 0
+  startTime = time.time()
+  for path in paths:
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as file:
+      streamedTokens += sum(1 for token in clex.iterateTokens(file))
+  streamTime = time.time() - startTime
+
+  megabytes = totalBytes / 1e6
+  print ("  " + str(len(paths)) + " files, " + str(megabytes) + " MB")
+  print ("  Split lexer: \t", splitTime, "\tMB/s: \t", megabytes / splitTime, "\ttokens: \t", splitTokens)
+  print ("  CLexer: \t", lexTime, "\tMB/s: \t", megabytes / lexTime, "\ttokens: \t", sum(kinds.values()))
+  print ("  CLexer Tokens: \t", streamTime, "\tMB/s: \t", megabytes / streamTime, "\ttokens: \t", streamedTokens)
+  print ("  Tokens by kind: \t", dict(kinds.most_common()))
+
+def runIncrementalTests(path, edits=200):
+  """
+  This method makes small edits to a file one at a time, re-lexing it after each with IncrementalLexer, and compares that with lexing the whole file again.  The tokens and paragraphs after the last edit are checked against a full re-lex.
+
+  Parameters
+  ----------
+  path: string
+    The C file.
+  edits: int
+    How many edits to make.
+  """
+  with open(path, "r", encoding="utf-8", errors="replace") as file:
+    text = file.read()
+  lines = text.split("\n")
+  random.seed(0) # The same edits every run.
+
+  startTime = time.time()
+  document = IncrementalLexer()
+  document.update(text)
+  loadTime = time.time() - startTime
+
+  linesLexed, hits, misses = document.linesLexed, document.hits, document.misses
+  startTime = time.time()
+  for i in range(edits):
+    lineIndex = random.randrange(len(lines))
+    lines[lineIndex] = lines[lineIndex] + " x" + str(i) + ";" # A new line, which can't be in the cache.
+    document.edit(lineIndex, lineIndex + 1, [lines[lineIndex]])
+  editTime = time.time() - startTime
+
+  startTime = time.time()
+  fullTokens = list(CLexer().iterateTokens(lines))
+  fullTime = time.time() - startTime
+  fullParagraphs = IncrementalLexer()
+  fullParagraphs.update("\n".join(lines))
+
+  print ("  Full lex: \t", fullTime, "\tfirst IncrementalLexer load: \t", loadTime)
+  print ("  " + str(edits) + " one-line edits: \t", editTime, "\tper edit: \t", editTime / edits, "\tspeed-up over a full re-lex: \t", fullTime * edits / editTime)
+  print ("  Lines lexed by the edits: \t", document.linesLexed - linesLexed, "\tcache hits: \t", document.hits - hits, "\tmisses: \t", document.misses - misses)
+  if list(document.iterateTokens()) != fullTokens or document.paragraphRanges() != fullParagraphs.paragraphRanges():
+    print ("  WARNING: the incremental tokens or paragraphs differ from a full re-lex.")
+
+def main():
+  """
+  Entrypoint: benchmarks the sources given on the command line, or a large copy of the example program.
+  """
+  if sys.argv[1:]:
+    paths = sourceFiles(sys.argv[1:])
+    runTests(paths)
+    runIncrementalTests(max(paths, key=os.path.getsize))
+    return
+  with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "exampleText.c"), "r") as file:
+    example = file.read()
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "example.c")
+    with open(path, "w") as file:
+      file.write(example * (4 * 1024 * 1024 // len(example)))
+    runTests([path])
+    runIncrementalTests(path)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,199 @@
+"""
+treeLexing.py
+
+Lexing every C file in a directory tree across a pool of processes, and merging the frequencies of their keywords and identifiers.
+
+Files are handed to the pool largest first, so the biggest files don't start last and hold up the end of the run.  Each file's results are cached on disk, keyed by its path, modification time and size, so a rerun skips the files which haven't changed.  A file whose time or size has changed is hashed, and is only lexed again if its contents have changed too.
+
+Usage:
+  python3 treeLexing.py [--cache file] [--processes n] [--top n] source [source ...]
+
+Each source is a C file, or a directory whose .c and .h files are all lexed.  The cache is kept in .lexcache in the repository root by default, or where the NATLANG_LEX_CACHE environment variable says.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import hashlib # Content hashing
+import os # Filesystem paths
+import pickle # The cache file
+import sys # Command line arguments, and the module search path
+import time # time library
+from collections import Counter # Counting keywords and identifiers
+from itertools import compress # Picking the keywords and identifiers out of the lexed columns
+from cLexer import CLexer # The lexer
+from concordanceIndex import sourceFiles # Expanding directories into files
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # The shared modules live in the repository root.
+import frequencyMerge # Compact counts to send back from workers
+import workerResources # The shared pool
+
+# Where the cache is kept when none is given.
+defaultCachePath = os.environ.get("NATLANG_LEX_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".lexcache", "files.pickle"))
+
+# The version of the cache's layout.  A cache of any other version is ignored.
+cacheVersion = 1
+
+# Each worker's lexer, made on first use.
+workerLexer = None
+
+def lexFile(job):
+  """
+  This method lexes a file in a worker, and counts its keywords and identifiers.
+
+  Parameters
+  ----------
+  job: tuple
+    The file's path, modification time (in nanoseconds) and size, and the content hash it was cached with (or None).
+
+  Returns
+  -------
+  tuple
+    The path, modification time, size and content hash, then the number of tokens and the packed keyword and identifier counts (see frequencyMerge.packCounts).  The last three are None if the file's contents match the cached hash.
+  """
+  global workerLexer
+  path, modified, size, cachedDigest = job
+  with open(path, "rb") as file:
+    data = file.read()
+  digest = hashlib.sha256(data).hexdigest()
+  if digest == cachedDigest:
+    return (path, modified, size, digest, None, None, None)
+  if workerLexer is None:
+    workerLexer = CLexer()
+  kinds, texts, offsets, state = workerLexer.lexText(data.decode("utf-8", errors="replace").replace("\r\n", "\n")) # The whole file at once, without making a Token of each.
+  keywords = Counter(compress(texts, map("keyword".__eq__, kinds)))
+  identifiers = Counter(compress(texts, map("identifier".__eq__, kinds)))
+  return (path, modified, size, digest, len(kinds), frequencyMerge.packCounts(keywords), frequencyMerge.packCounts(identifiers))
+
+def loadCache(path):
+  """
+  This method loads the cache of lexed files.
+
+  Parameters
+  ----------
+  path: string
+    The cache file.
+
+  Returns
+  -------
+  dict
+    Each file's path to its modification time, size, content hash, number of tokens, and packed keyword and identifier counts.  Empty if there is no cache, or it can't be read.
+  """
+  try:
+    with open(path, "rb") as file:
+      saved = pickle.load(file)
+  except (OSError, EOFError, pickle.UnpicklingError):
+    return {}
+  if not isinstance(saved, dict) or saved.get("version") != cacheVersion:
+    return {}
+  return saved["files"]
+
+def saveCache(path, files):
+  """
+  This method saves the cache of lexed files, replacing it atomically.
+
+  Parameters
+  ----------
+  path: string
+    The cache file.
+  files: dict
+    The cache, as loadCache returns it.
+  """
+  os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+  temporaryPath = path + "." + str(os.getpid()) + ".tmp"
+  with open(temporaryPath, "wb") as file:
+    pickle.dump({"version": cacheVersion, "files": files}, file, pickle.HIGHEST_PROTOCOL)
+  os.replace(temporaryPath, path)
+
+def lexTree(sources, cachePath=None, pool=None):
+  """
+  This method lexes every C file under the sources, using the cache for the files which haven't changed, and merges their counts.
+
+  Parameters
+  ----------
+  sources: list
+    Files and directories.
+  cachePath: string
+    The cache file.  defaultCachePath if None.
+  pool: multiprocessing.Pool
+    The pool to lex in.  The shared pool if None.
+
+  Returns
+  -------
+  dict
+    The merged keyword and identifier counts (as FreqDists), the number of tokens, and the run's statistics: how many files there were, how many were found in the cache unchanged (statHits), how many had only been touched (hashHits), how many were lexed, and the time taken.
+  """
+  startTime = time.time()
+  cachePath = cachePath or defaultCachePath
+  cache = loadCache(cachePath)
+  jobs = []
+  stats = Counter()
+  files = {}
+  found = [os.path.abspath(path) for path in sourceFiles(sources)]
+  for path in found:
+    status = os.stat(path)
+    cached = cache.get(path)
+    if cached is not None and cached[0] == status.st_mtime_ns and cached[1] == status.st_size:
+      stats["statHits"] += 1
+      files[path] = cached
+    else:
+      jobs.append((path, status.st_mtime_ns, status.st_size, cached[2] if cached is not None else None))
+  jobs.sort(key=lambda job: job[2], reverse=True) # Largest first.
+
+  if jobs:
+    pool = pool or workerResources.getPool([])
+    for path, modified, size, digest, tokenCount, keywords, identifiers in pool.imap_unordered(lexFile, jobs):
+      if tokenCount is None: # Touched, but not changed.
+        stats["hashHits"] += 1
+        tokenCount, keywords, identifiers = cache[path][3:]
+      else:
+        stats["lexed"] += 1
+      files[path] = (modified, size, digest, tokenCount, keywords, identifiers)
+
+  for path, cached in cache.items(): # Keep the files from other trees, but not those deleted from this one.
+    if path not in files and os.path.exists(path):
+      files[path] = cached
+  if files != cache:
+    saveCache(cachePath, files)
+
+  from nltk import FreqDist # The merged counts, as the test script's frequency distributions are
+  keywordCounts = FreqDist()
+  identifierCounts = FreqDist()
+  tokenCount = 0
+  for path in found:
+    cached = files[path]
+    tokenCount += cached[3]
+    keywordCounts.update(frequencyMerge.unpackCounts(cached[4]))
+    identifierCounts.update(frequencyMerge.unpackCounts(cached[5]))
+  stats["files"] = len(found)
+  stats["seconds"] = time.time() - startTime
+  return {"keywords": keywordCounts, "identifiers": identifierCounts, "tokens": tokenCount, "stats": stats}
+
+def main():
+  """
+  Entrypoint: lexes the sources given on the command line, and reports the most common keywords and identifiers and how fast it went.
+  """
+  arguments = sys.argv[1:]
+  options = {"--cache": defaultCachePath, "--processes": None, "--top": "20"}
+  for option in options:
+    if option in arguments:
+      position = arguments.index(option)
+      options[option] = arguments[position + 1]
+      del arguments[position:position + 2]
+  if not arguments:
+    print(__doc__)
+    return
+  processes = int(options["--processes"]) if options["--processes"] else None
+  top = int(options["--top"])
+  result = lexTree(arguments, options["--cache"], workerResources.getPool([], processes))
+  stats = result["stats"]
+  print ("Keywords: \t", result["keywords"].most_common(top))
+  print ("Identifiers: \t", result["identifiers"].most_common(top))
+  print ("  " + str(stats["files"]) + " files, " + str(result["tokens"]) + " tokens in: \t", stats["seconds"], "\tfiles/s: \t", stats["files"] / stats["seconds"])
+  if stats["files"]:
+    print ("  Unchanged (cache hits): \t", stats["statHits"], "\ttouched but unchanged (hash hits): \t", stats["hashHits"], "\tlexed: \t", stats["lexed"], "\thit rate: \t", (stats["statHits"] + stats["hashHits"]) / stats["files"])
+
+if __name__ == "__main__":
+  main()
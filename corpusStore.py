@@ -0,0 +1,281 @@
+"""
+corpusStore.py
+
+An offline, content-addressed store for the sample texts used by the tests, so that the scripts read books from local disk instead of downloading them on every run.
+
+Each text is kept once, gzip-compressed, under .corpora/objects/<sha256 of the UTF-8 text>.txt.gz.  A small manifest (.corpora/manifest.json) maps the names used by the scripts onto those hashes.
+The only network access is the explicit "fetch" command, which imports the Project Gutenberg sources into the store.
+
+Usage:
+  python3 corpusStore.py fetch [name ...]   Download texts into the store (all known sources by default), several at once.
+  python3 corpusStore.py add name file      Add a local UTF-8 text file to the store under a name.
+  python3 corpusStore.py list               List the texts in the store.
+  python3 corpusStore.py bench [name ...]   Report cold (download) vs warm (local store) load times.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import gzip # Compression for stored texts
+import hashlib # Content hashing
+import json # Manifest format
+import os # Filesystem paths
+import sys # Command line arguments
+import time # time library
+import urllib.request # Python Website Crawler
+
+# The store lives next to this file, so scripts in subdirectories find the same store.  It can be moved with the NATLANG_CORPUS_STORE environment variable.
+storePath = os.environ.get("NATLANG_CORPUS_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".corpora"))
+
+# The texts used by the scripts, and where they were originally pulled from.
+gutenbergSources = {
+  "kjv": "https://www.gutenberg.org/files/10/10-0.txt", # The King James Version of the Bible
+  "shakespeare": "https://www.gutenberg.org/files/100/100-0.txt", # The Complete Works of William Shakespeare
+  "timeMachine": "https://www.gutenberg.org/files/35/35-0.txt", # HG Wells: The Time Machine
+  "islandOfDoctorMoreau": "https://www.gutenberg.org/files/159/159.txt", # HG Wells: The Island of Doctor Moreau
+  "lesMiserables": "https://www.gutenberg.org/files/135/135-0.txt" # Victor Hugo: Les Miserables
+}
+
+def manifestPath():
+  """
+  This method gives the location of the store's manifest.
+
+  Returns
+  -------
+  string
+    The path to manifest.json.
+  """
+  return os.path.join(storePath, "manifest.json")
+
+def objectPath(digest):
+  """
+  This method gives the location of a stored text, given its content hash.
+
+  Parameters
+  ----------
+  digest: string
+    The SHA-256 hex digest of the UTF-8 encoded text.
+
+  Returns
+  -------
+  string
+    The path to the compressed text.
+  """
+  return os.path.join(storePath, "objects", digest + ".txt.gz")
+
+def loadManifest():
+  """
+  This method reads the manifest, which maps text names onto content hashes and metadata.
+
+  Returns
+  -------
+  dict
+    The manifest entries, keyed by name.  Empty if the store has not been created yet.
+  """
+  if not os.path.exists(manifestPath()):
+    return {}
+  with open(manifestPath(), "r", encoding="utf-8") as file:
+    return json.load(file)
+
+def saveManifest(manifest):
+  """
+  This method writes the manifest atomically, so an interrupted write never leaves a broken store.
+
+  Parameters
+  ----------
+  manifest: dict
+    The manifest entries, keyed by name.
+  """
+  os.makedirs(storePath, exist_ok=True)
+  temporaryPath = manifestPath() + ".tmp"
+  with open(temporaryPath, "w", encoding="utf-8") as file:
+    json.dump(manifest, file, indent=2, sort_keys=True)
+  os.replace(temporaryPath, manifestPath())
+
+def addText(name, data, source=None, fetchSeconds=None):
+  """
+  This method adds a text to the store under a name.  Identical texts are only ever stored once.
+
+  Parameters
+  ----------
+  name: string
+    The name the scripts use for the text.
+  data: bytes or string
+    The text.  Bytes are taken to be UTF-8 (a leading byte order mark is dropped).
+  source: string
+    Where the text came from, for reference.
+  fetchSeconds: float
+    How long the text took to download, if it was downloaded.  Used to report the saving from reading locally.
+
+  Returns
+  -------
+  string
+    The content hash of the text.
+  """
+  if isinstance(data, bytes):
+    data = data.decode("utf-8-sig")
+  encoded = data.encode("utf-8")
+  digest = hashlib.sha256(encoded).hexdigest()
+  path = objectPath(digest)
+  if not os.path.exists(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporaryPath = path + ".tmp"
+    with gzip.open(temporaryPath, "wb") as file:
+      file.write(encoded)
+    os.replace(temporaryPath, path)
+  manifest = loadManifest()
+  manifest[name] = {
+    "sha256": digest,
+    "source": source,
+    "bytes": len(encoded),
+    "compressedBytes": os.path.getsize(path),
+    "fetchSeconds": fetchSeconds
+  }
+  saveManifest(manifest)
+  return digest
+
+def fetchText(name, url=None):
+  """
+  This method uses urllib to download a text and add it to the store.  This is the only part of the store which touches the network.
+
+  Parameters
+  ----------
+  name: string
+    The name to store the text under.
+  url: string
+    Where to download it from.  Defaults to the known Project Gutenberg source for the name.
+
+  Returns
+  -------
+  string
+    The content hash of the text.
+  """
+  if url is None:
+    url = gutenbergSources[name]
+  startTime = time.time()
+  response = urllib.request.urlopen(urllib.request.Request(url=url, headers={'User-Agent': 'Mozilla/5.0'}))
+  data = response.read()
+  fetchSeconds = time.time() - startTime
+  return addText(name, data, source=url, fetchSeconds=fetchSeconds)
+
+def entryFor(name):
+  """
+  This method finds the manifest entry for a name, explaining how to populate the store if it is missing.
+
+  Parameters
+  ----------
+  name: string
+    The name of the text.
+
+  Returns
+  -------
+  dict
+    The manifest entry.
+  """
+  manifest = loadManifest()
+  if name not in manifest:
+    raise FileNotFoundError("\"" + name + "\" is not in the corpus store at " + storePath + ".  Run: python3 corpusStore.py fetch " + name)
+  return manifest[name]
+
+def openText(name):
+  """
+  This method opens a stored text for incremental reading, decoding it as UTF-8 as it goes.
+
+  Parameters
+  ----------
+  name: string
+    The name of the text.
+
+  Returns
+  -------
+  file
+    A text-mode file object.  The caller closes it.
+  """
+  return gzip.open(objectPath(entryFor(name)["sha256"]), "rt", encoding="utf-8", newline="")
+
+def loadText(name):
+  """
+  This method reads a whole stored text from local disk.
+
+  Parameters
+  ----------
+  name: string
+    The name of the text.
+
+  Returns
+  -------
+  string
+    The text.
+  """
+  with gzip.open(objectPath(entryFor(name)["sha256"]), "rb") as file:
+    return file.read().decode("utf-8")
+
+def pullText(names):
+  """
+  This method is the drop-in replacement for the scripts' old pullText: it loads a list of texts from the store, with no network access.
+
+  Parameters
+  ----------
+  names: list
+    The names of the texts, in the order wanted.
+
+  Returns
+  -------
+  list
+    The texts, in string format.
+  """
+  return [loadText(name) for name in names]
+
+def benchmark(names):
+  """
+  This method reports how long each text took to download when it was fetched (cold), against how long it takes to load from the store (warm).
+
+  Parameters
+  ----------
+  names: list
+    The names of the texts to time.
+  """
+  manifest = loadManifest()
+  totalCold = 0.0
+  totalWarm = 0.0
+  print("Text\tBytes\tStored bytes\tCold (download) time\tWarm (store) time")
+  for name in names:
+    entry = manifest[name]
+    startTime = time.time()
+    loadText(name)
+    warmTime = time.time() - startTime
+    coldTime = entry["fetchSeconds"]
+    print(name + "\t" + str(entry["bytes"]) + "\t" + str(entry["compressedBytes"]) + "\t" + (str(coldTime) if coldTime is not None else "n/a") + "\t" + str(warmTime))
+    if coldTime is not None:
+      totalCold += coldTime
+    totalWarm += warmTime
+  print("Total cold time: \t", totalCold)
+  print("Total warm time: \t", totalWarm)
+
+def main():
+  """
+  Entrypoint: manages the store from the command line.
+  """
+  arguments = sys.argv[1:]
+  command = arguments[0] if arguments else "list"
+  if command == "fetch":
+    import asyncIngest # Concurrent downloads
+    names = arguments[1:] or list(gutenbergSources)
+    print("Fetching " + ", ".join(names))
+    for name, (text, fetchSeconds) in zip(names, asyncIngest.fetchTexts([gutenbergSources[name] for name in names])):
+      addText(name, text, source=gutenbergSources[name], fetchSeconds=fetchSeconds)
+  elif command == "add":
+    with open(arguments[2], "rb") as file:
+      addText(arguments[1], file.read(), source=os.path.abspath(arguments[2]))
+  elif command == "list":
+    for name, entry in sorted(loadManifest().items()):
+      print(name + "\t" + entry["sha256"][:12] + "\t" + str(entry["bytes"]) + " bytes\t" + str(entry["compressedBytes"]) + " stored")
+  elif command == "bench":
+    benchmark(arguments[1:] or sorted(loadManifest()))
+  else:
+    print(__doc__)
+
+if __name__ == "__main__":
+  main()
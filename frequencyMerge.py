@@ -0,0 +1,128 @@
+"""
+frequencyMerge.py
+
+Passing word counts back from pool workers compactly, and merging them into one corpus-wide frequency distribution.
+
+A FreqDist pickles as a dictionary, one string and one integer object at a time.  Workers instead return their counts "packed": the words joined into a single string and the counts in a single array, each compressed with zlib.  These pickle as two flat byte strings, well under half the size of the FreqDist, for about the same time to send.
+The per-document counts are then merged pairwise, level by level (a tree reduction), with each level's merges spread across the pool.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import pickle # Measuring the cost of sending counts between processes
+import zlib # Compression of packed counts
+from array import array # Compact arrays of numbers
+
+def packCounts(freq):
+  """
+  This method packs a frequency distribution into a compact form for sending between processes.
+
+  Parameters
+  ----------
+  freq: FreqDist
+    The frequency distribution (or any mapping of words to counts).
+
+  Returns
+  -------
+  tuple
+    The compressed words, separated by NUL characters, and the compressed array of their counts.
+  """
+  words = list(freq.keys())
+  joinedWords = "\0".join(words)
+  packedCounts = zlib.compress(array("q", freq.values()).tobytes(), 1)
+  if joinedWords.count("\0") != max(len(words) - 1, 0):
+    return (words, packedCounts) # A word contains a NUL, so it cannot be used as the separator.
+  return (zlib.compress(joinedWords.encode("utf-8"), 1), packedCounts)
+
+def unpackCounts(packed):
+  """
+  This method turns packed counts back into a frequency distribution.  Words keep the order they were packed in.
+
+  Parameters
+  ----------
+  packed: tuple
+    The counts, as returned by packCounts.
+
+  Returns
+  -------
+  FreqDist
+    The frequency distribution.
+  """
+  words, packedCounts = packed
+  if isinstance(words, bytes):
+    words = zlib.decompress(words).decode("utf-8").split("\0")
+  from nltk import FreqDist # Imported on first use, so workers which only pack counts never load NLTK here
+  counts = array("q")
+  counts.frombytes(zlib.decompress(packedCounts))
+  return FreqDist(dict(zip(words, counts)))
+
+def mergePackedCounts(first, second):
+  """
+  This method merges two sets of packed counts.
+
+  Parameters
+  ----------
+  first: tuple
+    Packed counts.
+  second: tuple
+    More packed counts.
+
+  Returns
+  -------
+  tuple
+    The packed sum of both sets of counts.
+  """
+  freq = unpackCounts(first)
+  freq.update(unpackCounts(second))
+  return packCounts(freq)
+
+def treeMerge(partials, pool=None):
+  """
+  This method merges any number of packed counts into one frequency distribution, a pair at a time, in a tree.
+  Each level of the tree halves the number of distributions, and the merges in a level run in parallel across the pool.
+
+  Parameters
+  ----------
+  partials: list
+    Packed counts, e.g. one per document.
+  pool: multiprocessing.Pool
+    The pool to merge in.  If None, everything is merged in this process.
+
+  Returns
+  -------
+  FreqDist
+    The merged frequency distribution.
+  """
+  level = list(partials)
+  if not level:
+    from nltk import FreqDist
+    return FreqDist()
+  while len(level) > 1:
+    pairs = [(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if pool is not None:
+      merged = pool.starmap(mergePackedCounts, pairs)
+    else:
+      merged = [mergePackedCounts(first, second) for first, second in pairs]
+    if len(level) % 2 == 1:
+      merged.append(level[-1]) # The odd one out goes up a level unmerged.
+    level = merged
+  return unpackCounts(level[0])
+
+def transferSizes(freq):
+  """
+  This method measures how many bytes a frequency distribution takes to send between processes, as a FreqDist and packed.
+
+  Parameters
+  ----------
+  freq: FreqDist
+    The frequency distribution.
+
+  Returns
+  -------
+  tuple
+    The pickled size of the FreqDist, and of its packed counts, in bytes.
+  """
+  return (len(pickle.dumps(freq, pickle.HIGHEST_PROTOCOL)), len(pickle.dumps(packCounts(freq), pickle.HIGHEST_PROTOCOL)))
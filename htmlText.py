@@ -0,0 +1,393 @@
+"""
+htmlText.py
+
+Getting the text out of an HTML page in one streaming pass, as the tokenisation test's BeautifulSoup code gets it, without building the page's tree.
+
+The test used to parse the whole page into a DOM with BeautifulSoup and html5lib, pull the head, script and style elements out of it one by one, then walk what was left with get_text(strip=True).  That joins every string in the tree, each with the whitespace stripped from its ends.
+Instead, a TextExtractor (an html.parser.HTMLParser) is fed the page a block at a time.  It gathers the text between one tag, comment or declaration and the next, which is the same as one of the tree's strings, strips it, and hands it on straight away.  Text inside head, script and style is dropped as it goes by, so nothing but the current string is ever held.
+
+It follows html5lib where that changes the text:
+  - Until the body starts, elements which belong in the head (title, meta, script, style and so on) are part of the head, with or without a <head> tag, and even after </head>.  The body starts at <body>, at any other start tag, or at text which isn't whitespace.  <noscript> in the head only holds what the head could (after </head>, it starts the body), and <template> starts the body, as html5lib 1.1 has it.
+  - Character references are decoded, and line endings become "\\n".
+  - Everything up to the end tag of title and textarea is text, with character references decoded, and of xmp, iframe, noembed and noframes is text as written.  Everything after <plaintext> is text as written.
+  - CDATA sections are text inside svg and math, and are dropped elsewhere.
+Pages whose markup html5lib has to repair by moving text around (e.g. text directly inside a <table>, which it moves in front of the table) can come out in a different order.
+
+A page's encoding is taken from a <meta> charset declaration near its start, as html5lib takes it, or else is UTF-8, as Wikipedia's pages are.  (html5lib guesses windows-1252 for an undeclared page, which garbles an undeclared UTF-8 one.)
+
+Usage:
+  for text in htmlText.iterateText(streamingPipeline.readBlocks(response)):   # Blocks of bytes, from a file or HTTP response.
+    ...
+
+  python3 htmlText.py [page ...]   Check the text of each saved page is the same as BeautifulSoup's, and compare pages/sec.
+
+Each page is a saved .html file, or a directory of them.  The pages in htmlPages, which cover the cases above, by default.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import codecs # Incremental decoding
+import html # Decoding character references
+import html.parser # The event-based parser
+import os # Filesystem paths
+import re # Finding charset declarations
+import sys # Command line arguments
+import time # time library
+
+# The elements whose text is dropped, wherever they are.
+droppedElements = frozenset(["script", "style"])
+
+# The elements html5lib puts in the head, if they come before the body starts.  noscript only holds what the head could, so it is passed over.
+headElements = frozenset(["base", "basefont", "bgsound", "link", "meta", "noframes", "noscript", "script", "style", "title"])
+
+# Which of those hold text (the rest are void, or passed over).
+headContainers = frozenset(["noframes", "script", "style", "title"])
+
+# The elements whose content is all text, up to their end tag: with character references decoded (RCDATA), and as written (RAWTEXT; script and style, which html.parser already treats so, are dropped anyway).
+rcdataElements = frozenset(["textarea", "title"])
+rawTextElements = frozenset(["iframe", "noembed", "noframes", "xmp"])
+
+# Never matched, so nothing after <plaintext> ends it.
+neverMatches = re.compile(r"(?!)")
+
+# The directory of saved pages checked by default, covering the cases html5lib's text differs from a plain walk of the tags on.
+fixturesDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "htmlPages")
+
+# The whitespace html5lib ignores in the head, without starting the body.
+headWhitespace = " \t\n\f\r"
+
+# A charset declaration in a <meta> tag, looked for in the first 1024 bytes of a page, as html5lib looks.
+charsetDeclaration = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([A-Za-z0-9_.:-]+)", re.IGNORECASE)
+
+# Charsets which browsers, and html5lib, read as windows-1252.
+windows1252Labels = frozenset(["ascii", "us-ascii", "iso-8859-1", "iso8859-1", "latin1", "latin-1", "l1", "cp819"])
+
+class TextExtractor(html.parser.HTMLParser):
+  '''
+  TextExtractor
+
+  An HTML parser which collects a page's stripped strings as it is fed, leaving out the head, scripts and styles.
+  '''
+
+  def __init__(self):
+    '''
+    Constructor for an extractor.
+    '''
+    super().__init__(convert_charrefs=True)
+    self.pending = [] # The text since the last tag, which may arrive in several calls.
+    self.strings = [] # The stripped strings completed since they were last taken.
+    self.inHead = True # Until the body starts.
+    self.headClosed = False # Whether </head> has been seen.
+    self.skipped = [] # The open elements whose text is dropped, innermost last.
+    self.foreignDepth = 0 # How many svg and math elements are open.
+    self.rcdata = False # Whether the current text is in a title or textarea, so its character references are still to be decoded.
+    self.plaintext = False # Whether <plaintext> has been seen.
+
+  def feed(self, data):
+    '''
+    Parses the next block of the page.
+
+    Parameters
+    ----------
+    data: string
+      The block.
+    '''
+    if self.plaintext:
+      self.handle_data(data) # Everything after <plaintext> is text.
+      return
+    super().feed(data)
+    if self.plaintext and self.rawdata: # The rest of this block, after <plaintext>.
+      self.handle_data(self.rawdata)
+      self.rawdata = ""
+
+  def flush(self):
+    '''
+    Ends the current string: strips it, and keeps it if anything is left.
+    '''
+    if self.pending:
+      text = "".join(self.pending).replace("\r\n", "\n").replace("\r", "\n")
+      if self.rcdata:
+        text = html.unescape(text)
+      text = text.strip()
+      self.pending = []
+      if text:
+        self.strings.append(text)
+
+  def takeStrings(self):
+    '''
+    Takes the strings completed so far.
+
+    Returns
+    -------
+    list
+      The stripped strings, in order, since this was last called.
+    '''
+    strings = self.strings
+    self.strings = []
+    return strings
+
+  def leaveHead(self):
+    '''
+    Starts the body.  Anything still open in the head is closed.
+    '''
+    self.inHead = False
+    self.skipped = []
+
+  def handle_starttag(self, tag, attrs):
+    self.flush()
+    self.startText(tag)
+    if self.inHead:
+      if tag in headContainers:
+        self.skipped.append(tag)
+        return
+      if (tag in headElements and not (tag == "noscript" and self.headClosed)) or tag == "html" or tag == "head":
+        return
+      self.leaveHead()
+    if tag in droppedElements:
+      self.skipped.append(tag)
+    elif tag == "svg" or tag == "math":
+      self.foreignDepth += 1
+
+  def handle_startendtag(self, tag, attrs):
+    if tag in headContainers or tag in rcdataElements or tag in rawTextElements or tag == "plaintext":
+      self.handle_starttag(tag, attrs) # html5lib ignores the / on these, and the text still runs to their end tag.
+    else:
+      super().handle_startendtag(tag, attrs)
+
+  def startText(self, tag):
+    '''
+    Makes the parser read what follows an element whose content is all text as text, up to its end tag.
+
+    Parameters
+    ----------
+    tag: string
+      The element's tag.
+    '''
+    if self.foreignDepth:
+      return # In svg and math, a title is an element like any other.
+    if tag in rcdataElements or tag in rawTextElements or tag in droppedElements:
+      self.set_cdata_mode(tag)
+      self.rcdata = tag in rcdataElements
+    elif tag == "plaintext":
+      self.set_cdata_mode(tag)
+      self.interesting = neverMatches
+      self.plaintext = True
+
+  def handle_endtag(self, tag):
+    self.flush()
+    self.rcdata = False
+    if tag == "head":
+      self.headClosed = True
+    if self.skipped and self.skipped[-1] == tag:
+      self.skipped.pop()
+    elif (tag == "svg" or tag == "math") and self.foreignDepth:
+      self.foreignDepth -= 1
+
+  def handle_data(self, data):
+    if self.skipped:
+      return
+    if self.inHead:
+      if not data.strip(headWhitespace):
+        return
+      self.leaveHead()
+    self.pending.append(data)
+
+  def handle_comment(self, data):
+    self.flush()
+
+  def handle_decl(self, decl):
+    self.flush()
+
+  def handle_pi(self, data):
+    self.flush()
+
+  def unknown_decl(self, data):
+    if data.startswith("CDATA[") and self.foreignDepth:
+      self.handle_data(data[6:]) # Text, run on into the text around it.
+    else:
+      self.flush()
+
+  def close(self):
+    '''
+    Ends the page, completing the last string.
+    '''
+    if self.cdata_elem is not None and self.rawdata: # An element of text left open: the rest of the page is its text, which html.parser would drop.
+      self.handle_data(self.rawdata)
+      self.rawdata = ""
+    super().close()
+    self.flush()
+
+def sniffEncoding(start):
+  """
+  This method finds the encoding a page declares.
+
+  Parameters
+  ----------
+  start: bytes
+    The start of the page.
+
+  Returns
+  -------
+  string
+    The name of the codec to decode the page with.  UTF-8 (dropping a byte order mark) if it declares none, or one Python doesn't know.
+  """
+  match = charsetDeclaration.search(start[:1024])
+  if match is None:
+    return "utf-8-sig"
+  label = match.group(1).decode("ascii").lower()
+  if label in windows1252Labels:
+    return "cp1252"
+  try:
+    name = codecs.lookup(label).name
+  except LookupError:
+    return "utf-8-sig"
+  return "utf-8-sig" if name == "utf-8" else name
+
+def iterateText(blocks, encoding=None):
+  """
+  This method, given an HTML page a block at a time, yields its text as BeautifulSoup(page, "html5lib").get_text(strip=True) gives it once head, script and style are removed, as each piece is completed.
+
+  Parameters
+  ----------
+  blocks: iterable
+    The page, as consecutive bytes or strings of any size.
+  encoding: string
+    The encoding of blocks given as bytes.  Found from the first block if None (see sniffEncoding).
+
+  Yields
+  ------
+  string
+    The page's stripped strings, in order.  Joined together, they give the page's text.
+  """
+  extractor = TextExtractor()
+  decoder = None
+  for block in blocks:
+    if isinstance(block, bytes):
+      if decoder is None:
+        decoder = codecs.getincrementaldecoder(encoding or sniffEncoding(block))(errors="replace")
+      block = decoder.decode(block) # Holds back the start of a character split between blocks.
+    extractor.feed(block)
+    yield from extractor.takeStrings()
+  if decoder is not None:
+    extractor.feed(decoder.decode(b"", final=True))
+  extractor.close()
+  yield from extractor.takeStrings()
+
+def extractText(page, encoding=None):
+  """
+  This method gets the text of a whole HTML page.
+
+  Parameters
+  ----------
+  page: bytes or string
+    The page.
+  encoding: string
+    Its encoding, if given as bytes.  Found from the page if None.
+
+  Returns
+  -------
+  string
+    Its text, as iterateText gives it.
+  """
+  return "".join(iterateText([page], encoding))
+
+def soupText(page):
+  """
+  This method gets the text of an HTML page the way the tokenisation test used to, with BeautifulSoup, for comparison.
+
+  Parameters
+  ----------
+  page: bytes or string
+    The page.
+
+  Returns
+  -------
+  string
+    Its text.
+  """
+  from bs4 import BeautifulSoup # Python HTML Disassembler
+  soup = BeautifulSoup(page, 'html5lib')
+  for erroneousData in soup(["head", "script", "style"]):
+    erroneousData.extract()
+  return soup.get_text(strip = True)
+
+def pagePaths(sources):
+  """
+  This method expands directories into the saved pages in them.
+
+  Parameters
+  ----------
+  sources: list
+    Saved pages, and directories of them.
+
+  Returns
+  -------
+  list
+    The pages' paths, sorted within each directory.
+  """
+  paths = []
+  for source in sources:
+    if os.path.isdir(source):
+      for directory, subdirectories, names in os.walk(source):
+        subdirectories.sort()
+        paths.extend(os.path.join(directory, name) for name in sorted(names) if name.endswith((".html", ".htm")))
+    else:
+      paths.append(source)
+  return paths
+
+def verifyEquivalence(paths):
+  """
+  This method checks that the streaming extractor gets the same text as BeautifulSoup from every page, and times both.
+
+  Parameters
+  ----------
+  paths: list
+    The saved pages.
+
+  Returns
+  -------
+  boolean
+    True if the text of every page matched.
+  """
+  soupTime = 0.0
+  streamTime = 0.0
+  pageBytes = 0
+  mismatches = 0
+  if not paths:
+    print ("  No pages to check.")
+    return False
+  for path in paths:
+    with open(path, "rb") as file:
+      page = file.read()
+    pageBytes += len(page)
+    startTime = time.time()
+    expected = soupText(page)
+    soupTime += time.time() - startTime
+    startTime = time.time()
+    text = extractText(page)
+    streamTime += time.time() - startTime
+    if text != expected:
+      mismatches += 1
+      position = next((i for i, (a, b) in enumerate(zip(text, expected)) if a != b), min(len(text), len(expected)))
+      print ("  MISMATCH in " + path + " at character " + str(position) + ": " + repr(text[position - 30:position + 30]) + " should be " + repr(expected[position - 30:position + 30]))
+  print ("  " + str(len(paths)) + " pages, " + str(pageBytes) + " bytes, " + str(mismatches) + " mismatched")
+  print ("  BeautifulSoup (html5lib): \t", soupTime, "\tpages/s: \t", len(paths) / soupTime)
+  print ("  Streaming extractor: \t", streamTime, "\tpages/s: \t", len(paths) / streamTime, "\tspeedup: \t", soupTime / streamTime)
+  return mismatches == 0
+
+def main():
+  """
+  Entrypoint: checks the extractor against BeautifulSoup on the saved pages given on the command line, or those in htmlPages.
+  """
+  if sys.argv[1:2] in (["-h"], ["--help"]):
+    print(__doc__)
+    return
+  matched = verifyEquivalence(pagePaths(sys.argv[1:] or [fixturesDirectory]))
+  print ("Every page matches." if matched else "Pages differ!")
+  sys.exit(0 if matched else 1)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,199 @@
+"""
+importBenchmark.py
+
+Measuring how long each of the project's modules takes to import, and which heavy packages importing it drags in.
+
+Every pool worker and every run of a script pays its imports before doing any work, so the modules defer their heavy imports (NLTK, matplotlib, BeautifulSoup and html5lib) to the functions that need them.  This catches regressions: each module is imported in a fresh interpreter, cold (with empty bytecode caches, so everything it imports is compiled from source) and warm (with the caches in place, the usual case), and the heavy packages left in sys.modules are listed.
+It also checks that a tokenise-only run never loads plotting or HTML-parsing code.
+
+NLTK's package __init__ imports all of its subpackages, nltk.tag and nltk.corpus included, so any use of NLTK loads its tagging code; it can only be put off until the first stage which uses NLTK at all.
+
+Usage:
+  python3 importBenchmark.py [--save baseline.json] [--compare baseline.json]
+
+--save writes the timings to a file; --compare flags any module whose warm import time has grown by more than a quarter (and more than 20ms) since, and exits with status 1 if any did.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import json # Results and baseline format
+import os # Filesystem paths and environment
+import statistics # Medians of repeated runs
+import subprocess # Fresh interpreters
+import sys # Command line arguments
+import tempfile # Empty bytecode caches
+
+# The modules to measure, as (directory relative to the repository root, module name).
+modules = [
+  (".", "corpusStore"),
+  (".", "textChunking"),
+  (".", "frequencyMerge"),
+  (".", "vocabularyEncoding"),
+  (".", "wordTokenisers"),
+  (".", "workerResources"),
+  (".", "tracing"),
+  (".", "plotRendering"),
+  (".", "sharedCorpus"),
+  (".", "asyncIngest"),
+  (".", "htmlText"),
+  (".", "taskScheduler"),
+  (".", "stageCache"),
+  (".", "streamingPipeline"),
+  (".", "multithreadedTokenisationTest"),
+  (".", "tokenisationTest"),
+  ("stemmingAndLemmatising", "memoCache"),
+  ("stemmingAndLemmatising", "stem"),
+  ("stemmingAndLemmatising", "lemmatise"),
+  ("pOSTagging", "taggingAndFindingSimilarWords"),
+  ("cSourceCodeTokenisation", "cSourceCodeTokenisationTest")
+]
+
+# The packages worth knowing about when they are imported.
+heavyPackages = ["numpy", "nltk", "nltk.tag", "matplotlib", "bs4", "html5lib"]
+
+# Packages a tokenise-only run must never import.
+forbiddenForTokenising = ["matplotlib", "bs4", "html5lib"]
+
+# Run in the fresh interpreter: imports the module, timing it, and reports the time and heavy packages as JSON.
+importProbe = """
+import json, sys, time
+sys.path.insert(0, {directory!r})
+startTime = time.perf_counter()
+import {module}
+importTime = time.perf_counter() - startTime
+print(json.dumps({{"seconds": importTime, "loaded": [name for name in {heavyPackages!r} if name in sys.modules]}}))
+"""
+
+# Run in the fresh interpreter: imports what a tokenise-only run uses, tokenises a sentence, and reports the heavy packages loaded.
+tokeniseProbe = """
+import json, sys
+import wordTokenisers, streamingPipeline, multithreadedTokenisationTest, tokenisationTest
+try:
+  wordTokenisers.tokeniseText("A sentence to tokenise.  And another.")
+  wordTokenisers.tokeniseText("A sentence to tokenise.  And another.", "fast")
+except LookupError: # The NLTK data isn't installed; the imports have still happened.
+  pass
+print(json.dumps({{"loaded": [name for name in {heavyPackages!r} if name in sys.modules]}}))
+"""
+
+# The repository root.
+rootPath = os.path.dirname(os.path.abspath(__file__))
+
+def runProbe(probe, cachePath=None):
+  """
+  This method runs a probe in a fresh interpreter.
+
+  Parameters
+  ----------
+  probe: string
+    The probe's source code.
+  cachePath: string
+    A directory to keep bytecode caches in instead of the usual __pycache__ directories.  An empty one makes the imports cold.
+
+  Returns
+  -------
+  dict
+    The probe's JSON output.
+  """
+  environment = dict(os.environ)
+  if cachePath is not None:
+    environment["PYTHONPYCACHEPREFIX"] = cachePath
+  output = subprocess.run([sys.executable, "-c", probe], cwd=rootPath, env=environment, capture_output=True, text=True, check=True).stdout
+  return json.loads(output.strip().splitlines()[-1])
+
+def measureModule(directory, module, repeats=7):
+  """
+  This method measures the cold and warm import times of a module.
+
+  Parameters
+  ----------
+  directory: string
+    The module's directory, relative to the repository root.
+  module: string
+    The module's name.
+  repeats: int
+    How many warm imports to take the median of.
+
+  Returns
+  -------
+  dict
+    The cold and warm import times in seconds, and the heavy packages the import loaded.
+  """
+  probe = importProbe.format(directory=os.path.join(rootPath, directory), module=module, heavyPackages=heavyPackages)
+  with tempfile.TemporaryDirectory() as cachePath:
+    cold = runProbe(probe, cachePath)
+  runProbe(probe) # Make sure the bytecode caches exist.
+  warmTimes = [runProbe(probe)["seconds"] for _ in range(repeats)]
+  return {"cold": cold["seconds"], "warm": statistics.median(warmTimes), "loaded": cold["loaded"]}
+
+def checkTokeniseOnly():
+  """
+  This method checks that a tokenise-only run imports nothing for plotting or parsing HTML.
+
+  Returns
+  -------
+  list
+    The forbidden packages which were imported.  Empty if none were.
+  """
+  loaded = runProbe(tokeniseProbe.format(heavyPackages=heavyPackages))["loaded"]
+  return [name for name in forbiddenForTokenising if name in loaded]
+
+def compareWithBaseline(results, baseline):
+  """
+  This method finds the modules whose warm import time has regressed since a baseline.
+
+  Parameters
+  ----------
+  results: dict
+    The timings of each module, as measured now.
+  baseline: dict
+    The timings of each module, as measured before.
+
+  Returns
+  -------
+  list
+    The names of the modules which have slowed by more than a quarter, and by more than 20ms.
+  """
+  regressions = []
+  for module, timings in results.items():
+    before = baseline.get(module)
+    if before is not None and timings["warm"] > before["warm"] * 1.25 and timings["warm"] - before["warm"] > 0.02:
+      regressions.append(module)
+  return regressions
+
+def main():
+  """
+  Entrypoint: measures every module, then checks the tokenise-only run, and compares with or saves a baseline.
+  """
+  arguments = sys.argv[1:]
+  savePath = arguments[arguments.index("--save") + 1] if "--save" in arguments else None
+  comparePath = arguments[arguments.index("--compare") + 1] if "--compare" in arguments else None
+
+  results = {}
+  for directory, module in modules:
+    results[module] = timings = measureModule(directory, module)
+    print (module + ": \tcold: \t", timings["cold"], "\twarm: \t", timings["warm"], "\tloads: \t", ", ".join(timings["loaded"]) or "-")
+
+  forbidden = checkTokeniseOnly()
+  if forbidden:
+    print ("WARNING: a tokenise-only run imported " + ", ".join(forbidden) + ".")
+  else:
+    print ("A tokenise-only run imports no plotting or HTML-parsing code.")
+
+  failed = bool(forbidden)
+  if comparePath is not None:
+    with open(comparePath, "r") as file:
+      regressions = compareWithBaseline(results, json.load(file))
+    for module in regressions:
+      print ("REGRESSION: " + module + " now takes " + str(results[module]["warm"]) + "s to import.")
+    failed = failed or bool(regressions)
+  if savePath is not None:
+    with open(savePath, "w") as file:
+      json.dump(results, file, indent=2)
+  sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+  main()
@@ -14,17 +14,22 @@ Authors
 
 """
 
-import nltk # Natural Language Processing Toolkit
-import urllib.request # Python Website Crawler
 import time # time library
-import string # String lib - used to remove punctuation
 import multiprocessing # multithreading
+import corpusStore # Offline corpus store
+import frequencyMerge # Packing and merging word counts from workers
+import textChunking # Splitting texts into independently tokenisable pieces
+import wordTokenisers # Word tokenisation engines
+import workerResources # NLTK resources loaded once per process
+import taskScheduler # Largest-first scheduling across the pool
+import tracing # Per-stage spans, when NATLANG_TRACE is set
 
 # nltk.download() # Open NLTK package Downloader
 
 def tokeniseText(text):
   """
   This method, given a text string containing words, will attempt to tokenise it using NLTK.
+  The tokeniser engine is picked with the NATLANG_TOKENISER environment variable (see wordTokenisers.py).
   
   Parameters
   ----------
@@ -36,10 +41,30 @@ def tokeniseText(text):
   list
     The list of tokenised words.
   """
-  tokens = nltk.tokenize.word_tokenize(text) # Tokenise the text
-  # Strip out punctuation tokens
-  tokItems = ["".join(j.lower() for j in i if j not in string.punctuation)
-    for i in tokens]
+  return wordTokenisers.tokeniseText(text)
+
+def tokeniseTextChunked(text, pool, chunkSize=textChunking.defaultChunkSize):
+  """
+  This method, given a text string containing words, will split it into pieces at safe paragraph breaks, tokenise the pieces across a pool of processes, and put the tokens back together in order.
+  The result is identical to tokeniseText(text), but a single large text can use every core.
+  
+  Parameters
+  ----------
+  text: string
+    The text to tokenise.
+  pool: multiprocessing.Pool
+    The pool of processes to tokenise the pieces with.
+  chunkSize: int
+    The size, in characters, of each piece of text.
+    
+  Returns
+  -------
+  list
+    The list of tokenised words.
+  """
+  tokItems = []
+  for chunkTokens in pool.imap(tokeniseText, textChunking.iterateChunks(text, chunkSize)): # imap keeps the pieces in order
+    tokItems.extend(chunkTokens)
   return tokItems
 
 def buildFrequencyDistributionData(tokItems):
@@ -56,24 +81,21 @@ def buildFrequencyDistributionData(tokItems):
   FreqDist
     The frequency distribution plot.
   """
-  freq = nltk.FreqDist(tokItems) # Build the frequency data
+  from nltk import FreqDist # Natural Language Processing Toolkit
+  freq = FreqDist(tokItems) # Build the frequency data
   # TODO: Draw the graphs overlapping.
   return freq
 
 def pullText():
   """
-  This method uses urllib to pull the test data from Project Gutenberg's online repository.
+  This method loads the test data from the local corpus store (see corpusStore.py), rather than pulling it from Project Gutenberg's online repository on every run.
     
   Returns
   -------
   list
     A list of all of the data from Project Gutenberg in string format.  We load all this straight into memory to save the overhead of grabbing it later.
   """
-  kJV = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/10/10-0.txt', headers={'User-Agent': 'Mozilla/5.0'})) # get the text from the URL
-  worksOfShakespeare = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/100/100-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  theTimeMachine = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/35/35-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  lesMis = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/135/135-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  return [str(kJV.read()),str(worksOfShakespeare.read()),str(theTimeMachine.read()),str(lesMis.read())]
+  return corpusStore.pullText(["kjv", "shakespeare", "timeMachine", "lesMiserables"])
   
 def runTests(sampleData):
   """
@@ -83,20 +105,61 @@ def runTests(sampleData):
   ----------
   sampleData: string
     The test data to run the tests on.
+    
+  Returns
+  -------
+  tuple
+    The text's word counts, packed for sending back from a worker (see frequencyMerge.py).
   """
   startTime = time.time()
-  tokenisedItems = tokeniseText(sampleData)
+  with tracing.span("tokenise", len(sampleData)):
+    tokenisedItems = tokeniseText(sampleData)
   print ("  Tokenisation time: \t", time.time() - startTime)
   startTime = time.time()
-  freq = buildFrequencyDistributionData(tokenisedItems)
+  with tracing.span("freqDist", len(tokenisedItems)):
+    freq = buildFrequencyDistributionData(tokenisedItems)
   print ("  Frequency Distribution time: \t", time.time() - startTime)
 #  freq.plot(500, cumulative=False) # Plot a frequency graph (first 500 words)
+  with tracing.span("packCounts", freq.B()):
+    return frequencyMerge.packCounts(freq)
+
+def runChunkedTests(sampleData, chunkSize=textChunking.defaultChunkSize):
+  """
+  This method times chunked tokenisation of a single text with increasing numbers of processes, and reports the speedup over single-process tokenisation.
+  
+  Parameters
+  ----------
+  sampleData: string
+    The test data to run the tests on.
+  chunkSize: int
+    The size, in characters, of each piece of text.
+  """
+  startTime = time.time()
+  expectedTokens = tokeniseText(sampleData)
+  singleProcessTime = time.time() - startTime
+  print ("  Single-process tokenisation time: \t", singleProcessTime)
+  coreCounts = []
+  cores = 1
+  while cores < multiprocessing.cpu_count():
+    coreCounts.append(cores)
+    cores *= 2
+  coreCounts.append(multiprocessing.cpu_count())
+  for cores in coreCounts:
+    with multiprocessing.Pool(cores, initializer=workerResources.initialiseWorker, initargs=(["punkt"],)) as pool:
+      startTime = time.time()
+      with tracing.span("tokenise chunked " + str(cores), len(sampleData)):
+        tokenisedItems = tokeniseTextChunked(sampleData, pool, chunkSize)
+      chunkedTime = time.time() - startTime
+    if tokenisedItems != expectedTokens:
+      print ("  WARNING: chunked tokenisation with " + str(cores) + " processes differs from single-process tokenisation.")
+    print ("  " + str(cores) + " processes: \t", chunkedTime, "\tspeedup: \t", singleProcessTime / chunkedTime)
 
 def main():
   """
   Entrypoint: gets the data then runs the tests.
   
-  This runs the tests on a single thread, supervised by Python's GIL, then across the whole CPU using the multiprocessing library.
+  This runs the tests on a single thread, supervised by Python's GIL, then across the whole CPU using the multiprocessing library, merging the workers' counts into one distribution for the whole corpus.
+  Finally, it splits the largest text into pieces and tokenises those across increasing numbers of processes.
   """
   sampleData = pullText()
   print ("Single-threaded: ")
@@ -107,9 +170,27 @@ def main():
   
   print ("Multithreaded: ")
   startTime = time.time()
-  with multiprocessing.Pool() as pool:
-    pool.map(runTests, sampleData)
+  pool = workerResources.getPool(["punkt"]) # Shared by every stage, its workers preloaded
+  scheduler = taskScheduler.Scheduler(pool=pool, names=["punkt"]) # The largest text first, so it doesn't hold up the end of the run
+  partialCounts = [None] * len(sampleData)
+  with tracing.span("schedule runTests", len(sampleData)): # Includes pickling the texts out and the counts back.
+    for index, counts in scheduler.run(runTests, sampleData, "tokenise"):
+      partialCounts[index] = counts
   print ("Total multithreaded time: \t", time.time() - startTime)
+  scheduler.report()
+  startTime = time.time()
+  with tracing.span("treeMerge"):
+    corpusFreq = frequencyMerge.treeMerge(partialCounts, pool) # Reduce the per-document counts into one distribution.
+  print ("Merge time: \t", time.time() - startTime)
+  for text, packed in zip(sampleData, partialCounts):
+    documentFreq = frequencyMerge.unpackCounts(packed)
+    freqSize, packedSize = frequencyMerge.transferSizes(documentFreq)
+    print ("  Document: \t", documentFreq.N(), "tokens\t", documentFreq.B(), "distinct\tsent as", packedSize, "bytes rather than", freqSize)
+  print ("Corpus: \t", corpusFreq.N(), "tokens\t", corpusFreq.B(), "distinct")
+  print ("Most common words: \t", corpusFreq.most_common(10))
+
+  print ("Chunked, on the largest text: ")
+  runChunkedTests(max(sampleData, key=len))
 
 if __name__ == "__main__":
   main()
@@ -0,0 +1,209 @@
+"""
+batchTagging.py
+
+Part Of Speech (POS) tagging a long text in batches across a pool of workers, with exactly the same result as tagging it in one go.
+
+The perceptron tagger behind nltk.pos_tag works left to right: each token's tag depends on the tags of the two tokens before it, and on the words up to two either side of it.  So a text can't just be cut up and its pieces tagged separately; the first and last few tokens of each piece would be tagged without their real neighbours.
+Instead, the text is cut into batches of whole sentences (at the safe breaks textChunking.py finds), and the workers tokenise and tag each batch on its own, with the tagger loaded once per worker.  Then, at each seam between two batches, the tokens either side are tagged again in order with their true neighbours, until two tokens running come out the same as the worker tagged them.  From there to the end of the batch, every token has the same context and preceding tags as it would in one go, so the worker's tags stand.
+
+Usage:
+  python3 batchTagging.py [source ...]   Check batched tagging against tagging in one go, and report throughput for increasing numbers of workers.
+
+Each source is a path to a UTF-8 text file, or the name of a text in the corpus store (The Time Machine by default).
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import os # Filesystem paths
+import sys # Module search path
+import time # time library
+import multiprocessing # multithreading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # The shared modules live in the repository root.
+import textChunking # Splitting texts into independently tokenisable pieces
+import tracing # Per-stage spans, when NATLANG_TRACE is set
+import workerResources # NLTK resources loaded once per process
+
+# The size of each batch, in characters.
+defaultBatchSize = 64 * 1024
+
+def tokeniseAndTagBatch(text):
+  """
+  This method, run in a worker, tokenises and tags one batch of sentences on its own.
+
+  Parameters
+  ----------
+  text: string
+    The batch of text.
+
+  Returns
+  -------
+  tuple
+    The list of tokens, and the list of their tags.
+  """
+  import nltk # Natural Language Processing Toolkit
+  with tracing.span("tokenise", len(text)):
+    tokens = nltk.word_tokenize(text)
+  with tracing.span("posTag", len(tokens)):
+    return (tokens, [tag for token, tag in workerResources.get("tagger").tag(tokens)])
+
+def contextWord(tagger, tokens, position):
+  """
+  This method gets the word the tagger sees at a position in the token stream, padded at either end as PerceptronTagger.tag pads it.
+
+  Parameters
+  ----------
+  tagger: PerceptronTagger
+    The tagger.
+  tokens: list
+    The whole token stream.
+  position: int
+    The position, which may be up to two before the start or after the end.
+
+  Returns
+  -------
+  string
+    The normalised word, or the start or end padding.
+  """
+  if position < 0:
+    return tagger.START[position + len(tagger.START)]
+  if position >= len(tokens):
+    return tagger.END[position - len(tokens)]
+  return tagger.normalize(tokens[position])
+
+def tagToken(tagger, tokens, position, prev, prev2):
+  """
+  This method tags a single token in the middle of a stream, exactly as PerceptronTagger.tag would on reaching it.
+
+  Parameters
+  ----------
+  tagger: PerceptronTagger
+    The tagger.
+  tokens: list
+    The whole token stream.
+  position: int
+    The position of the token to tag.
+  prev: string
+    The tag of the token before it.
+  prev2: string
+    The tag of the token before that.
+
+  Returns
+  -------
+  string
+    The token's tag.
+  """
+  word = tokens[position]
+  tag = tagger.tagdict.get(word)
+  if not tag:
+    context = [contextWord(tagger, tokens, position + offset) for offset in range(-2, 3)] # The two words either side, as the features see them.
+    prediction = tagger.model.predict(tagger._get_features(0, word, context, prev, prev2))
+    tag = prediction[0] if isinstance(prediction, tuple) else prediction # Newer NLTK returns (tag, confidence).
+  return tag
+
+def stitchBatches(tagger, batches):
+  """
+  This method joins batches tagged on their own into one tagged stream, re-tagging around each seam until the tags agree with the batch's.
+
+  Parameters
+  ----------
+  tagger: PerceptronTagger
+    The tagger.
+  batches: iterable
+    The (tokens, tags) of each batch, in order.
+
+  Returns
+  -------
+  list
+    The tagged words, as (word, tag) tuples, the same as tagging the whole stream in one go.
+  """
+  tokens = []
+  tags = []
+  def previousTag(position):
+    return tags[position] if position >= 0 else tagger.START[position + len(tagger.START)]
+  for batchTokens, batchTags in batches:
+    start = len(tokens)
+    tokens.extend(batchTokens)
+    tags.extend(batchTags)
+    position = max(start - 2, 0) # The last two tokens of the previous batch were tagged without the words after them.
+    agreeing = 0 # How many tokens running, in this batch, have come out as the worker tagged them.
+    while position < len(tokens) and not (position >= start + 2 and agreeing >= 2):
+      tag = tagToken(tagger, tokens, position, previousTag(position - 1), previousTag(position - 2))
+      if position >= start:
+        agreeing = agreeing + 1 if tag == batchTags[position - start] else 0
+      tags[position] = tag
+      position += 1
+  return list(zip(tokens, tags))
+
+def tagText(text, pool, batchSize=defaultBatchSize):
+  """
+  This method tokenises and tags a text in batches across a pool.
+
+  Parameters
+  ----------
+  text: string
+    The text to tag.
+  pool: multiprocessing.Pool
+    The pool to tag in.  Its workers load the tagger once each (see workerResources.py).
+  batchSize: int
+    The size of each batch, in characters.
+
+  Returns
+  -------
+  list
+    The tagged words, the same as nltk.pos_tag(nltk.word_tokenize(text)).
+  """
+  batches = pool.imap(tokeniseAndTagBatch, textChunking.iterateChunks(text, batchSize))
+  with tracing.span("stitchBatches"): # Mostly waiting on the workers.
+    return stitchBatches(workerResources.get("tagger"), batches)
+
+def runScalingTests(text, batchSize=defaultBatchSize):
+  """
+  This method tags a text in one go, then in batches across increasing numbers of workers, checking the results match and reporting throughput.
+
+  Parameters
+  ----------
+  text: string
+    The text to tag.
+  batchSize: int
+    The size of each batch, in characters.
+  """
+  import nltk # Natural Language Processing Toolkit
+  startTime = time.time()
+  expectedTags = workerResources.get("tagger").tag(nltk.word_tokenize(text))
+  singleTime = time.time() - startTime
+  print ("  In one go: \t", singleTime, "\ttokens/s: \t", len(expectedTags) / singleTime)
+  workerCounts = []
+  workers = 1
+  while workers < multiprocessing.cpu_count():
+    workerCounts.append(workers)
+    workers *= 2
+  workerCounts.append(multiprocessing.cpu_count())
+  for workers in workerCounts:
+    with multiprocessing.Pool(workers, initializer=workerResources.initialiseWorker, initargs=(["punkt", "tagger"],)) as pool:
+      startTime = time.time()
+      taggedWords = tagText(text, pool, batchSize)
+      batchedTime = time.time() - startTime
+    if taggedWords != expectedTags:
+      print ("  WARNING: batched tagging with " + str(workers) + " workers differs from tagging in one go.")
+    print ("  " + str(workers) + " workers: \t", batchedTime, "\ttokens/s: \t", len(taggedWords) / batchedTime, "\tspeedup: \t", singleTime / batchedTime)
+
+def main():
+  """
+  Entrypoint: runs the scaling tests on each source given on the command line.
+  """
+  import corpusStore # Offline corpus store
+  for source in (sys.argv[1:] or ["timeMachine"]):
+    print ("Tagging " + source + ": ")
+    if os.path.exists(source):
+      with open(source, "r", encoding="utf-8-sig", newline="") as file:
+        text = file.read()
+    else:
+      text = corpusStore.loadText(source)
+    runScalingTests(text)
+
+if __name__ == "__main__":
+  main()
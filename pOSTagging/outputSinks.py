@@ -0,0 +1,300 @@
+"""
+outputSinks.py
+
+Writing tagged words to files, in one of two formats.
+
+  text      One "word/TAG" per line, as the tagging script has always written.  Written a block of lines at a time rather than a line at a time.
+  columnar  A binary file holding one column of word ids and one column of tag ids, with the distinct words and tags stored once each.  It is a fraction of the size, and can be memory-mapped by ColumnarTags to read any token without loading the file.
+
+Each worker opens its own sink for its own file, so books can be written concurrently without any locking.
+
+The columnar file is laid out as:
+  header    The magic bytes, then the token, word and tag counts, as unsigned 64-bit integers.
+  wordIds   One unsigned 32-bit word id per token.
+  tagIds    One unsigned 8-bit tag id per token, padded to a multiple of 8 bytes.
+  words     The offset of each distinct word in the word bytes (unsigned 64-bit, one more than the words), then the UTF-8 bytes of the words, padded to a multiple of 8 bytes.
+  tags      The same for the distinct tags.
+
+Usage:
+  python3 outputSinks.py [tokens]   Benchmark write throughput of each format against writing a token at a time.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import mmap # Memory-mapped reading
+import numpy # Vectorised arrays
+import os # Filesystem paths and environment
+import struct # Binary header
+import sys # Command line arguments
+import tempfile # Benchmark files
+import time # time library
+from operator import itemgetter # Splitting (word, tag) tuples into columns
+
+# The format used when none is given, from the NATLANG_TAG_FORMAT environment variable.
+defaultFormat = os.environ.get("NATLANG_TAG_FORMAT", "text")
+
+# The file extension of each format.
+extensions = {"text": ".txt", "columnar": ".tags"}
+
+# Marks a columnar tag file, and its version.
+columnarMagic = b"NLTAGS1\0"
+headerFormat = "<8sQQQ"
+
+# How many lines the text sink joins into each write.
+linesPerWrite = 64 * 1024
+
+def padding(size):
+  """
+  This method gives the bytes needed to pad a section to a multiple of 8 bytes, so the next one is aligned.
+
+  Parameters
+  ----------
+  size: int
+    The size of the section, in bytes.
+
+  Returns
+  -------
+  bytes
+    The padding.
+  """
+  return b"\0" * (-size % 8)
+
+def writeText(path, taggedWords):
+  """
+  This method writes tagged words as text, one "word/TAG" per line.
+
+  Parameters
+  ----------
+  path: string
+    The file to write.
+  taggedWords: list
+    The (word, tag) tuples.
+  """
+  with open(path, "w", encoding="utf-8") as file:
+    for start in range(0, len(taggedWords), linesPerWrite):
+      file.write("\n".join(map("/".join, taggedWords[start:start + linesPerWrite])) + "\n")
+
+def encodeStrings(strings):
+  """
+  This method packs a list of strings into an array of offsets and a block of UTF-8 bytes.
+
+  Parameters
+  ----------
+  strings: list
+    The strings.
+
+  Returns
+  -------
+  bytes
+    The offsets (one more than the strings) followed by the padded bytes.
+  """
+  encoded = [string.encode("utf-8") for string in strings]
+  offsets = numpy.zeros(len(encoded) + 1, dtype="<u8")
+  numpy.cumsum([len(data) for data in encoded], out=offsets[1:])
+  data = b"".join(encoded)
+  return offsets.tobytes() + data + padding(len(data))
+
+def encodeColumn(values, dtype):
+  """
+  This method numbers the distinct strings in a column, in order of first appearance.
+
+  Parameters
+  ----------
+  values: list
+    The column of strings.
+  dtype: string
+    The numpy type of the ids.
+
+  Returns
+  -------
+  tuple
+    The column of ids, as a numpy array, and the distinct strings in id order.
+  """
+  ids = dict.fromkeys(values)
+  for valueId, value in enumerate(ids):
+    ids[value] = valueId
+  if len(ids) > numpy.iinfo(dtype).max + 1:
+    raise ValueError("A column of " + dtype + " ids holds at most " + str(numpy.iinfo(dtype).max + 1) + " distinct values, not " + str(len(ids)) + ".")
+  return (numpy.fromiter(map(ids.__getitem__, values), dtype=dtype, count=len(values)), list(ids))
+
+def writeColumnar(path, taggedWords):
+  """
+  This method writes tagged words in the columnar format.
+
+  Parameters
+  ----------
+  path: string
+    The file to write.
+  taggedWords: list
+    The (word, tag) tuples.
+  """
+  wordColumn, words = encodeColumn(list(map(itemgetter(0), taggedWords)), "<u4")
+  tagColumn, tags = encodeColumn(list(map(itemgetter(1), taggedWords)), "<u1")
+  with open(path, "wb") as file:
+    file.write(struct.pack(headerFormat, columnarMagic, len(taggedWords), len(words), len(tags)))
+    file.write(wordColumn.tobytes())
+    file.write(padding(wordColumn.nbytes))
+    file.write(tagColumn.tobytes())
+    file.write(padding(tagColumn.nbytes))
+    file.write(encodeStrings(words))
+    file.write(encodeStrings(tags))
+
+# How to write each format.
+writers = {"text": writeText, "columnar": writeColumnar}
+
+def writeTagged(path, taggedWords, format=None):
+  """
+  This method writes tagged words to a file, in a given format.
+
+  Parameters
+  ----------
+  path: string
+    The file to write, without its extension.
+  taggedWords: list
+    The (word, tag) tuples.
+  format: string
+    text or columnar.  NATLANG_TAG_FORMAT, or text, if None.
+
+  Returns
+  -------
+  string
+    The path written, with its extension.
+  """
+  format = format or defaultFormat
+  path += extensions[format]
+  writers[format](path, taggedWords)
+  return path
+
+class ColumnarTags:
+  '''
+  ColumnarTags
+
+  A columnar tag file, memory-mapped.  Indexing it gives (word, tag) tuples, read from the file as needed.
+  '''
+
+  def __init__(self, path):
+    '''
+    Constructor: maps the file.
+
+    Parameters
+    ----------
+    path: string
+      The columnar tag file.
+    '''
+    with open(path, "rb") as file:
+      self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, tokenCount, wordCount, tagCount = struct.unpack_from(headerFormat, self.map)
+    if magic != columnarMagic:
+      raise ValueError(path + " is not a columnar tag file.")
+    position = struct.calcsize(headerFormat)
+    self.wordIds = numpy.frombuffer(self.map, dtype="<u4", count=tokenCount, offset=position)
+    position += self.wordIds.nbytes + len(padding(self.wordIds.nbytes))
+    self.tagIds = numpy.frombuffer(self.map, dtype="<u1", count=tokenCount, offset=position)
+    position += self.tagIds.nbytes + len(padding(self.tagIds.nbytes))
+    self.words, position = self.readStrings(wordCount, position)
+    self.tags, position = self.readStrings(tagCount, position)
+
+  def readStrings(self, count, position):
+    '''
+    Reads a block of strings written by encodeStrings.
+
+    Parameters
+    ----------
+    count: int
+      The number of strings.
+    position: int
+      Where the block starts in the file.
+
+    Returns
+    -------
+    tuple
+      The strings, and where the next block starts.
+    '''
+    offsets = numpy.frombuffer(self.map, dtype="<u8", count=count + 1, offset=position).tolist()
+    position += 8 * (count + 1)
+    data = self.map[position:position + offsets[-1]]
+    strings = [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+    return (strings, position + offsets[-1] + len(padding(offsets[-1])))
+
+  def __len__(self):
+    '''
+    The number of tokens in the file.
+    '''
+    return len(self.wordIds)
+
+  def __getitem__(self, position):
+    '''
+    The (word, tag) tuple at a position.
+    '''
+    return (self.words[self.wordIds[position]], self.tags[self.tagIds[position]])
+
+  def __iter__(self):
+    '''
+    Every (word, tag) tuple, in order.
+    '''
+    words = self.words
+    tags = self.tags
+    return ((words[wordId], tags[tagId]) for wordId, tagId in zip(self.wordIds.tolist(), self.tagIds.tolist()))
+
+  def close(self):
+    '''
+    Unmaps the file.
+    '''
+    del self.wordIds, self.tagIds # The arrays hold on to the map's buffer.
+    self.map.close()
+
+def writeTokenAtATime(path, taggedWords):
+  """
+  This method writes tagged words as text one write per token, as the tagging script used to, for comparison.
+
+  Parameters
+  ----------
+  path: string
+    The file to write.
+  taggedWords: list
+    The (word, tag) tuples.
+  """
+  with open(path, "w", encoding="utf-8") as file:
+    for data in taggedWords:
+      file.write(data[0] + "/" + data[1] + "\n")
+
+def runTests(tokenCount):
+  """
+  This method times writing a synthetic tagged text in each format, and checks each reads back correctly.
+
+  Parameters
+  ----------
+  tokenCount: int
+    The number of tagged tokens to write.
+  """
+  tags = ["NN", "NNS", "NNP", "VB", "VBD", "VBZ", "JJ", "RB", "DT", "IN", "PRP", "CC", ".", ","]
+  taggedWords = [("word" + str((i * 7919) % 20000), tags[(i * 31) % len(tags)]) for i in range(tokenCount)]
+  with tempfile.TemporaryDirectory() as directory:
+    for name, writer in [("token at a time", writeTokenAtATime), ("text", writeText), ("columnar", writeColumnar)]:
+      path = os.path.join(directory, name.replace(" ", ""))
+      startTime = time.time()
+      writer(path, taggedWords)
+      writeTime = time.time() - startTime
+      size = os.path.getsize(path)
+      print ("  " + name + ": \t", writeTime, "\ttokens/s: \t", tokenCount / writeTime, "\tMB/s: \t", size / writeTime / 1e6, "\tsize (bytes): \t", size)
+    reader = ColumnarTags(os.path.join(directory, "columnar"))
+    startTime = time.time()
+    readBack = list(reader)
+    print ("  columnar read back (memory-mapped): \t", time.time() - startTime)
+    if readBack != taggedWords:
+      print ("  WARNING: the columnar file doesn't read back as written.")
+    reader.close()
+
+def main():
+  """
+  Entrypoint: benchmarks each format at the size given on the command line.
+  """
+  tokenCount = int(sys.argv[1]) if sys.argv[1:] else 1000000
+  print ("Writing " + str(tokenCount) + " tagged tokens: ")
+  runTests(tokenCount)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,121 @@
+"""
+similarityIndex.py
+
+Finding distributionally similar words, as nltk.Text.similar does, from an index built once per text.
+
+Text.similar prints its results rather than returning them, and rescans every word's contexts on each call, so calling it for every token of a book takes minutes.  SimilarityIndex builds the same word-to-context index (and the reverse, context-to-word) once, with words and contexts numbered, and then finds a word's similar words by only visiting the words which share one of its contexts.
+The results are the same as Text.similar's, in the same order: words are scored by how many distinct contexts they share with the word, and ties go to the word which appeared first.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import heapq # Partial sorting
+
+class SimilarityIndex:
+  '''
+  SimilarityIndex
+
+  The contexts (the lower-cased words either side) of every alphabetic word in a text, indexed both ways.
+  '''
+
+  def __init__(self, tokens):
+    '''
+    Constructor for the index.
+
+    Parameters
+    ----------
+    tokens: list
+      The tokens of the text.
+    '''
+    words = [token for token in tokens if token.isalpha()] # Text.similar only looks at alphabetic tokens, and at them alone for context.
+    self.wordIds = {} # Lower-cased word to id, in order of first appearance.
+    contextIds = {}
+    self.wordContexts = [] # Each word's distinct context ids.
+    self.contextWords = [] # Each context's distinct word ids, in order of first appearance.
+    lowered = [word.lower() for word in words]
+    for position, word in enumerate(lowered):
+      context = (lowered[position - 1] if position != 0 else "*START*", lowered[position + 1] if position != len(lowered) - 1 else "*END*")
+      wordId = self.wordIds.get(word)
+      if wordId is None:
+        wordId = self.wordIds[word] = len(self.wordContexts)
+        self.wordContexts.append(set())
+      contextId = contextIds.get(context)
+      if contextId is None:
+        contextId = contextIds[context] = len(self.contextWords)
+        self.contextWords.append({})
+      if contextId not in self.wordContexts[wordId]:
+        self.wordContexts[wordId].add(contextId)
+        self.contextWords[contextId][wordId] = None # A dictionary, used as an ordered set.
+    self.words = list(self.wordIds) # Id to word.
+
+  def similarWords(self, word, num=20):
+    '''
+    Finds the words which appear in the most of the same contexts as a word, as Text.similar does.
+
+    Parameters
+    ----------
+    word: string
+      The word to find similar words to.
+    num: int
+      The most similar words to find.
+
+    Returns
+    -------
+    list
+      The similar words, lower-cased, most similar first.  None if the word isn't in the text.
+    '''
+    wordId = self.wordIds.get(word.lower())
+    if wordId is None:
+      return None
+    scores = {}
+    for contextId in self.wordContexts[wordId]:
+      for otherId in self.contextWords[contextId]:
+        scores[otherId] = scores.get(otherId, 0) + 1
+    scores.pop(wordId, None)
+    best = heapq.nsmallest(num, scores.items(), key=lambda item: (-item[1], item[0])) # Most shared contexts first, then first appearance.
+    return [self.words[otherId] for otherId, score in best]
+
+  def similarToAll(self, words, num=20):
+    '''
+    Finds the similar words of every distinct word in a list, each only once.
+
+    Parameters
+    ----------
+    words: list
+      The words.
+    num: int
+      The most similar words to find for each.
+
+    Returns
+    -------
+    dict
+      The similar words (or None) of each distinct lower-cased word.
+    '''
+    results = {}
+    for word in words:
+      word = word.lower()
+      if word not in results:
+        results[word] = self.similarWords(word, num)
+    return results
+
+def formatSimilar(similar):
+  """
+  This method formats similar words as Text.similar prints them.
+
+  Parameters
+  ----------
+  similar: list
+    The similar words, or None if the word wasn't in the text.
+
+  Returns
+  -------
+  string
+    The words, wrapped, or "No matches".
+  """
+  from nltk.util import tokenwrap # Text.similar's formatting
+  if similar is None:
+    return "No matches"
+  return tokenwrap(similar)
@@ -13,16 +13,25 @@ Authors
 """
 
 import nltk # Natural Language Processing Toolkit
-import urllib # Python Website Crawler
+import os # Filesystem paths
+import sys # Module search path
 import time # time library
 import string # String lib - used to remove punctuation
-import multiprocessing # multithreading
 
-stdoutLock = multiprocessing.Lock()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # The shared modules live in the repository root.
+import corpusStore # Offline corpus store
+import workerResources # NLTK resources loaded once per process
+import batchTagging # Tagging in batches across the pool
+import similarityIndex # Similar words, from an index built once per text
+import outputSinks # Writing the tagged words
+import sharedCorpus # Texts handed to workers through shared memory
+import stageCache # Stage outputs kept between runs
+import taskScheduler # Largest-first scheduling across the pool
+import tracing # Per-stage spans, when NATLANG_TRACE is set
 
 # nltk.download() # Open NLTK package Downloader
 
-def pOSTagText(text):
+def pOSTagText(text, pool=None):
   """
   This method, given a text string containing words, will attempt to POS-tag those words using NLTK.
   
@@ -30,89 +39,146 @@ def pOSTagText(text):
   ----------
   text: string
     The text to tag.
+  pool: multiprocessing.Pool
+    If given, the text is split into batches of sentences which are tagged across the pool (see batchTagging.py).  The result is the same either way.
     
   Returns
   -------
   list
     The list of tagged words.
   """
-  tokens = nltk.word_tokenize(text) # Tokenise the text
+  if pool is not None:
+    with tracing.span("posTag batches", len(text)):
+      return batchTagging.tagText(text, pool)
+  with tracing.span("tokenise", len(text)):
+    tokens = nltk.word_tokenize(text) # Tokenise the text
   # Strip out punctuation tokens
-  taggedWords = nltk.pos_tag(tokens)
+  with tracing.span("posTag", len(tokens)):
+    taggedWords = workerResources.get("tagger").tag(tokens) # As nltk.pos_tag, without reloading the model on every call
   return taggedWords
 
+def tokeniseText(text):
+  """
+  This method, given a text string, tokenises it, as the similar words are found in it.
+  
+  Parameters
+  ----------
+  text: string
+    The text to tokenise.
+    
+  Returns
+  -------
+  list
+    The list of tokens.
+  """
+  with tracing.span("tokenise", len(text)):
+    return nltk.word_tokenize(text)
+
+def similarToAll(corporaStringArr):
+  """
+  This method finds the words similar to each distinct word in a list of tokens.
+  
+  Parameters
+  ----------
+  corporaStringArr: list
+    The tokens.
+    
+  Returns
+  -------
+  dict
+    The similar words (a list, or None if it has no alphabetic occurrences) of each distinct lower-cased word.
+  """
+  with tracing.span("similarityIndex", len(corporaStringArr)):
+    index = similarityIndex.SimilarityIndex(corporaStringArr) # The contexts of every word, indexed once.
+  with tracing.span("similar", len(corporaStringArr)):
+    return index.similarToAll(corporaStringArr, 5) # Each distinct word only once, rather than once per token.
+
 def findSimilarWords(corporaString):
   """
   This method, given a text string containing words, will attempt find similar words to each word in the string, from elsewhere in the string, then output that to the file.
   
   Parameters
   ----------
-  corporaString: string
-    The text to tag.
+  corporaString: string or TextHandle
+    The text to tag, or where to find it in a SharedCorpus.
+    
+  Returns
+  -------
+  dict
+    The similar words (a list, or None if it has no alphabetic occurrences) of each distinct lower-cased word.
   """
-  stdoutLock.acquire() # This is - by nature of taking over stdout - not thread-safe.  Make it so by locking the whole method to a single thread.
-  wordSimilarityTuples = []
-  corporaStringArr = nltk.word_tokenize(corporaString)
-  corpora = nltk.Text(nltk.word_tokenize(corporaString))
-
-  filepath = "Similar Words in " + corporaString.split("\r")[0].split("Book of ")[1] + time.strftime("%Y-%m-%d-%H-%M-%S", time.gmtime()) + "GMT.txt"
-  print("Finding similar words in the corpora.  This may take a while.")
-  from contextlib import redirect_stdout
-  with open(filepath, 'w') as filePointer: # The file to put the similar words in.
-    with redirect_stdout(filePointer): # We have to redirect stdout because Text.similar in NLTK just prints, rather than returning a value.
-      for word in corporaStringArr:
-        print("-----\n" + word.upper() + " is similar to: ")
-        corpora.similar(word.lower(), 5) # This prints to the screen and doesn't actually return anything.  IKR?!
+  corporaString = sharedCorpus.resolve(corporaString)
+  book = corporaString.split("\r")[0].split("Book of ")[1]
+  cache = stageCache.getCache()
+  tokens = cache.stage("tokens", {"tokeniser": "word_tokenize"}, cache.source(corporaString), tokeniseText)
+  similar = cache.stage("similarWords", {"num": 5}, tokens, similarToAll)
+  filepath = "Similar Words in " + book + time.strftime("%Y-%m-%d-%H-%M-%S", time.gmtime()) + "GMT.txt"
+  print("Finding similar words in the corpora.")
+  similarWords = similar.value()
+  corporaStringArr = tokens.value() # Read from the cache, if the similar words were too, to write them out.
+  cache.report(book)
+  with tracing.span("writeSimilar", len(corporaStringArr)), open(filepath, 'w', encoding="utf-8") as filePointer: # The file to put the similar words in.
+    formatted = {word: similarityIndex.formatSimilar(similar) for word, similar in similarWords.items()}
+    filePointer.write("".join("-----\n" + word.upper() + " is similar to: \n" + formatted[word.lower()] + "\n" for word in corporaStringArr))
   print("Done!  See: " + filepath)
-  stdoutLock.release()
+  return similarWords
 
 def pullText():
   """
-  This method uses urllib to pull the test data from Project Gutenberg's online repository.
+  This method loads the test data from the local corpus store (see corpusStore.py), rather than pulling it from Project Gutenberg's online repository on every run.
     
   Returns
   -------
   list
     A list of all of the data from Project Gutenberg in string format.  We load all this straight into memory to save the overhead of grabbing it later.
   """
-  theTimeMachine = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/35/35-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  theIslandOfDoctorMoreau = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/159/159.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  lesMis = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/135/135-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  return [str(theTimeMachine.read().decode('utf8')), str(theIslandOfDoctorMoreau.read().decode('utf8')), str(lesMis.read().decode('utf8'))]
+  return corpusStore.pullText(["timeMachine", "islandOfDoctorMoreau", "lesMiserables"])
 
-def runTests(sampleData):
+def runTests(sampleData, pool=None):
   """
-  This method times and runs the two tests: tokenisation and frequency distribution.
+  This method times and runs the POS tagging test, writing the tagged words to a file.
+  The tags are kept in the stage cache (see stageCache.py), so a rerun with the same text and tagger reads them rather than tagging again.
   
   Parameters
   ----------
   sampleData: string
     The test data to run the tests on.
+  pool: multiprocessing.Pool
+    The pool to tag the text across, in batches of sentences.  Tagged in this process if None.
   """
   print ("  Beginning test:")
+  book = sampleData.split("\r")[0].split("Book of ")[1]
+  cache = stageCache.getCache()
+  tags = cache.stage("posTags", {"tagger": "averaged_perceptron_tagger", "tokeniser": "word_tokenize"}, cache.source(sampleData), lambda text: pOSTagText(text, pool))
   startTime = time.time()
-  taggedText = pOSTagText(sampleData)
-  print ("  POS Tagging time: \t", time.time() - startTime)
+  taggedText = tags.value()
+  taggingTime = time.time() - startTime
+  print ("  POS Tagging time: \t", taggingTime, "\ttokens/s: \t", len(taggedText) / taggingTime)
+  cache.report(book)
   print ("  Setting filepath.")
-  filepath = "POS Tagged " + sampleData.split("\r")[0].split("Book of ")[1] + time.strftime("%Y-%m-%d-%H-%M-%S", time.gmtime()) + "GMT.txt"
+  filepath = "POS Tagged " + book + time.strftime("%Y-%m-%d-%H-%M-%S", time.gmtime()) + "GMT"
   print ("  Writing file.")
-  filePointer = open(filepath, "w")
-  for data in taggedText:
-    filePointer.write(data[0] + "/" + data[1] + "\n")
-  print ("  Written!")
-  filePointer.close()
-  findSimilarWords(sampleData)
+  startTime = time.time()
+  with tracing.span("writeTagged", len(taggedText)):
+    filepath = outputSinks.writeTagged(filepath, taggedText) # In the format set by NATLANG_TAG_FORMAT (see outputSinks.py).
+  print ("  Written " + filepath + " in: \t", time.time() - startTime)
 
 def main():
   """
   Entrypoint: gets the data then runs the tests.
   
-  This runs the tests across the whole CPU using the multiprocessing library.
+  This runs the tests across the whole CPU using the multiprocessing library: each text is tagged in batches across every worker in turn, then similar words are found in all the texts at once, the largest first (see taskScheduler.py).
   """
   sampleData = pullText()
   startTime = time.time()
-  with multiprocessing.Pool() as pool:
-    pool.map(runTests, sampleData)
+  pool = workerResources.getPool(["punkt", "tagger"]) # Its workers load the tagger once, not once per text
+  for text in sampleData:
+    runTests(text, pool)
+  scheduler = taskScheduler.Scheduler(pool=pool, names=["punkt", "tagger"])
+  with tracing.span("schedule findSimilarWords", len(sampleData)), sharedCorpus.SharedCorpus(sampleData) as corpus: # Only a handle to each text is pickled (see sharedCorpus.py).
+    for index, similarWords in scheduler.run(findSimilarWords, corpus.handles(), "similarWords"):
+      pass # Each text's similar words are written to a file as it finishes.
+  scheduler.report()
   print ("Total multithreaded time: \t", time.time() - startTime)
 
 if __name__ == "__main__":
@@ -0,0 +1,215 @@
+"""
+plotRendering.py
+
+Rendering frequency plots to image files, in a process of their own, off the critical path of the pipeline.
+
+FreqDist.plot draws with whatever matplotlib backend is set, which blocks a worker on a GUI window, fails on a machine with no display, and counts the drawing in the stage's time.  Instead, workers only pick out the top N (word, count) pairs, as a small picklable plot description (see frequencyPlot), and send it back with their results.  A PlotRenderer in the main process passes each description to a single rendering process as it arrives, which draws it with matplotlib's non-interactive Agg backend and writes it to a file.  Only the rendering process ever imports matplotlib.
+
+The plots are written to the directory in the NATLANG_PLOT_DIRECTORY environment variable (plots, by default), in the formats in NATLANG_PLOT_FORMATS (a comma-separated list of png and svg; png by default).
+Each plot is named after its title.  Plots in the same run with the same title (e.g. the same book given twice) are numbered, so none overwrites another; a later run overwrites an earlier one's.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import multiprocessing # The rendering process
+import os # Filesystem paths and environment
+import queue # Waiting on the rendering process
+import re # Making titles into file names
+
+# Where plots are written, and in which formats, when not given.
+defaultDirectory = os.environ.get("NATLANG_PLOT_DIRECTORY", "plots")
+defaultFormats = os.environ.get("NATLANG_PLOT_FORMATS", "png").split(",")
+
+def frequencyPlot(freq, n, title, cumulative=False):
+  """
+  This method describes a frequency plot of the n most common samples, as FreqDist.plot(n) would draw it, without drawing it.
+
+  Parameters
+  ----------
+  freq: FreqDist or EncodedFrequencies
+    The frequency distribution.
+  n: int
+    How many of the most common samples to plot.
+  title: string
+    The plot's title.
+  cumulative: boolean
+    Whether to plot the cumulative counts.
+
+  Returns
+  -------
+  dict
+    The plot: its title, samples, counts and whether they are cumulative.  Small, and cheap to send between processes.
+  """
+  mostCommon = freq.mostCommon(n) if hasattr(freq, "mostCommon") else freq.most_common(n)
+  counts = [count for sample, count in mostCommon]
+  if cumulative:
+    total = 0
+    for i, count in enumerate(counts):
+      total += count
+      counts[i] = total
+  return {"title": title, "samples": [str(sample) for sample, count in mostCommon], "counts": counts, "cumulative": cumulative}
+
+def fileName(title, taken=None):
+  """
+  This method makes a plot's title into a file name, without its extension.
+
+  Parameters
+  ----------
+  title: string
+    The title.
+  taken: set
+    The names already used in this run, if any.  A name in it is numbered (_2, _3, ...) until it isn't, then added to it.
+
+  Returns
+  -------
+  string
+    The file name.
+  """
+  name = re.sub(r"[^\w\-]+", "_", title).strip("_") or "plot"
+  if taken is None:
+    return name
+  unique = name
+  number = 1
+  while unique in taken:
+    number += 1
+    unique = name + "_" + str(number)
+  taken.add(unique)
+  return unique
+
+def renderPlot(plot, directory, formats, taken=None):
+  """
+  This method draws a frequency plot with the Agg backend, as FreqDist.plot draws it, and writes it in each format.
+
+  Parameters
+  ----------
+  plot: dict
+    The plot, as frequencyPlot describes it.
+  directory: string
+    The directory to write it to.
+  formats: list
+    The formats to write (png, svg).
+  taken: set
+    The file names already written in this run, so the same title isn't overwritten (see fileName).
+
+  Returns
+  -------
+  list
+    The paths written.
+  """
+  from matplotlib.figure import Figure # Drawn without pyplot, so no GUI backend is ever loaded
+  figure = Figure(figsize=(max(6.4, 0.15 * len(plot["samples"])), 4.8))
+  axes = figure.add_subplot()
+  axes.plot(plot["counts"])
+  axes.set_xticks(range(len(plot["samples"])))
+  axes.set_xticklabels(plot["samples"], rotation=90)
+  axes.grid(True, color="silver")
+  axes.set_xlabel("Samples")
+  axes.set_ylabel("Cumulative Counts" if plot["cumulative"] else "Counts")
+  axes.set_title(plot["title"])
+  figure.tight_layout()
+  paths = []
+  name = fileName(plot["title"], taken)
+  for format in formats:
+    path = os.path.join(directory, name + "." + format)
+    figure.savefig(path, format=format)
+    paths.append(path)
+  return paths
+
+def renderLoop(plots, written, directory, formats):
+  """
+  This method runs in the rendering process: it renders each plot it is sent, until it is sent None, then sends back the paths it wrote.
+
+  Parameters
+  ----------
+  plots: multiprocessing.Queue
+    The plots to render.
+  written: multiprocessing.Queue
+    Where to send the list of paths written.
+  directory: string
+    The directory to write to.
+  formats: list
+    The formats to write.
+  """
+  paths = []
+  taken = set() # The file names written so far.
+  try:
+    import matplotlib
+    matplotlib.use("Agg")
+    os.makedirs(directory, exist_ok=True)
+    ready = True
+  except Exception as error: # Still wait for None and send back the (empty) paths, so close() returns.
+    print ("Couldn't render plots to " + directory + ": " + str(error))
+    ready = False
+  while True:
+    plot = plots.get()
+    if plot is None:
+      break
+    if not ready:
+      continue # Drained regardless, so submit's queue never fills.
+    try:
+      paths.extend(renderPlot(plot, directory, formats, taken))
+    except Exception as error: # One bad plot shouldn't lose the rest, or leave close() waiting.
+      print ("Couldn't render " + plot["title"] + ": " + str(error))
+  written.put(paths)
+
+class PlotRenderer:
+  '''
+  PlotRenderer
+
+  A process which renders every plot of a run, in the background, as they are submitted.
+  '''
+
+  def __init__(self, directory=None, formats=None):
+    '''
+    Constructor: starts the rendering process.
+
+    Parameters
+    ----------
+    directory: string
+      The directory to write plots to.  defaultDirectory if None.
+    formats: list
+      The formats to write.  defaultFormats if None.
+    '''
+    self.plots = multiprocessing.Queue()
+    self.written = multiprocessing.Queue()
+    self.process = multiprocessing.Process(target=renderLoop, args=(self.plots, self.written, directory or defaultDirectory, formats or defaultFormats), name="plotRenderer")
+    self.process.start()
+
+  def submit(self, plot):
+    '''
+    Queues a plot to be rendered.
+
+    Parameters
+    ----------
+    plot: dict
+      The plot, as frequencyPlot describes it.
+    '''
+    self.plots.put(plot)
+
+  def close(self):
+    '''
+    Waits for every submitted plot to be rendered, and stops the rendering process.
+
+    Returns
+    -------
+    list
+      The paths written.  Empty if the rendering process died before sending them back.
+    '''
+    self.plots.put(None)
+    while True:
+      try:
+        paths = self.written.get(timeout=1)
+        break
+      except queue.Empty:
+        if not self.process.is_alive():
+          try:
+            paths = self.written.get(timeout=1) # Sent just before it exited.
+          except queue.Empty:
+            print ("The plot renderer stopped with exit code " + str(self.process.exitcode) + " before it finished.")
+            paths = []
+          break
+    self.process.join()
+    return paths
@@ -0,0 +1,283 @@
+"""
+sharedCorpus.py
+
+Handing texts to pool workers through shared memory, rather than pickling each one into each task.
+
+pool.map(runTests, sampleData) pickles every book into the pipe to its worker, where it is unpickled into a second copy.  A SharedCorpus instead encodes all the texts once into one block of shared memory.  Each task is then only a TextHandle (the block's name and the byte offsets of one text, or one piece of a text), a few dozen bytes to pickle, and the worker decodes its text straight out of the shared block.
+The texts aren't copied into the workers' memory until they decode them, and the shared block itself is counted once however many workers read it.
+
+Usage:
+  with sharedCorpus.SharedCorpus(texts) as corpus:
+    results = pool.map(task, corpus.handles())   # task calls sharedCorpus.resolve(source) to get its text.
+
+  python3 sharedCorpus.py [source ...]   Compare the bytes pickled per task and the memory used with pool.map of the texts.
+
+Each source is a path to a UTF-8 text file, or the name of a text in the corpus store (the four sample books by default).
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import multiprocessing # Pools, for comparison
+import os # Filesystem paths
+import pickle # Measuring what each task sends
+import sys # Command line arguments
+import time # time library
+from collections import Counter, namedtuple # Counting words in the benchmark task, and handles
+from multiprocessing import shared_memory # The shared block
+
+# A text in a SharedCorpus: the name of the shared block, and the byte offsets of the text's UTF-8 encoding in it.
+TextHandle = namedtuple("TextHandle", ["name", "start", "end"])
+
+class SharedCorpus:
+  '''
+  SharedCorpus
+
+  A list of texts, encoded once into a block of shared memory.  The block is freed when the corpus is closed (or leaves its with statement).
+  '''
+
+  def __init__(self, texts):
+    '''
+    Constructor: encodes the texts into a new shared block.
+
+    Parameters
+    ----------
+    texts: list
+      The texts.
+    '''
+    encoded = [text.encode("utf-8") for text in texts]
+    self.block = shared_memory.SharedMemory(create=True, size=max(1, sum(len(data) for data in encoded)))
+    self.offsets = []
+    position = 0
+    for data in encoded:
+      self.block.buf[position:position + len(data)] = data
+      self.offsets.append((position, position + len(data)))
+      position += len(data)
+    self.chunkOffsets = {} # The offsets of each text's pieces, by piece size, worked out on first use.
+
+  def __len__(self):
+    '''
+    The number of texts.
+    '''
+    return len(self.offsets)
+
+  def handles(self):
+    '''
+    A handle for each text, to send to workers in place of the text.
+
+    Returns
+    -------
+    list
+      The TextHandles, in order.
+    '''
+    return [TextHandle(self.block.name, start, end) for start, end in self.offsets]
+
+  def chunkHandles(self, chunkSize):
+    '''
+    A handle for each piece of each text, split where the pieces can be tokenised separately (see textChunking.py).
+
+    Parameters
+    ----------
+    chunkSize: int
+      The least size of each piece, other than the last of each text, in characters.
+
+    Returns
+    -------
+    list
+      A list of TextHandles for each text, in order.
+    '''
+    if chunkSize not in self.chunkOffsets:
+      import textChunking # Splitting texts into independently tokenisable pieces
+      pieces = []
+      for start, end in self.offsets:
+        textPieces = []
+        for chunk in textChunking.iterateChunks(str(self.block.buf[start:end], "utf-8"), chunkSize):
+          size = len(chunk.encode("utf-8"))
+          textPieces.append((start, start + size))
+          start += size
+        pieces.append(textPieces)
+      self.chunkOffsets[chunkSize] = pieces
+    return [[TextHandle(self.block.name, start, end) for start, end in textPieces] for textPieces in self.chunkOffsets[chunkSize]]
+
+  def close(self):
+    '''
+    Frees the shared block.  Tasks still reading it keep their view of it until they finish.
+    '''
+    if self.block is not None:
+      self.block.close()
+      self.block.unlink()
+      self.block = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception):
+    self.close()
+    return False
+
+def attach(name):
+  """
+  This method opens a shared block by name.  The caller closes it, so a worker holds no block between tasks, and a block the corpus has closed is freed as soon as the tasks reading it finish.
+
+  Parameters
+  ----------
+  name: string
+    The block's name.
+
+  Returns
+  -------
+  SharedMemory
+    The block.
+  """
+  try:
+    return shared_memory.SharedMemory(name=name, track=False) # The process which made the block frees it.
+  except TypeError: # Before Python 3.13 every process shares the creator's resource tracker, so tracking is harmless.
+    return shared_memory.SharedMemory(name=name)
+
+def resolve(source):
+  """
+  This method gives the text a task was sent, whether it was sent the text or a TextHandle.
+
+  Parameters
+  ----------
+  source: string or TextHandle
+    The text, or where to find it.
+
+  Returns
+  -------
+  string
+    The text.
+  """
+  if isinstance(source, TextHandle):
+    block = attach(source.name) # Only mapped, not read, so opening it for each task costs a few system calls.
+    try:
+      return str(block.buf[source.start:source.end], "utf-8") # Decoded straight from the shared block.
+    finally:
+      block.close()
+  return source
+
+def countWords(source):
+  """
+  This method, run in a worker, counts the words of a text, as a light task which leaves the cost of handing the text over plain to see.
+
+  Parameters
+  ----------
+  source: string or TextHandle
+    The text, or where to find it.
+
+  Returns
+  -------
+  tuple
+    The packed word counts (see frequencyMerge.py).
+  """
+  import frequencyMerge # Packing the counts to send back
+  return frequencyMerge.packCounts(Counter(resolve(source).split()))
+
+def memoryOf(pid):
+  """
+  This method reads how much memory a process is using, from /proc (so only on Linux).
+
+  Parameters
+  ----------
+  pid: int
+    The process.
+
+  Returns
+  -------
+  tuple
+    Its resident set size (counting every shared page in full), its proportional set size (counting shared pages split between the processes sharing them), and its peak resident set size, in bytes.  None for any that can't be read.
+  """
+  values = {}
+  for path, keys in [("/proc/" + str(pid) + "/status", ["VmRSS", "VmHWM"]), ("/proc/" + str(pid) + "/smaps_rollup", ["Pss"])]:
+    try:
+      with open(path, "r") as file:
+        for line in file:
+          key, _, value = line.partition(":")
+          if key in keys:
+            values[key] = int(value.split()[0]) * 1024
+    except OSError:
+      pass
+  return (values.get("VmRSS"), values.get("Pss"), values.get("VmHWM"))
+
+def measureRun(task, sources, processes):
+  """
+  This method runs a task over some sources in a fresh pool, and measures what it sends and the memory its workers use.
+
+  Parameters
+  ----------
+  task: function
+    The task.
+  sources: list
+    The task's arguments: texts or TextHandles.
+  processes: int
+    The number of workers.
+
+  Returns
+  -------
+  dict
+    The time taken, the bytes pickled per task (the mean, for the arguments and the results), and the total RSS, PSS and peak RSS of the workers, measured as the last task finishes.
+  """
+  sentBytes = [len(pickle.dumps(source, pickle.HIGHEST_PROTOCOL)) for source in sources]
+  with multiprocessing.Pool(processes) as pool:
+    startTime = time.time()
+    results = pool.map(task, sources, chunksize=1)
+    seconds = time.time() - startTime
+    memory = [memoryOf(child.pid) for child in multiprocessing.active_children()]
+  returnedBytes = [len(pickle.dumps(result, pickle.HIGHEST_PROTOCOL)) for result in results]
+  rss, pss, peakRss = [None if not memory or None in column else sum(column) for column in zip(*memory)] if memory else (None, None, None)
+  return {"seconds": seconds, "sentPerTask": sum(sentBytes) / len(sentBytes), "returnedPerTask": sum(returnedBytes) / len(returnedBytes), "rss": rss, "pss": pss, "peakRss": peakRss}
+
+def megabytes(size):
+  """
+  This method formats a number of bytes in megabytes.
+
+  Parameters
+  ----------
+  size: int
+    The number of bytes, or None.
+
+  Returns
+  -------
+  string
+    The size, e.g. "12.5 MB", or "-" if None.
+  """
+  return "-" if size is None else format(size / 1e6, ".1f") + " MB"
+
+def runTests(texts, processes=None):
+  """
+  This method compares handing texts to workers with pool.map against handing them over through a SharedCorpus, whole and in pieces.
+
+  Parameters
+  ----------
+  texts: list
+    The texts.
+  processes: int
+    The number of workers.  One per CPU if None.
+  """
+  processes = processes or os.cpu_count()
+  print ("  " + str(len(texts)) + " texts, " + str(sum(len(text) for text in texts)) + " characters, " + str(processes) + " workers: ")
+  results = {"pool.map of texts": measureRun(countWords, texts, processes)}
+  with SharedCorpus(texts) as corpus:
+    results["shared memory handles"] = measureRun(countWords, corpus.handles(), processes)
+    results["shared memory, in pieces"] = measureRun(countWords, [handle for textHandles in corpus.chunkHandles(256 * 1024) for handle in textHandles], processes)
+  for name, result in results.items():
+    print ("  " + name + ": \t", result["seconds"], "\tpickled per task: \t", int(result["sentPerTask"]), "bytes sent, ", int(result["returnedPerTask"]), "bytes returned\tworkers' RSS: \t", megabytes(result["rss"]), "\tPSS: \t", megabytes(result["pss"]), "\tpeak RSS: \t", megabytes(result["peakRss"]))
+
+def main():
+  """
+  Entrypoint: compares the hand-offs on the texts given on the command line, or the sample books.
+  """
+  import corpusStore # Offline corpus store
+  texts = []
+  for source in (sys.argv[1:] or ["kjv", "shakespeare", "timeMachine", "lesMiserables"]):
+    if os.path.exists(source):
+      with open(source, "r", encoding="utf-8") as file:
+        texts.append(file.read())
+    else:
+      texts.append(corpusStore.loadText(source))
+  runTests(texts)
+
+if __name__ == "__main__":
+  main()
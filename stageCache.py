@@ -0,0 +1,507 @@
+"""
+stageCache.py
+
+A disk cache of the outputs of each stage of a pipeline (tokens, filtered tokens, stems, POS tags, frequency tables), so a rerun only redoes the stages whose input or settings have changed.
+
+Each stage's output is keyed by a hash of the stage's name, its parameters, the NLTK version, and the key of the stage it was computed from.  The first stage is computed from the text itself, keyed by the hash of its contents.  So changing one stage's parameters changes its key and the keys of every stage downstream of it, while the stages upstream of it are still found in the cache.  A stage's output is only read if a stage after it has to be computed, so a rerun with nothing changed reads only the last stages.
+NLTK's data (the tagger's model, the stopword lists) isn't versioned with NLTK.  Stages which depend on data name it in their parameters, rather than hashing it, so a cache hit never has to load it: clear the cache (python3 stageCache.py clear) when the data is updated.
+
+Outputs are stored one to a file, in a compact form: lists of words as a single compressed string, frequency tables packed as frequencyMerge packs them, and anything else pickled and compressed.  Reading a stage's output marks it as recently used, and the least recently used are removed once the cache is over its size limit.
+
+The cache is kept in .stagecache in the repository root by default.  Set the NATLANG_STAGE_CACHE environment variable to a directory to move it, or to an empty string to turn it off, and NATLANG_STAGE_CACHE_BYTES to change its size limit (256MB by default).
+
+Usage:
+  cache = stageCache.getCache()
+  text = cache.source(sampleData)
+  tokens = cache.stage("tokens", {"tokeniser": "word_tokenize"}, text, nltk.word_tokenize)
+  counts = cache.stage("typeCounts", {}, tokens, nltk.FreqDist)
+  freq = counts.value()   # Computes, or reads from the cache, only what it needs.
+  cache.report(book)
+
+  python3 stageCache.py [stats | clear]   Report on the cache's contents, or empty it.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import hashlib # Keys
+import json # Hashing stage parameters
+import os # Filesystem paths and environment
+import pickle # Storing outputs
+import sys # Command line arguments
+import zlib # Compressing outputs
+from collections import Counter # Statistics
+import frequencyMerge # Packing frequency tables
+import tracing # Per-stage spans, when NATLANG_TRACE is set
+
+# Where the cache is kept, unless NATLANG_STAGE_CACHE says otherwise.  An empty string turns it off.
+defaultPath = os.environ.get("NATLANG_STAGE_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".stagecache")) or None
+
+# The most bytes the cache's files may take up before the least recently used are removed.
+defaultMaxBytes = int(os.environ.get("NATLANG_STAGE_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+# The version of the stored format.  Outputs stored in any other version are never found.
+cacheVersion = 1
+
+def nltkVersion():
+  """
+  This method finds the installed version of NLTK, without importing it.
+
+  Returns
+  -------
+  string
+    The version, or "none" if NLTK isn't installed.
+  """
+  from importlib import metadata # Installed package versions
+  try:
+    return metadata.version("nltk")
+  except metadata.PackageNotFoundError:
+    return "none"
+
+def digest(value):
+  """
+  This method hashes a value made of strings, numbers, lists and dicts, e.g. a stage's parameters or a stopword list.
+
+  Parameters
+  ----------
+  value: object
+    The value.  It must be serialisable as JSON.
+
+  Returns
+  -------
+  string
+    The SHA-256 hex digest of its JSON, with the keys of dicts sorted.
+  """
+  return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def textKey(text):
+  """
+  This method gives the key of a text, the source of a pipeline.
+
+  Parameters
+  ----------
+  text: string
+    The text.
+
+  Returns
+  -------
+  string
+    The SHA-256 hex digest of its UTF-8 encoding.
+  """
+  return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def isWordList(value):
+  """
+  This method checks whether a value is a list of strings which can be stored joined by NUL characters.
+
+  Parameters
+  ----------
+  value: object
+    A stage's output.
+
+  Returns
+  -------
+  boolean
+    True if it is a list of strings, none of which contains a NUL.
+  """
+  return isinstance(value, list) and all(type(word) is str for word in value) and not any("\0" in word for word in value)
+
+def isTaggedList(value):
+  """
+  This method checks whether a value is a list of (word, tag) pairs, as a POS tagger gives, which can be stored as two lists of words.
+
+  Parameters
+  ----------
+  value: object
+    A stage's output.
+
+  Returns
+  -------
+  boolean
+    True if it is a list of pairs of strings, none of which contains a NUL.
+  """
+  return isinstance(value, list) and all(type(pair) is tuple and len(pair) == 2 and type(pair[0]) is str and type(pair[1]) is str for pair in value) and not any("\0" in pair[0] or "\0" in pair[1] for pair in value)
+
+def encodeValue(value):
+  """
+  This method encodes a stage's output compactly.
+
+  Parameters
+  ----------
+  value: object
+    The output.  It must be picklable.
+
+  Returns
+  -------
+  bytes
+    The encoded output.
+  """
+  if isWordList(value):
+    stored = ("words", zlib.compress("\0".join(value).encode("utf-8")), len(value))
+  elif isTaggedList(value):
+    stored = ("tagged", zlib.compress("\0".join(word for word, tag in value).encode("utf-8")), zlib.compress("\0".join(tag for word, tag in value).encode("utf-8")), len(value))
+  elif type(value).__name__ == "FreqDist":
+    stored = ("counts", frequencyMerge.packCounts(value))
+  else:
+    stored = ("pickle", zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+  return pickle.dumps((cacheVersion,) + stored, pickle.HIGHEST_PROTOCOL)
+
+def splitWords(data, length):
+  """
+  This method reverses the joining of a list of words by NUL characters.
+
+  Parameters
+  ----------
+  data: bytes
+    The compressed, joined words.
+  length: int
+    How many words there were, to tell an empty list from a list of one empty word.
+
+  Returns
+  -------
+  list
+    The words.
+  """
+  return zlib.decompress(data).decode("utf-8").split("\0") if length else []
+
+def decodeValue(data):
+  """
+  This method decodes a stage's output, as encodeValue encoded it.
+
+  Parameters
+  ----------
+  data: bytes
+    The encoded output.
+
+  Returns
+  -------
+  object
+    The output.
+  """
+  stored = pickle.loads(data)
+  if stored[0] != cacheVersion:
+    raise ValueError("Stored in version " + str(stored[0]) + " of the cache")
+  kind = stored[1]
+  if kind == "words":
+    return splitWords(stored[2], stored[3])
+  if kind == "tagged":
+    return list(zip(splitWords(stored[2], stored[4]), splitWords(stored[3], stored[4])))
+  if kind == "counts":
+    return frequencyMerge.unpackCounts(stored[2])
+  return pickle.loads(zlib.decompress(stored[2]))
+
+class Stage:
+  '''
+  Stage
+
+  One stage of a pipeline: its key, and a way to get its output, from the cache or by computing it from the stage before.
+  '''
+
+  def __init__(self, cache, name, key, upstream=None, compute=None, value=None):
+    '''
+    Constructor for a stage.  Use StageCache.source and StageCache.stage rather than this.
+
+    Parameters
+    ----------
+    cache: StageCache
+      The cache.
+    name: string
+      The stage's name.
+    key: string
+      The stage's key.
+    upstream: Stage
+      The stage its input comes from.  None for a source.
+    compute: function
+      Computes its output from its input.  None for a source.
+    value: object
+      A source's output.
+    '''
+    self.cache = cache
+    self.name = name
+    self.key = key
+    self.upstream = upstream
+    self.compute = compute
+    self.output = value
+    self.known = upstream is None
+
+  def value(self):
+    '''
+    Gets the stage's output: from memory if it has been got already, else from the cache, else by computing it (and storing it in the cache).
+
+    Returns
+    -------
+    object
+      The output.
+    '''
+    if not self.known:
+      found, output = self.cache.get(self.name, self.key)
+      if not found:
+        output = self.compute(self.upstream.value())
+        self.cache.put(self.key, output)
+      self.output = output
+      self.known = True
+    return self.output
+
+class StageCache:
+  '''
+  StageCache
+
+  A size-bounded, least-recently-used cache of stage outputs, one file per output, shared by every process which uses the same directory.
+  '''
+
+  def __init__(self, path=defaultPath, maxBytes=defaultMaxBytes):
+    '''
+    Constructor for the cache.
+
+    Parameters
+    ----------
+    path: string
+      The directory to keep the outputs in.  Nothing is stored if None.
+    maxBytes: int
+      The most bytes the outputs may take up.
+    '''
+    self.path = path
+    self.maxBytes = maxBytes
+    self.nltkVersion = nltkVersion()
+    self.size = None # The bytes the outputs take up, as far as this process knows: found on the first put, then kept up to date as it stores and evicts.
+    self.resetStatistics()
+
+  def resetStatistics(self):
+    '''
+    Resets the hit, miss and byte counts.
+    '''
+    self.hits = Counter() # By stage.
+    self.misses = Counter()
+    self.bytesRead = 0
+    self.bytesWritten = 0
+    self.evicted = 0
+
+  def key(self, name, params, upstreamKey):
+    '''
+    Gives the key of a stage's output.
+
+    Parameters
+    ----------
+    name: string
+      The stage's name.
+    params: dict
+      Everything about the stage which changes its output.
+    upstreamKey: string
+      The key of its input.
+
+    Returns
+    -------
+    string
+      The key.
+    '''
+    return digest([cacheVersion, self.nltkVersion, name, params, upstreamKey])
+
+  def source(self, text):
+    '''
+    Starts a pipeline at a text.
+
+    Parameters
+    ----------
+    text: string
+      The text.
+
+    Returns
+    -------
+    Stage
+      The source stage, keyed by the text's contents.
+    '''
+    return Stage(self, "text", textKey(text), value=text)
+
+  def stage(self, name, params, upstream, compute):
+    '''
+    Adds a stage to a pipeline.  Nothing is computed or read until its value is asked for.
+
+    Parameters
+    ----------
+    name: string
+      The stage's name.
+    params: dict
+      Everything about the stage which changes its output.  It must be serialisable as JSON.
+    upstream: Stage
+      The stage its input comes from.
+    compute: function
+      Computes its output from its input.
+
+    Returns
+    -------
+    Stage
+      The stage.
+    '''
+    return Stage(self, name, self.key(name, params, upstream.key), upstream, compute)
+
+  def filePath(self, key):
+    '''
+    Where an output is stored.
+    '''
+    return os.path.join(self.path, key + ".stage")
+
+  def get(self, name, key):
+    '''
+    Reads an output from the cache, and marks it as recently used.
+
+    Parameters
+    ----------
+    name: string
+      The stage's name, for the statistics.
+    key: string
+      The output's key.
+
+    Returns
+    -------
+    tuple
+      Whether it was found, and the output if so.
+    '''
+    if self.path is not None:
+      path = self.filePath(key)
+      try:
+        with tracing.span("stageCache read " + name), open(path, "rb") as file:
+          data = file.read()
+          output = decodeValue(data)
+        os.utime(path) # Recently used.
+      except (OSError, EOFError, ValueError, pickle.UnpicklingError, zlib.error, ImportError, AttributeError): # Missing, evicted, half-written by an older version, from another version, or of a class which no longer imports.
+        pass
+      else:
+        self.hits[name] += 1
+        self.bytesRead += len(data)
+        return True, output
+    self.misses[name] += 1
+    return False, None
+
+  def put(self, key, output):
+    '''
+    Stores an output, replacing the file atomically so other processes never read it half-written, then evicts the least recently used outputs if the cache is too big.
+    The cache's size is kept as a running total, so the directory is only listed the first time, and when the total goes over the limit (when it is listed again, to count what other processes have stored too).
+
+    Parameters
+    ----------
+    key: string
+      The output's key.
+    output: object
+      The output.
+    '''
+    if self.path is None:
+      return
+    data = encodeValue(output)
+    if len(data) > self.maxBytes:
+      return
+    os.makedirs(self.path, exist_ok=True)
+    if self.size is None:
+      self.size = sum(size for path, size, used in self.entries())
+    try:
+      replacedSize = os.stat(self.filePath(key)).st_size
+    except OSError: # A new output, as it usually is.
+      replacedSize = 0
+    temporaryPath = self.filePath(key) + "." + str(os.getpid()) + ".tmp"
+    with open(temporaryPath, "wb") as file:
+      file.write(data)
+    os.replace(temporaryPath, self.filePath(key))
+    self.bytesWritten += len(data)
+    self.size += len(data) - replacedSize
+    if self.size > self.maxBytes:
+      self.evict()
+
+  def entries(self):
+    '''
+    Lists the stored outputs.
+
+    Returns
+    -------
+    list
+      The path, size and last use of each, least recently used first.
+    '''
+    entries = []
+    if self.path is not None and os.path.isdir(self.path):
+      for name in os.listdir(self.path):
+        if name.endswith(".stage"):
+          try:
+            status = os.stat(os.path.join(self.path, name))
+          except OSError: # Evicted by another process.
+            continue
+          entries.append((os.path.join(self.path, name), status.st_size, status.st_mtime))
+    entries.sort(key=lambda entry: entry[2])
+    return entries
+
+  def evict(self):
+    '''
+    Removes the least recently used outputs until the cache is within its size limit.
+    '''
+    entries = self.entries()
+    total = sum(size for path, size, used in entries)
+    for path, size, used in entries:
+      if total <= self.maxBytes:
+        break
+      try:
+        os.remove(path)
+        self.evicted += 1
+      except OSError: # Evicted by another process.
+        pass
+      total -= size
+    self.size = total
+
+  def clear(self):
+    '''
+    Removes every stored output.
+    '''
+    for path, size, used in self.entries():
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+    self.size = 0
+
+  def report(self, label):
+    '''
+    Prints the hits and misses of each stage since the statistics were last reset, then resets them.
+
+    Parameters
+    ----------
+    label: string
+      What the statistics are for, e.g. the book.
+    '''
+    stages = ", ".join(name + " " + ("hit" if self.hits[name] and not self.misses[name] else "miss" if not self.hits[name] else str(self.hits[name]) + " hits/" + str(self.misses[name]) + " misses") for name in dict.fromkeys(list(self.hits) + list(self.misses)))
+    print ("  " + label + " stage cache: \t", sum(self.hits.values()), "hits\t", sum(self.misses.values()), "misses\t(" + stages + ")\tread: \t", self.bytesRead, "bytes\twritten: \t", self.bytesWritten, "bytes\tevicted: \t", self.evicted)
+    self.resetStatistics()
+
+# One cache per process, so its statistics cover what the process has done.
+processCache = None
+
+def getCache():
+  """
+  This method gets this process's cache, creating it on first use.
+
+  Returns
+  -------
+  StageCache
+    The cache.
+  """
+  global processCache
+  if processCache is None:
+    processCache = StageCache()
+  return processCache
+
+def main():
+  """
+  Entrypoint: reports on or clears the cache.
+  """
+  cache = getCache()
+  command = sys.argv[1] if sys.argv[1:] else "stats"
+  if cache.path is None:
+    print ("The stage cache is turned off (NATLANG_STAGE_CACHE is empty).")
+  elif command == "stats":
+    entries = cache.entries()
+    print (str(len(entries)) + " outputs, " + str(sum(size for path, size, used in entries)) + " bytes of " + str(cache.maxBytes) + ", in " + cache.path)
+  elif command == "clear":
+    cache.clear()
+    print ("Cleared " + cache.path)
+  else:
+    print(__doc__)
+
+if __name__ == "__main__":
+  main()
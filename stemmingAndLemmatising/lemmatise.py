@@ -15,46 +15,110 @@ Authors
 """
 
 import nltk # Natural Language Processing Toolkit
-import urllib.request # Python Website Crawler
+import os # Filesystem paths
+import string # String lib - used to remove punctuation
+import sys # Module search path
 import time # time library
-import multiprocessing # multithreading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # The shared modules live in the repository root.
+import corpusStore # Offline corpus store
+import frequencyMerge # Packing and merging word counts from workers
+import vocabularyEncoding # Integer-encoded frequency counting
+import memoCache # Memoised lemmatisation
+import plotRendering # Plots rendered off the workers
+import stageCache # Stage outputs kept between runs
+import sharedCorpus # Texts handed to workers through shared memory
+import taskScheduler # Largest-first scheduling across the pool
+import tracing # Per-stage spans, when NATLANG_TRACE is set
+import workerResources # NLTK resources loaded once per process
 
 # nltk.download() # Open NLTK package Downloader
 
-def lemmatiseText(text):
+# What changes the output of tokeniseText, for the stage cache.  The same as stem.py's, so the two share their tokens and filtered tokens.
+tokeniseParams = {"punctuation": string.punctuation, "tokeniser": "word_tokenize"}
+
+# What changes the output of filterStopwords, for the stage cache.  The same as stem.py's: the stopword list is named rather than hashed, so a cache hit never loads it.
+filterParams = {"stopwords": "nltk english"}
+
+def tokeniseText(text):
   """
-  This method, given a body of text, will tokenise, remove stopwords, and lemmatise the text.
+  This method, given a body of text, will strip its punctuation and tokenise it.
   
   Parameters
   ----------
   text: string
-    The text to stem.
+    The text to tokenise.
+    
+  Returns
+  -------
+  list
+    The list of tokens.
+  """
+  with tracing.span("stripPunctuation", len(text)):
+    noPunctuationText = text.translate(str.maketrans({a:None for a in string.punctuation})) # Strip punctuation
+  with tracing.span("tokenise", len(noPunctuationText)):
+    return nltk.word_tokenize(noPunctuationText)
+
+def filterStopwords(tokenisedText):
+  """
+  This method, given a list of tokens, will remove the stopwords from it.
+  
+  Parameters
+  ----------
+  tokenisedText: list
+    The tokens.
+    
+  Returns
+  -------
+  list
+    The list of tokens which are not stopwords.
+  """
+  with tracing.span("filterStopwords", len(tokenisedText)):
+    stopWords = workerResources.get("stopwords") # Loaded once per process, lower-cased
+    unstoppedTokens = []
+    for word in tokenisedText:
+      if word.lower() not in stopWords:
+        unstoppedTokens.append(word)
+  return unstoppedTokens
+
+def lemmatiseTokens(unstoppedTokens):
+  """
+  This method, given a list of tokens, will lemmatise them.
+  
+  Parameters
+  ----------
+  unstoppedTokens: list
+    The tokens, without stopwords.
     
   Returns
   -------
   list
     The list of lemmata.
   """
-  lemmatisedText = []
-  import string
-  noPunctuationText = text.translate(str.maketrans({a:None for a in string.punctuation})) # Strip punctuation
-  tokenisedText = nltk.word_tokenize(noPunctuationText)
-  # Strip any stopwords
-  from nltk.corpus import stopwords
-  stopWords = set(stopwords.words('english'))
-  unstoppedTokens = []
-  for word in tokenisedText:
-    if word not in stopWords and word.lower not in stopWords:
-      unstoppedTokens.append(word)
   # Initialise the lemmatisation
-  from nltk.stem import WordNetLemmatizer
-  lem = WordNetLemmatizer()
+  lem = workerResources.get("lemmatiser")
   
-  for word in unstoppedTokens:
-    lemmatisedText.append(lem.lemmatize(word))
+  with tracing.span("lemmatise", len(unstoppedTokens)):
+    lemmatisedText = memoCache.getCache().mapWords("wordnet", lem.lemmatize, unstoppedTokens) # Lemmatise each distinct word only once
 
   return lemmatisedText
 
+def lemmatiseText(text):
+  """
+  This method, given a body of text, will tokenise, remove stopwords, and lemmatise the text.
+  
+  Parameters
+  ----------
+  text: string
+    The text to stem.
+    
+  Returns
+  -------
+  list
+    The list of lemmata.
+  """
+  return lemmatiseTokens(filterStopwords(tokeniseText(text)))
+
 def buildFrequencyDistributionData(tokItems):
   """
   This method, given a list of "word" data and corresponding frequencies, will plot a frequency graph of it using NLTK.
@@ -66,57 +130,84 @@ def buildFrequencyDistributionData(tokItems):
     
   Returns
   -------
-  FreqDist
-    The frequency distribution plot.
+  EncodedFrequencies
+    The frequency distribution, counted over integer word ids (see vocabularyEncoding.py).  Call toFreqDist(n) for a FreqDist of the top n words.
   """
-  freq = nltk.FreqDist(tokItems) # Build the frequency data
+  freq = vocabularyEncoding.EncodedFrequencies.fromTokens(tokItems) # Build the frequency data
   return freq
 
 def pullText():
   """
-  This method uses urllib to pull the test data from Project Gutenberg's online repository.
+  This method loads the test data from the local corpus store (see corpusStore.py), rather than pulling it from Project Gutenberg's online repository on every run.
     
   Returns
   -------
   list
     A list of all of the data from Project Gutenberg in string format.  We load all this straight into memory to save the overhead of grabbing it later.
   """
-  kJV = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/10/10-0.txt', headers={'User-Agent': 'Mozilla/5.0'})) # get the text from the URL
-  worksOfShakespeare = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/100/100-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  theTimeMachine = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/35/35-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  lesMis = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/135/135-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  return [str(kJV.read().decode('utf8')), str(worksOfShakespeare.read().decode('utf8')), str(theTimeMachine.read().decode('utf8')), str(lesMis.read().decode('utf8'))]
+  return corpusStore.pullText(["kjv", "shakespeare", "timeMachine", "lesMiserables"])
   
 def runTests(sampleData):
   """
   This method times and runs the two tests: tokenisation and frequency distribution.
+  Each stage's output is kept in the stage cache (see stageCache.py), so a rerun only redoes the stages whose text or settings have changed, and the stages they feed.
   
   Parameters
   ----------
-  sampleData: string
-    The test data to run the tests on.
+  sampleData: string or TextHandle
+    The test data to run the tests on, or where to find it in a SharedCorpus.
+    
+  Returns
+  -------
+  tuple
+    The text's lemma counts, packed for sending back from a worker (see frequencyMerge.py), and the plot of its top 100 lemmata, to render (see plotRendering.py).
   """
-  startTime = time.time()
-  lemmatisedText = lemmatiseText(sampleData)
-  print ("  Lemmatisation time: \t", time.time() - startTime)
-  startTime = time.time()
-  freq = buildFrequencyDistributionData(lemmatisedText)
-  print ("  Frequency Distribution time: \t", time.time() - startTime)
-  print ("  Frequency distribution graph of the top 100 word lemmata:")
+  sampleData = sharedCorpus.resolve(sampleData)
   title = "Lemmata of: " + sampleData.split("\r")[0].split("Gutenberg eBook of ")[1]
-  freq.plot(100, cumulative=False, title=title) # Plot a frequency graph (first 100 words)
+  cache = stageCache.getCache()
+  text = cache.source(sampleData)
+  tokens = cache.stage("tokens", tokeniseParams, text, tokeniseText)
+  unstoppedTokens = cache.stage("filteredTokens", filterParams, tokens, filterStopwords)
+  lemmata = cache.stage("lemmata", {"method": "wordnet"}, unstoppedTokens, lemmatiseTokens)
+  lemmaCounts = cache.stage("lemmaCounts", {}, lemmata, lambda lemmatisedText: frequencyMerge.packCounts(buildFrequencyDistributionData(lemmatisedText)))
+  startTime = time.time()
+  counts = lemmaCounts.value() # Lemmatised only if the counts aren't in the cache.
+  print ("  Lemmatisation and Frequency Distribution time: \t", time.time() - startTime)
+  memoCache.getCache().report(title)
+  cache.report(title)
+  with tracing.span("saveCache"):
+    memoCache.getCache().save()
+  freq = frequencyMerge.unpackCounts(counts)
+  with tracing.span("plotData"):
+    plot = plotRendering.frequencyPlot(freq, 100, title) # Only the top 100 lemmata go back, to be drawn in the main process's renderer
   freq.tabulate(10, cumulative=False, title=title)
+  return (counts, plot)
 
 def main():
   """
   Entrypoint: gets the data then runs the tests.
   
-  This runs the tests across the whole CPU using the multiprocessing library.
+  This runs the tests across the whole CPU using the multiprocessing library, then merges the workers' counts into one distribution for the whole corpus.
+  Each text's plot is rendered to a file in the background as soon as its worker finishes (see plotRendering.py).
+  The texts are handed to the workers through shared memory, so only a handle to each is pickled (see sharedCorpus.py), largest first (see taskScheduler.py).
   """
-  sampleData = pullText()
+  corpus = sharedCorpus.SharedCorpus(pullText())
   print ("Running.  This may take a while: ")
-  with multiprocessing.Pool() as pool:
-    pool.map(runTests, sampleData)
+  renderer = plotRendering.PlotRenderer()
+  pool = workerResources.getPool(["punkt", "stopwords", "lemmatiser"]) # Shared by every stage, its workers preloaded
+  scheduler = taskScheduler.Scheduler(pool=pool, names=["punkt", "stopwords", "lemmatiser"])
+  partialCounts = [None] * len(corpus)
+  with tracing.span("schedule runTests", len(corpus)), corpus: # Includes pickling the handles out and the counts back.
+    for index, (counts, plot) in scheduler.run(runTests, corpus.handles(), "lemmatise"):
+      partialCounts[index] = counts
+      renderer.submit(plot)
+  scheduler.report()
+  with tracing.span("treeMerge"):
+    corpusFreq = frequencyMerge.treeMerge(partialCounts, pool)
+  print ("Lemmata across the whole corpus: \t", corpusFreq.N(), "\tdistinct: \t", corpusFreq.B())
+  corpusFreq.tabulate(10, cumulative=False)
+  with tracing.span("renderPlots"): # Only what's left once the merging is done.
+    print ("Frequency distribution graphs of the top 100 word lemmata: " + ", ".join(renderer.close()))
 
 if __name__ == "__main__":
   main()
@@ -0,0 +1,177 @@
+"""
+memoCache.py
+
+A bounded memo cache for stemming and lemmatisation.
+
+A book like the KJV has nearly a million tokens but only tens of thousands of distinct words, so stemming every token repeats the same work many times over.  MemoCache applies the stemmer (or lemmatiser) once per distinct word, keyed by (algorithm, word), and maps the results back onto the token stream.
+The cache holds at most maxSize entries, evicting the least recently used, and can be saved to disk and loaded on the next run.  Set the NATLANG_STEM_CACHE environment variable to a file path to persist it.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import os # Filesystem paths and environment
+import pickle # Persisting the cache
+import time # time library
+from collections import OrderedDict # Least recently used ordering
+
+class MemoCache:
+  '''
+  MemoCache
+
+  A least-recently-used cache of stemmer and lemmatiser results, keyed by (algorithm, word).
+  '''
+
+  def __init__(self, maxSize=200000, path=None):
+    '''
+    Constructor for the cache.
+
+    Parameters
+    ----------
+    maxSize: int
+      The most entries to keep.  The least recently used are evicted beyond this.
+    path: string
+      A file to load the cache from now, and save it to later.  Not persisted if None.
+    '''
+    self.maxSize = maxSize
+    self.path = path
+    self.entries = OrderedDict()
+    self.computeCount = 0 # Results computed over the cache's whole life, including previous runs, for estimating time saved.
+    self.computeTime = 0.0
+    self.savedCount = 0 # The part of those already in the file, as last loaded or saved, so merging doesn't count it twice.
+    self.savedTime = 0.0
+    self.resetStatistics()
+    if path is not None and os.path.exists(path):
+      self.load()
+
+  def resetStatistics(self):
+    '''
+    Resets the token, hit and miss counts.
+    '''
+    self.tokens = 0 # Tokens mapped.
+    self.hits = 0 # Distinct words found in the cache.
+    self.misses = 0 # Distinct words which had to be computed.
+
+  def mapWords(self, algorithm, function, words, counts=None):
+    '''
+    Applies a function to every word in a list, computing it only once per distinct word that is not already cached.
+
+    Parameters
+    ----------
+    algorithm: string
+      The name of the function, e.g. "snowball", to keep its results apart from other functions'.
+    function: function
+      The stemmer or lemmatiser, taking a word and returning a string.
+    words: list
+      The tokens.
+    counts: list
+      How many tokens each word stands for, if words are the distinct words of a text rather than its tokens (e.g. a FreqDist's keys and values), so the statistics still count tokens.  One each if None.
+
+    Returns
+    -------
+    list
+      The function's result for each token, in order.
+    '''
+    entries = self.entries
+    results = {}
+    for word in dict.fromkeys(words): # Each distinct word, once.
+      key = (algorithm, word)
+      result = entries.get(key)
+      if result is None:
+        startTime = time.time()
+        result = function(word)
+        self.computeTime += time.time() - startTime
+        self.misses += 1
+        self.computeCount += 1
+        entries[key] = result
+        if len(entries) > self.maxSize:
+          entries.popitem(last=False)
+      else:
+        self.hits += 1
+        entries.move_to_end(key)
+      results[word] = result
+    self.tokens += sum(counts) if counts is not None else len(words)
+    return [results[word] for word in words]
+
+  def report(self, label):
+    '''
+    Prints the cache's hit rate and the time it saved since the statistics were last reset, then resets them.
+    The hit rate is of distinct words looked up, and the calls saved are against calling the function once per token.
+
+    Parameters
+    ----------
+    label: string
+      What the statistics are for, e.g. the algorithm and book.
+    '''
+    lookups = self.hits + self.misses
+    hitRate = self.hits / lookups if lookups else 0.0
+    averageTime = self.computeTime / self.computeCount if self.computeCount else 0.0
+    callsSaved = self.tokens - self.misses
+    print ("  " + label + " cache: \t", self.tokens, "tokens\t", lookups, "distinct\thit rate: \t", hitRate, "\tcalls saved: \t", callsSaved, "\testimated time saved: \t", callsSaved * averageTime)
+    self.resetStatistics()
+
+  def readFile(self):
+    '''
+    Reads what is saved in the cache's file.
+
+    Returns
+    -------
+    dict
+      The saved entries, in least to most recently used order, and the compute count and time.
+    '''
+    with open(self.path, "rb") as file:
+      return pickle.load(file)
+
+  def load(self):
+    '''
+    Loads the cache's entries from its file.
+    '''
+    saved = self.readFile()
+    self.entries = OrderedDict(saved["entries"])
+    self.computeCount = self.savedCount = saved["computeCount"]
+    self.computeTime = self.savedTime = saved["computeTime"]
+    while len(self.entries) > self.maxSize:
+      self.entries.popitem(last=False)
+
+  def save(self):
+    '''
+    Saves the cache's entries to its file, if it has one.  Every worker saves to the same file, so each merges its entries into what the others have saved since it loaded, rather than overwriting them: its own entries count as the more recently used.  The file is replaced atomically, so concurrent workers never leave it half-written.
+    '''
+    if self.path is None:
+      return
+    try:
+      saved = self.readFile()
+    except (OSError, EOFError, pickle.UnpicklingError): # Not saved yet, or unreadable, so there's nothing to merge.
+      saved = {"entries": [], "computeCount": self.savedCount, "computeTime": self.savedTime}
+    entries = OrderedDict(saved["entries"])
+    for key, result in self.entries.items():
+      entries[key] = result
+      entries.move_to_end(key)
+    while len(entries) > self.maxSize:
+      entries.popitem(last=False)
+    self.entries = entries
+    self.computeCount = self.savedCount = saved["computeCount"] + self.computeCount - self.savedCount
+    self.computeTime = self.savedTime = saved["computeTime"] + self.computeTime - self.savedTime
+    temporaryPath = self.path + "." + str(os.getpid()) + ".tmp"
+    with open(temporaryPath, "wb") as file:
+      pickle.dump({"entries": list(self.entries.items()), "computeCount": self.computeCount, "computeTime": self.computeTime}, file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporaryPath, self.path)
+
+# One cache per process, so it carries over between the texts a worker is given.
+processCache = None
+
+def getCache():
+  """
+  This method gets this process's cache, creating it (and loading it from NATLANG_STEM_CACHE, if set) on first use.
+
+  Returns
+  -------
+  MemoCache
+    The cache.
+  """
+  global processCache
+  if processCache is None:
+    processCache = MemoCache(path=os.environ.get("NATLANG_STEM_CACHE"))
+  return processCache
@@ -15,51 +15,119 @@ Authors
 """
 
 import nltk # Natural Language Processing Toolkit
-import urllib.request # Python Website Crawler
+import os # Filesystem paths
+import string # String lib - used to remove punctuation
+import sys # Module search path
 import time # time library
-import multiprocessing # multithreading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # The shared modules live in the repository root.
+import corpusStore # Offline corpus store
+import frequencyMerge # Packing and merging word counts from workers
+import vocabularyEncoding # Integer-encoded frequency counting
+import memoCache # Memoised stemming
+import plotRendering # Plots rendered off the workers
+import stageCache # Stage outputs kept between runs
+import sharedCorpus # Texts handed to workers through shared memory
+import taskScheduler # Largest-first scheduling across the pool
+import tracing # Per-stage spans, when NATLANG_TRACE is set
+import workerResources # NLTK resources loaded once per process
 
 # nltk.download() # Open NLTK package Downloader
 
-def stemText(text, method):
+# The stemming methods runTests fans each text out to.  Any of: snowball, porter, lancaster, wordnet (lemmatisation).
+stemmingMethods = ["snowball", "porter"]
+
+# What changes the output of tokeniseText, for the stage cache.
+tokeniseParams = {"punctuation": string.punctuation, "tokeniser": "word_tokenize"}
+
+# What changes the output of filterStopwords, for the stage cache: which of NLTK's stopword lists, named rather than hashed so a cache hit never loads it.  Every key has the NLTK version in it; clear the cache if the NLTK data is updated on its own.
+filterParams = {"stopwords": "nltk english"}
+
+def tokeniseText(text):
   """
-  This method, given a body of text and a stemming method, will tokenise, remove stopwords, and stem the text.
+  This method, given a body of text, will strip its punctuation and tokenise it.
   
   Parameters
   ----------
   text: string
-    The text to stem.
-  method: string
-    The method by which to stem.
+    The text to tokenise.
+    
+  Returns
+  -------
+  list
+    The list of tokens.
+  """
+  with tracing.span("stripPunctuation", len(text)):
+    noPunctuationText = text.translate(str.maketrans({a:None for a in string.punctuation})) # Strip punctuation
+  with tracing.span("tokenise", len(noPunctuationText)):
+    return nltk.word_tokenize(noPunctuationText)
+
+def filterStopwords(tokenisedText):
+  """
+  This method, given a list of tokens, will remove the stopwords from it.
+  
+  Parameters
+  ----------
+  tokenisedText: list
+    The tokens.
     
   Returns
   -------
   list
-    The list of stemmed words.
-  """
-  stemmedText = []
-  import string
-  noPunctuationText = text.translate(str.maketrans({a:None for a in string.punctuation})) # Strip punctuation
-  tokenisedText = nltk.word_tokenize(noPunctuationText)
-  # Strip any stopwords
-  from nltk.corpus import stopwords
-  stopWords = set(stopwords.words('english'))
-  unstoppedTokens = []
-  for word in tokenisedText:
-    if word not in stopWords and word.lower not in stopWords:
-      unstoppedTokens.append(word)
+    The list of tokens which are not stopwords.
+  """
+  with tracing.span("filterStopwords", len(tokenisedText)):
+    stopWords = workerResources.get("stopwords") # Loaded once per process, lower-cased
+    unstoppedTokens = []
+    for word in tokenisedText:
+      if word.lower() not in stopWords:
+        unstoppedTokens.append(word)
+  return unstoppedTokens
+
+def getStemmer(method):
+  """
+  This method, given the name of a stemming method, gives a function which stems a word with it.  The stemmers are created once per process (see workerResources.py).
   
+  Parameters
+  ----------
+  method: string
+    The method by which to stem (snowball, porter, lancaster, or wordnet for lemmatisation).
+    
+  Returns
+  -------
+  function
+    The stemming function, taking and returning a string.
+  """
   if method == "snowball": # stem using Snowball stemmer
-    from nltk.stem import SnowballStemmer
-    stemmer = SnowballStemmer("english")
+    return workerResources.get("snowball").stem
+  elif method == "lancaster": # stem using Lancaster stemmer
+    return workerResources.get("lancaster").stem
+  elif method == "wordnet": # lemmatise using WordNet
+    return workerResources.get("lemmatiser").lemmatize
   else: # stem using Porter stemmer
-    from nltk.stem import PorterStemmer
-    stemmer = PorterStemmer()
-  
-  for word in unstoppedTokens:
-    stemmedText.append(stemmer.stem(word))
+    return workerResources.get("porter").stem
 
-  return stemmedText
+def stemTypeCounts(typeCounts, method):
+  """
+  This method, given the counts of each distinct word in a text, builds the frequency distribution of their stems.
+  Only the distinct words are stemmed, and their counts are added up per stem, so the cost doesn't depend on the length of the text.
+  
+  Parameters
+  ----------
+  typeCounts: FreqDist
+    The count of each distinct word, in order of first appearance.
+  method: string
+    The method by which to stem.
+    
+  Returns
+  -------
+  EncodedFrequencies
+    The frequency distribution of the stems, the same as stemming every token and counting (see vocabularyEncoding.py).
+  """
+  with tracing.span("stem " + method, typeCounts.B()):
+    stems = memoCache.getCache().mapWords(method, getStemmer(method), list(typeCounts.keys()), list(typeCounts.values())) # Counted as the tokens they stand for, in the cache's statistics
+  with tracing.span("freqDist " + method, len(stems)):
+    return vocabularyEncoding.EncodedFrequencies.fromCounts(stems, list(typeCounts.values()))
 
 def buildFrequencyDistributionData(tokItems):
   """
@@ -72,73 +140,91 @@ def buildFrequencyDistributionData(tokItems):
     
   Returns
   -------
-  FreqDist
-    The frequency distribution plot.
+  EncodedFrequencies
+    The frequency distribution, counted over integer word ids (see vocabularyEncoding.py).  Call toFreqDist(n) for a FreqDist of the top n words.
   """
-  freq = nltk.FreqDist(tokItems) # Build the frequency data
+  freq = vocabularyEncoding.EncodedFrequencies.fromTokens(tokItems) # Build the frequency data
   return freq
 
 def pullText():
   """
-  This method uses urllib to pull the test data from Project Gutenberg's online repository.
+  This method loads the test data from the local corpus store (see corpusStore.py), rather than pulling it from Project Gutenberg's online repository on every run.
     
   Returns
   -------
   list
     A list of all of the data from Project Gutenberg in string format.  We load all this straight into memory to save the overhead of grabbing it later.
   """
-  kJV = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/10/10-0.txt', headers={'User-Agent': 'Mozilla/5.0'})) # get the text from the URL
-  worksOfShakespeare = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/100/100-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  theTimeMachine = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/35/35-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  lesMis = urllib.request.urlopen(urllib.request.Request(url='https://www.gutenberg.org/files/135/135-0.txt', headers={'User-Agent': 'Mozilla/5.0'}))
-  return [str(kJV.read().decode('utf8')), str(worksOfShakespeare.read().decode('utf8')), str(theTimeMachine.read().decode('utf8')), str(lesMis.read().decode('utf8'))]
+  return corpusStore.pullText(["kjv", "shakespeare", "timeMachine", "lesMiserables"])
   
-def runTests(sampleData):
+def runTests(sampleData, methods=stemmingMethods):
   """
-  This method times and runs the two tests: tokenisation and frequency distribution.
+  This method times and runs the tests: tokenisation and stopword filtering once, then stemming and frequency distribution for each stemming method.
+  Each stage's output is kept in the stage cache (see stageCache.py), so a rerun only redoes the stages whose text or settings have changed, and the stages they feed.
   
   Parameters
   ----------
-  sampleData: string
-    The test data to run the tests on.
-  """
-  import matplotlib.pyplot as plt
-  plt.ion()
-
-  startTime = time.time()
-  stemmedText = stemText(sampleData, "snowball")
-  print ("  Snowball Stemming time: \t", time.time() - startTime)
-  startTime = time.time()
-  freq = buildFrequencyDistributionData(stemmedText)
-  print ("  Frequency Distribution time: \t", time.time() - startTime)
-  print ("  Frequency distribution graph of the top 100 word stems:")
-  title = "Stem of: " + sampleData.split("\r")[0].split("Gutenberg eBook of ")[1]
-  freq.plot(100, cumulative=False, title=title) # Plot a frequency graph (first 100 words)
-  #freq.tabulate(100, cumulative=False, title=title)
-  
-  startTime = time.time()
-  stemmedText = stemText(sampleData, "porter")
-  print ("  Porter Stemming time: \t", time.time() - startTime)
-  startTime = time.time()
-  freq = buildFrequencyDistributionData(stemmedText)
-  print ("  Frequency Distribution time: \t", time.time() - startTime)
-  print ("  Frequency distribution graph of the top 100 word stems:")
-  freq.plot(100, cumulative=False) # Plot a frequency graph (first 100 words)
-  #freq.tabulate(100, cumulative=False, title=title)
-
-  plt.ioff()
-  plt.show()
+  sampleData: string or TextHandle
+    The test data to run the tests on, or where to find it in a SharedCorpus.
+  methods: list
+    The methods by which to stem.
+    
+  Returns
+  -------
+  tuple
+    The text's stem counts for each stemming method, packed for sending back from a worker (see frequencyMerge.py), and the plot of the top 100 stems for each method, to render (see plotRendering.py).
+  """
+  sampleData = sharedCorpus.resolve(sampleData)
+  partialCounts = {}
+  plots = []
+  book = sampleData.split("\r")[0].split("Gutenberg eBook of ")[1]
+
+  cache = stageCache.getCache()
+  text = cache.source(sampleData)
+  tokens = cache.stage("tokens", tokeniseParams, text, tokeniseText)
+  unstoppedTokens = cache.stage("filteredTokens", filterParams, tokens, filterStopwords)
+  typeCounts = cache.stage("typeCounts", {}, unstoppedTokens, nltk.FreqDist)
+  for method in methods:
+    startTime = time.time()
+    stems = cache.stage("stemCounts", {"method": method}, typeCounts, lambda counts, method=method: frequencyMerge.packCounts(stemTypeCounts(counts, method)))
+    partialCounts[method] = stems.value() # Tokenised, filtered and counted by the first method which needs them, if at all.
+    print ("  " + method.capitalize() + " Stemming and Frequency Distribution time: \t", time.time() - startTime)
+    memoCache.getCache().report(method.capitalize() + ", " + book)
+    title = method.capitalize() + " stem of: " + book
+    with tracing.span("plotData"):
+      plots.append(plotRendering.frequencyPlot(frequencyMerge.unpackCounts(partialCounts[method]), 100, title)) # Only the top 100 stems go back, to be drawn in the main process's renderer
+  cache.report(book)
+  with tracing.span("saveCache"):
+    memoCache.getCache().save()
+  return (partialCounts, plots)
 
 def main():
   """
   Entrypoint: gets the data then runs the tests.
   
-  This runs the tests across the whole CPU using the multiprocessing library.
+  This runs the tests across the whole CPU using the multiprocessing library, then merges the workers' counts into one distribution per stemming method for the whole corpus.
+  Each text's plots are rendered to files in the background as soon as its worker finishes (see plotRendering.py).
+  The texts are handed to the workers through shared memory, so only a handle to each is pickled (see sharedCorpus.py), largest first (see taskScheduler.py).
   """
-  sampleData = pullText()
+  corpus = sharedCorpus.SharedCorpus(pullText())
   print ("Running.  This may take a while: ")
-  with multiprocessing.Pool() as pool:
-    pool.map(runTests, sampleData)
+  renderer = plotRendering.PlotRenderer()
+  pool = workerResources.getPool(["punkt", "stopwords"] + stemmingMethods) # Shared by every stage, its workers preloaded
+  scheduler = taskScheduler.Scheduler(pool=pool, names=["punkt", "stopwords"] + stemmingMethods)
+  partialCounts = [None] * len(corpus)
+  with tracing.span("schedule runTests", len(corpus)), corpus: # Includes pickling the handles out and the counts back.
+    for index, (counts, plots) in scheduler.run(runTests, corpus.handles(), "stem"):
+      partialCounts[index] = counts
+      for plot in plots:
+        renderer.submit(plot)
+  scheduler.report()
+  with tracing.span("treeMerge"):
+    corpusFreqs = {method: frequencyMerge.treeMerge([counts[method] for counts in partialCounts], pool) for method in partialCounts[0]}
+  for method, corpusFreq in corpusFreqs.items():
+    print (method.capitalize() + " stems across the whole corpus: \t", corpusFreq.N(), "\tdistinct: \t", corpusFreq.B())
+    corpusFreq.tabulate(10, cumulative=False)
+  with tracing.span("renderPlots"): # Only what's left once the merging is done.
+    print ("Frequency distribution graphs of the top 100 word stems: " + ", ".join(renderer.close()))
 
 if __name__ == "__main__":
   main()
@@ -0,0 +1,252 @@
+"""
+streamingPipeline.py
+
+Tokenising texts and building their frequency distributions in bounded memory.
+
+Rather than loading a whole book, tokenising all of it, then counting, the text is read from disk a block at a time, cut into pieces at safe paragraph breaks (see textChunking.py), and each piece is tokenised and added to a running FreqDist before the next is read.
+No piece is longer than the largest piece size (four times the piece size by default), so memory use depends on that and the vocabulary, not on the size of the input.
+The counts are the same as tokenising the whole text at once, unless some stretch of the text had no safe break before the largest piece size: it is then cut at a fallback break, with a warning, and the tokens either side of each such cut can differ (see textChunking.py).  --check measures the difference, which is at most tokensPerFallbackCut counts per fallback cut.
+
+Usage:
+  python3 streamingPipeline.py [--chunk-size characters] [--max-chunk-size characters] [--check] source [source ...]
+
+--check also tokenises each source whole, and compares the counts.
+
+Each source is streamed in a fresh process of its own, so the peak memory reported for it is that source's alone, and doesn't include the whole-text tokenisation of --check.
+
+Each source is a path to a UTF-8 text file, or the name of a text in the corpus store.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import multiprocessing # A fresh process per source
+import os # Filesystem paths
+import resource # Process memory usage
+import sys # Command line arguments
+import time # time library
+import corpusStore # Offline corpus store
+import textChunking # Splitting texts into independently tokenisable pieces
+import wordTokenisers # Word tokenisation engines
+
+# How much of the file to read at a time, in characters.
+blockSize = 64 * 1024
+
+# The most the counts may differ from tokenising the whole text by, summed over every word, for each fallback cut (see textChunking.findFallbackBreak).
+tokensPerFallbackCut = 4
+
+def openSource(source):
+  """
+  This method opens a text for incremental reading, from a file if one exists at that path, or else from the corpus store.
+
+  Parameters
+  ----------
+  source: string
+    A file path, or the name of a text in the corpus store.
+
+  Returns
+  -------
+  file
+    A text-mode file object.  The caller closes it.
+  """
+  if os.path.exists(source):
+    return open(source, "r", encoding="utf-8-sig", newline="")
+  return corpusStore.openText(source)
+
+def readBlocks(fileObject, size=blockSize):
+  """
+  This method reads a file a block at a time.
+
+  Parameters
+  ----------
+  fileObject: file
+    The text-mode file to read.
+  size: int
+    The size of each block, in characters.
+
+  Yields
+  ------
+  string
+    The blocks of text, in order.
+  """
+  block = fileObject.read(size)
+  while block:
+    yield block
+    block = fileObject.read(size)
+
+def streamTokens(blocks, chunkSize=textChunking.defaultChunkSize, maxChunkSize=None, chunker=None):
+  """
+  This method tokenises a text which arrives a block at a time, one piece at a time.
+
+  Parameters
+  ----------
+  blocks: iterable
+    The text, as consecutive strings.
+  chunkSize: int
+    The size, in characters, of each piece of text to tokenise.
+  maxChunkSize: int
+    The largest size of each piece (see textChunking.StreamChunker).
+  chunker: StreamChunker
+    The chunker to cut the text with, e.g. to count its fallback cuts afterwards.  A new one, with chunkSize and maxChunkSize, if None.
+
+  Yields
+  ------
+  list
+    The tokenised words of each piece, in order.
+  """
+  chunker = chunker or textChunking.StreamChunker(chunkSize, maxChunkSize)
+  for block in blocks:
+    for chunk in chunker.feed(block):
+      yield wordTokenisers.tokeniseText(chunk)
+  for chunk in chunker.finish():
+    yield wordTokenisers.tokeniseText(chunk)
+
+def streamFrequencyDistributionData(blocks, chunkSize=textChunking.defaultChunkSize, maxChunkSize=None, chunker=None):
+  """
+  This method, given a text which arrives a block at a time, builds its frequency distribution incrementally.
+
+  Parameters
+  ----------
+  blocks: iterable
+    The text, as consecutive strings.
+  chunkSize: int
+    The size, in characters, of each piece of text to tokenise.
+  maxChunkSize: int
+    The largest size of each piece (see textChunking.StreamChunker).
+  chunker: StreamChunker
+    The chunker to cut the text with.  A new one if None.
+
+  Returns
+  -------
+  FreqDist
+    The frequency distribution of the whole text.
+  """
+  from nltk import FreqDist # Natural Language Processing Toolkit
+  freq = FreqDist()
+  for tokItems in streamTokens(blocks, chunkSize, maxChunkSize, chunker):
+    freq.update(tokItems) # Only this piece's tokens are in memory at once.
+  return freq
+
+def peakMemory():
+  """
+  This method gets the peak resident memory of this process so far.  It covers everything the process has done, so to measure one text, stream it in a process of its own (see streamSource).
+
+  Returns
+  -------
+  float
+    The peak resident set size, in megabytes.
+  """
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == "darwin": # macOS reports bytes, Linux reports kilobytes.
+    return peak / (1024 * 1024)
+  return peak / 1024
+
+def verifyParity(source, freq, fallbackCuts):
+  """
+  This method checks a text's streamed counts against tokenising the whole text at once.
+
+  Parameters
+  ----------
+  source: string
+    A file path, or the name of a text in the corpus store.
+  freq: FreqDist
+    Its streamed counts.
+  fallbackCuts: int
+    How many times the stream was cut at a fallback break.
+
+  Returns
+  -------
+  boolean
+    True if the counts are within tokensPerFallbackCut of the whole text's for each fallback cut (so exactly the same if there were none).
+  """
+  from nltk import FreqDist # Natural Language Processing Toolkit
+  with openSource(source) as fileObject:
+    expected = FreqDist(wordTokenisers.tokeniseText(fileObject.read()))
+  difference = sum(abs(freq[word] - expected[word]) for word in set(freq) | set(expected))
+  print ("  Fallback cuts: \t", fallbackCuts, "\tCounts differing from the whole text by: \t", difference, "\tallowed: \t", fallbackCuts * tokensPerFallbackCut)
+  return difference <= fallbackCuts * tokensPerFallbackCut
+
+def streamSource(source, chunkSize, maxChunkSize):
+  """
+  This method, run in a fresh process, streams one text through the pipeline and measures it.
+
+  Parameters
+  ----------
+  source: string
+    A file path, or the name of a text in the corpus store.
+  chunkSize: int
+    The size, in characters, of each piece of text to tokenise.
+  maxChunkSize: int
+    The largest size of each piece (see textChunking.StreamChunker).
+
+  Returns
+  -------
+  tuple
+    The text's FreqDist, how many fallback cuts were made, the time taken, and the process's peak memory in megabytes.
+  """
+  chunker = textChunking.StreamChunker(chunkSize, maxChunkSize)
+  startTime = time.time()
+  with openSource(source) as fileObject:
+    freq = streamFrequencyDistributionData(readBlocks(fileObject), chunker=chunker)
+  return (freq, chunker.fallbackCuts, time.time() - startTime, peakMemory())
+
+def runTests(source, chunkSize=textChunking.defaultChunkSize, maxChunkSize=None, check=False):
+  """
+  This method times and runs the streaming tokenisation and frequency distribution of one text.
+
+  Parameters
+  ----------
+  source: string
+    A file path, or the name of a text in the corpus store.
+  chunkSize: int
+    The size, in characters, of each piece of text to tokenise.
+  maxChunkSize: int
+    The largest size of each piece (see textChunking.StreamChunker).
+  check: boolean
+    Whether to check the counts against tokenising the whole text (see verifyParity).
+
+  Returns
+  -------
+  boolean
+    False if the check was made and failed.
+  """
+  with multiprocessing.Pool(1) as pool: # A fresh process, so its peak memory is this text's alone.
+    freq, fallbackCuts, seconds, peak = pool.apply(streamSource, (source, chunkSize, maxChunkSize))
+  print ("  Streaming tokenisation and frequency distribution time: \t", seconds)
+  print ("  Tokens: \t", freq.N(), "\tDistinct: \t", freq.B())
+  print ("  Peak memory of its process (MB): \t", peak)
+  return verifyParity(source, freq, fallbackCuts) if check else True
+
+def main():
+  """
+  Entrypoint: streams each source given on the command line through the pipeline, one after another.
+  """
+  arguments = sys.argv[1:]
+  chunkSize = textChunking.defaultChunkSize
+  maxChunkSize = None
+  check = False
+  while arguments[:1] in (["--chunk-size"], ["--max-chunk-size"], ["--check"]):
+    if arguments[0] == "--check":
+      check = True
+      arguments = arguments[1:]
+      continue
+    if arguments[0] == "--chunk-size":
+      chunkSize = int(arguments[1])
+    else:
+      maxChunkSize = int(arguments[1])
+    arguments = arguments[2:]
+  if not arguments:
+    print(__doc__)
+    return
+  allMatched = True
+  for source in arguments:
+    print ("Streaming " + source + ": ")
+    allMatched = runTests(source, chunkSize, maxChunkSize, check) and allMatched
+  if check:
+    print ("All counts within tolerance." if allMatched else "Counts differ!")
+    sys.exit(0 if allMatched else 1)
+
+if __name__ == "__main__":
+  main()
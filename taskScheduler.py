@@ -0,0 +1,459 @@
+"""
+taskScheduler.py
+
+Scheduling a run's tasks across workers so the run finishes as early as it can, and reporting how busy each worker was.
+
+pool.map hands tasks out in the order they are given, in chunks, and gives nothing back until every one has finished.  If the biggest book comes last, one worker starts it as the others run out of work, and the whole run waits on it.  A Scheduler instead:
+  - estimates each task's cost, from the size of its text and how expensive its stage is per character,
+  - submits the most expensive first (the longest-processing-time rule, which, if the estimates are right, keeps the makespan within 4/3 of the best possible),
+  - gives back each result as soon as it finishes, in whatever order, with the task's index, and
+  - keeps only a few tasks more than there are workers submitted at once, so a caller slow to take the results holds back the work rather than piling results up.
+The cost per character of each stage starts at a rough guess, and is corrected from the tasks of that stage as they finish.
+
+The same Scheduler runs tasks in this process one at a time (serial), in a pool of threads (thread), or in the shared pool of processes (process, the default).  The backend can be chosen with the NATLANG_SCHEDULER environment variable.
+
+Usage:
+  scheduler = taskScheduler.Scheduler()
+  for index, result in scheduler.run(task, texts, "stem"):
+    results[index] = result
+  scheduler.report()
+
+  python3 taskScheduler.py [--processes n] [source ...]
+    Compare the makespan and worker utilisation of pool.map with each backend of the scheduler: on simulated tasks whose cost is known, then on tokenising each source.
+
+Each source is a path to a UTF-8 text file, or the name of a text in the corpus store (the four sample books by default).
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import multiprocessing # Pools, for comparison
+import multiprocessing.pool # The thread backend
+import os # Filesystem paths and environment
+import queue # Results coming back from the pool
+import random # Simulated workloads
+import sys # Command line arguments
+import threading # Naming the worker which ran a task
+import time # time library
+import sharedCorpus # Texts handed over as handles
+import workerResources # The shared pool
+
+# The backends, and the one used when none is given.
+backends = ["serial", "thread", "process"]
+defaultBackend = os.environ.get("NATLANG_SCHEDULER", "process")
+
+# Rough seconds per character of each stage's task on one core, until some of its tasks have been timed.
+stageCosts = {
+  "tokenise": 1e-6,
+  "stem": 4e-6,
+  "lemmatise": 3e-6,
+  "tag": 1e-5,
+  "similarWords": 2e-6
+}
+
+# The cost per character of a stage with no estimate.
+defaultStageCost = 1e-6
+
+# How much each timed task moves its stage's estimate.
+costSmoothing = 0.5
+
+# Seconds per unit of size of simulatedTask.
+simulatedSecondsPerUnit = 1e-3
+
+def itemSize(item):
+  """
+  This method gives the size of a task's argument, for estimating its cost.
+
+  Parameters
+  ----------
+  item: object
+    A text, a TextHandle, bytes, or a list of them.  A number is taken as its own size.
+
+  Returns
+  -------
+  int
+    Its size, in characters (or bytes, for a TextHandle).  1 for anything else.
+  """
+  if isinstance(item, sharedCorpus.TextHandle):
+    return item.end - item.start
+  if isinstance(item, (str, bytes)):
+    return len(item)
+  if isinstance(item, (int, float)):
+    return item
+  if isinstance(item, (list, tuple)):
+    return sum(itemSize(part) for part in item)
+  return 1
+
+def workerName():
+  """
+  This method names the worker it runs in: its process, and its thread if it isn't the main one.
+
+  Returns
+  -------
+  string
+    The name.
+  """
+  thread = threading.current_thread()
+  return str(os.getpid()) + ("" if thread is threading.main_thread() else "/" + thread.name)
+
+def timedCall(job):
+  """
+  This method runs a task, in a worker, and times it.
+
+  Parameters
+  ----------
+  job: tuple
+    The task, and its argument.
+
+  Returns
+  -------
+  tuple
+    What the task returned, the worker's name, and when it started and finished (by the wall clock, so the times from different processes agree).
+  """
+  task, argument = job
+  start = time.time()
+  result = task(argument)
+  return result, workerName(), start, time.time()
+
+def summariseRun(timings, makespan, workers):
+  """
+  This method works out how busy each worker was over a run.
+
+  Parameters
+  ----------
+  timings: list
+    The worker's name, start and finish of each task.
+  makespan: float
+    The seconds from the first task being submitted to the last result coming back.
+  workers: int
+    How many workers there were.  Those which ran nothing count as idle.
+
+  Returns
+  -------
+  dict
+    The makespan, the number of tasks, each worker's busy seconds and utilisation (busy / makespan), and the mean utilisation of all the workers.
+  """
+  busy = {}
+  for worker, start, end in timings:
+    busy[worker] = busy.get(worker, 0.0) + end - start
+  return {
+    "makespan": makespan,
+    "tasks": len(timings),
+    "busy": busy,
+    "utilisation": {worker: seconds / makespan if makespan > 0 else 0.0 for worker, seconds in busy.items()},
+    "meanUtilisation": sum(busy.values()) / (max(workers, len(busy)) * makespan) if makespan > 0 else 0.0
+  }
+
+def printReport(stats, title="Scheduled"):
+  """
+  This method prints the makespan and utilisation of a run.
+
+  Parameters
+  ----------
+  stats: dict
+    The run, as summariseRun gives it.
+  title: string
+    What to call the run.
+  """
+  print ("  " + title + ": \tmakespan: \t", stats["makespan"], "\ttasks: \t", stats["tasks"], "\tmean worker utilisation: \t", format(stats["meanUtilisation"], ".1%"))
+  for worker, utilisation in sorted(stats["utilisation"].items()):
+    print ("    worker " + worker + ": \tbusy: \t", stats["busy"][worker], "\tutilisation: \t", format(utilisation, ".1%"))
+
+class Scheduler:
+  '''
+  Scheduler
+
+  Runs tasks largest first on one of the backends, giving back each result as it finishes, and keeps the timings of the last run.
+  '''
+
+  def __init__(self, backend=None, workers=None, pool=None, names=None, maxPending=None):
+    '''
+    Constructor for a scheduler.
+
+    Parameters
+    ----------
+    backend: string
+      serial, thread or process.  defaultBackend if None.
+    workers: int
+      The number of threads or processes.  One per CPU if None.
+    pool: multiprocessing.Pool
+      The pool the process backend uses.  The shared pool if None.
+    names: list
+      The resources each worker should preload (see workerResources.py).
+    maxPending: int
+      The most tasks submitted and not yet taken at once.  Twice the number of workers if None.
+    '''
+    self.backend = backend or defaultBackend
+    if self.backend not in backends:
+      raise ValueError("Unknown scheduler backend \"" + self.backend + "\": use one of " + ", ".join(backends))
+    self.workers = 1 if self.backend == "serial" else workers or os.cpu_count()
+    self.pool = None
+    self.ownsPool = False
+    if self.backend == "process":
+      self.pool = pool or workerResources.getPool(names, workers)
+    elif self.backend == "thread":
+      self.pool = multiprocessing.pool.ThreadPool(self.workers, initializer=workerResources.initialiseWorker, initargs=(names or [],))
+      self.ownsPool = True
+    self.maxPending = maxPending or 2 * self.workers
+    self.costs = dict(stageCosts)
+    self.timings = []
+    self.startTime = None
+    self.finishTime = None
+
+  def estimateCost(self, item, stage):
+    '''
+    Estimates how long a task will take.
+
+    Parameters
+    ----------
+    item: object
+      The task's argument.
+    stage: string
+      The stage the task belongs to.
+
+    Returns
+    -------
+    float
+      The estimate, in seconds.
+    '''
+    return itemSize(item) * self.costs.get(stage, defaultStageCost)
+
+  def record(self, item, stage, worker, start, end):
+    '''
+    Keeps a finished task's timing, and corrects its stage's cost per character.
+    '''
+    self.timings.append((worker, start, end))
+    self.finishTime = time.time()
+    size = itemSize(item)
+    if size > 0:
+      estimate = self.costs.get(stage, defaultStageCost)
+      self.costs[stage] = estimate + costSmoothing * ((end - start) / size - estimate)
+
+  def run(self, task, items, stage=None):
+    '''
+    Runs a task on each of a list of items.
+
+    Parameters
+    ----------
+    task: function
+      The task, which takes one argument.  For the process backend, it must be picklable, i.e. defined at the top level of a module.
+    items: list
+      The arguments.
+    stage: string
+      The stage the tasks belong to, for estimating their costs.
+
+    Yields
+    ------
+    tuple
+      The index of the item, and what the task returned for it, in the order they finish.
+    '''
+    return self.runJobs([(task, item, stage) for item in items])
+
+  def runJobs(self, jobs):
+    '''
+    Runs a list of tasks, which may belong to different stages.
+
+    Parameters
+    ----------
+    jobs: list
+      The task, argument and stage of each.
+
+    Yields
+    ------
+    tuple
+      The index of the job, and what its task returned, in the order they finish.  A task which raises raises here.
+    '''
+    order = sorted(range(len(jobs)), key=lambda index: self.estimateCost(jobs[index][1], jobs[index][2]), reverse=True)
+    self.timings = []
+    self.startTime = time.time()
+    self.finishTime = self.startTime
+    if self.pool is None:
+      for index in order:
+        task, argument, stage = jobs[index]
+        result, worker, start, end = timedCall((task, argument))
+        self.record(argument, stage, worker, start, end)
+        yield index, result
+      return
+    finished = queue.Queue()
+    pending = 0
+    position = 0
+    while position < len(order) or pending:
+      while position < len(order) and pending < self.maxPending:
+        index = order[position]
+        task, argument, stage = jobs[index]
+        self.pool.apply_async(timedCall, ((task, argument),), callback=lambda outcome, index=index: finished.put((index, outcome, None)), error_callback=lambda error, index=index: finished.put((index, None, error)))
+        position += 1
+        pending += 1
+      index, outcome, error = finished.get()
+      pending -= 1
+      if error is not None:
+        raise error
+      result, worker, start, end = outcome
+      self.record(jobs[index][1], jobs[index][2], worker, start, end)
+      yield index, result
+
+  def stats(self):
+    '''
+    The makespan and utilisation of the last run, so far.
+
+    Returns
+    -------
+    dict
+      As summariseRun gives it.
+    '''
+    return summariseRun(self.timings, (self.finishTime or 0.0) - (self.startTime or 0.0), self.workers)
+
+  def report(self, title=None):
+    '''
+    Prints the makespan and utilisation of the last run.
+
+    Parameters
+    ----------
+    title: string
+      What to call the run.  The backend if None.
+    '''
+    printReport(self.stats(), title or "Scheduled (" + self.backend + ")")
+
+  def close(self):
+    '''
+    Stops the thread backend's threads.  The shared pool is left for the rest of the run.
+    '''
+    if self.ownsPool:
+      self.pool.close()
+      self.pool.join()
+      self.pool = None
+      self.ownsPool = False
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception):
+    self.close()
+    return False
+
+def mapRun(task, items, pool, workers):
+  """
+  This method runs a task on each item with pool.map, as the scripts used to, and times it.
+
+  Parameters
+  ----------
+  task: function
+    The task.
+  items: list
+    The arguments, in the order given.
+  pool: multiprocessing.Pool
+    The pool.
+  workers: int
+    The number of processes in it.
+
+  Returns
+  -------
+  dict
+    As summariseRun gives it.
+  """
+  startTime = time.time()
+  outcomes = pool.map(timedCall, [(task, item) for item in items])
+  return summariseRun([(worker, start, end) for result, worker, start, end in outcomes], time.time() - startTime, workers)
+
+def simulatedTask(size):
+  """
+  This method stands in for a task whose cost is exactly proportional to its size.  It sleeps rather than computes, so its cost is the same however many tasks share the CPUs.
+
+  Parameters
+  ----------
+  size: int
+    The size of its text.
+
+  Returns
+  -------
+  int
+    The size.
+  """
+  time.sleep(size * simulatedSecondsPerUnit)
+  return size
+
+def simulatedWorkload(count=32, seed=1):
+  """
+  This method makes the sizes of a set of documents, mostly small with a long tail, and one much larger one last.
+
+  Parameters
+  ----------
+  count: int
+    How many documents.
+  seed: int
+    The seed, so every run gets the same sizes.
+
+  Returns
+  -------
+  list
+    The sizes.
+  """
+  generator = random.Random(seed)
+  sizes = [max(1, int(generator.lognormvariate(3, 1))) for i in range(count)]
+  sizes.remove(max(sizes))
+  return sizes + [max(sizes) * 4]
+
+def compareRuns(task, items, stage, workers):
+  """
+  This method runs a task on each item with pool.map and with each backend of the scheduler, and prints the makespan and utilisation of each.
+
+  Parameters
+  ----------
+  task: function
+    The task.  It must be picklable.
+  items: list
+    The arguments, in the order pool.map is given them.
+  stage: string
+    The stage, for the scheduler's estimates.
+  workers: int
+    The number of threads or processes.
+
+  Returns
+  -------
+  dict
+    The stats of each run, by name.
+  """
+  results = {}
+  with multiprocessing.Pool(workers) as pool:
+    results["pool.map"] = mapRun(task, items, pool, workers)
+    scheduler = Scheduler("process", workers, pool)
+    for index, result in scheduler.run(task, items, stage):
+      pass
+    results["Scheduler (process)"] = scheduler.stats()
+  for backend in ["thread", "serial"]:
+    with Scheduler(backend, workers) as scheduler:
+      for index, result in scheduler.run(task, items, stage):
+        pass
+      results["Scheduler (" + backend + ")"] = scheduler.stats()
+  for name, stats in results.items():
+    printReport(stats, name)
+  return results
+
+def main():
+  """
+  Entrypoint: compares pool.map with the scheduler, on simulated tasks then on tokenising the sources given on the command line, or the sample books.
+  """
+  import asyncIngest # The tokenising task
+  import corpusStore # Offline corpus store
+  arguments = sys.argv[1:]
+  workers = os.cpu_count()
+  if arguments[:1] == ["--processes"]:
+    workers = int(arguments[1])
+    arguments = arguments[2:]
+  sizes = simulatedWorkload()
+  print ("Simulated: " + str(len(sizes)) + " tasks, " + str(sum(sizes) * simulatedSecondsPerUnit) + " seconds of work, the largest (" + str(max(sizes) * simulatedSecondsPerUnit) + " seconds) last, " + str(workers) + " workers: ")
+  compareRuns(simulatedTask, sizes, "simulated", workers)
+  texts = []
+  for source in (arguments or ["kjv", "shakespeare", "timeMachine", "lesMiserables"]):
+    if os.path.exists(source):
+      with open(source, "r", encoding="utf-8-sig", newline="") as file:
+        texts.append(file.read())
+    else:
+      texts.append(corpusStore.loadText(source))
+  print ("Tokenising: " + str(len(texts)) + " texts, " + str(sum(len(text) for text in texts)) + " characters, " + str(workers) + " workers: ")
+  compareRuns(asyncIngest.countTokens, texts, "tokenise", workers)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,95 @@
+"""
+test_wordTokenisers.py
+
+Checking the fast word tokenisation engine gives exactly the same tokens as the nltk engine, on the sample texts in the corpus store and on the cases the fast engine handles specially.
+
+Usage:
+  python3 -m pytest test_wordTokenisers.py
+
+The sample texts are skipped if they aren't in the corpus store (see corpusStore.py), and everything is skipped if NLTK's Punkt data isn't installed.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import pytest # Test runner
+import corpusStore # Offline corpus store
+import wordTokenisers # Word tokenisation engines
+
+# The texts in the corpus store the scripts use.
+sampleTexts = ["kjv", "shakespeare", "timeMachine", "islandOfDoctorMoreau", "lesMiserables"]
+
+# Texts which go through the fast engine's special cases.
+edgeCases = {
+  "capital sigma": "ΟΔΥΣΣΕΥΣ came home. Σ is a letter, and ΣΊΣΥΦΟΣ pushed his stone up the hill.",
+  "final capital sigma": "The sea was named after ΘΑΛΑΣΣΑΣ.",
+  "double quotes": "\"Stop!\" he cried. \"Don't,\" she said, \"it's mine.\"",
+  "single quotes": "He said 'hello' and left. 'Why?' she asked.",
+  "closing single quote before a line break": "He said 'hello'\nand left.  She said 'goodbye'\tand stayed.",
+  "closing quote after the final full stop": "He left.\" Then she left.' And they left.)",
+  "closing quotes apart from the final full stop": "He left. \" She stayed. ' )",
+  "ellipsis": "Wait... what? He trailed off ... and then...",
+  "ellipsis at the end": "And so it ends...",
+  "abbreviations": "Mr. Smith went to the U.S.A. in 1900. He met Dr. Jones, etc. and more.",
+  "full stop inside a word": "See www.example.com and e.g. the file.txt too.",
+  "whitespace before the final word": "It was the end of the line   .\n\nA new\tline  ,  then another .",
+  "empty": "",
+  "whitespace only": " \n\t "
+}
+
+@pytest.fixture(scope="module", autouse=True)
+def punkt():
+  """
+  This method skips the tests if NLTK's sentence splitter can't load its data.
+  """
+  try:
+    wordTokenisers.nltkTokeniseText("A sentence.")
+  except LookupError:
+    pytest.skip("NLTK's Punkt data isn't installed.")
+
+@pytest.mark.parametrize("name", sampleTexts)
+def testSampleTextParity(name):
+  """
+  This method checks the engines match on a sample text from the corpus store.
+
+  Parameters
+  ----------
+  name: string
+    The name of the text.
+  """
+  try:
+    text = corpusStore.loadText(name)
+  except FileNotFoundError:
+    pytest.skip("\"" + name + "\" is not in the corpus store.")
+  assert wordTokenisers.verifyParity(text)
+
+@pytest.mark.parametrize("name", list(edgeCases))
+def testEdgeCaseParity(name):
+  """
+  This method checks the engines match on a text which goes through one of the fast engine's special cases, on its own and repeated, so the second time round every word comes from the fast engine's tables.
+
+  Parameters
+  ----------
+  name: string
+    The name of the case.
+  """
+  text = edgeCases[name]
+  expectedTokens = wordTokenisers.nltkTokeniseText(text)
+  assert wordTokenisers.fastTokeniseText(text) == expectedTokens
+  assert wordTokenisers.fastTokeniseText(text) == expectedTokens
+  assert wordTokenisers.fastTokeniseText(text + "\n" + text) == wordTokenisers.nltkTokeniseText(text + "\n" + text)
+
+def testEdgeCasesTogether():
+  """
+  This method checks the engines match on all the special cases run together as one text.
+  """
+  assert wordTokenisers.verifyParity("\n\n".join(edgeCases.values()))
+
+def testSigmaLowerCasing():
+  """
+  This method checks a capital sigma is lower-cased one character at a time, as the nltk engine does, rather than to a final sigma.
+  """
+  assert wordTokenisers.stripToken("ΟΔΥΣΣΕΥΣ") == "οδυσσευσ"
+  assert wordTokenisers.stripToken("Σ.") == "σ"
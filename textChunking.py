@@ -0,0 +1,298 @@
+"""
+textChunking.py
+
+Splitting a large text into pieces which can be tokenised separately, such that the concatenation of each piece's tokens is identical to tokenising the whole text at once.
+
+NLTK's word_tokenize splits the text into sentences with Punkt, then tokenises each sentence with its Treebank-style tokeniser.  Cutting the text at an arbitrary point would change both.  We only cut at a paragraph break (a blank line), and only where the paragraph before it does not end in a full stop:
+  - Punkt only ever ends a sentence after '.', '?' or '!', so nothing else is moved across the cut.
+  - The Treebank tokeniser only treats the end of a sentence differently for a final full stop ("etc." mid-sentence is one token, at the end it is two).  Quote direction at the start of a sentence also changes, but quotes are punctuation, which the scripts strip anyway.
+
+A text whose paragraphs all end in full stops has no safe break at all.  iterateChunks then gives it back in one piece, which is fine for a text already in memory.  A streamed text (iterateStreamChunks, StreamChunker) would have to be held whole instead, so once a piece reaches maxChunkSize characters without a safe break it is cut at a fallback break (see findFallbackBreak), with a warning.  The tokens either side of a fallback cut can differ from tokenising the whole text: usually not at all at a paragraph break, and by a token or two at a line break or a space.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import re # Regular expressions
+import warnings # Warning of fallback cuts
+
+# The default size, in characters, of a piece of text.  A cut is made at the first safe paragraph break after this many characters.
+defaultChunkSize = 256 * 1024
+
+# The default largest size, in characters, of a piece of a streamed text, as a multiple of the chunk size.  A piece with no safe break by then is cut at a fallback break.
+maxChunkSizeFactor = 4
+
+# A blank line between two paragraphs.  Gutenberg texts use Windows line endings.
+paragraphBreak = re.compile(r"\r?\n[ \t]*\r?\n")
+
+# Where a piece with no safe break is cut instead, best first: a paragraph break, a line break, then any whitespace.
+fallbackBreaks = [paragraphBreak, re.compile(r"\r?\n"), re.compile(r"\s")]
+
+# Closing brackets and quotes which may follow a sentence's final full stop.
+closingCharacters = "\"')]}>»”’ \t\r\n"
+
+# How far back from a paragraph break isSafeBoundary looks for the end of the paragraph.
+boundaryContext = 256
+
+# How far back from the end of a streamed text a paragraph break may start and still be completed by the next block.
+breakOverlap = 64
+
+# Blocks shorter than this, in characters, are added to the one before, so a text streamed in tiny blocks isn't searched through hundreds of them.
+smallBlock = 4096
+
+def isSafeBoundary(text, position):
+  """
+  This method checks whether the text can be cut at a paragraph break without changing its tokens.
+
+  Parameters
+  ----------
+  text: string
+    The whole text.
+  position: int
+    Where the paragraph break starts.
+
+  Returns
+  -------
+  boolean
+    True if the paragraph before the break does not end in a full stop.
+  """
+  paragraphEnd = text[max(0, position - boundaryContext):position].rstrip(closingCharacters)
+  return paragraphEnd != "" and not paragraphEnd.endswith(".")
+
+def findSafeBreak(text, searchFrom):
+  """
+  This method finds the first safe paragraph break at or after a position.
+
+  Parameters
+  ----------
+  text: string
+    The text to search.
+  searchFrom: int
+    Where to start searching.
+
+  Returns
+  -------
+  re.Match
+    The paragraph break, or None if there is no safe break after searchFrom.
+  """
+  match = paragraphBreak.search(text, searchFrom)
+  while match is not None and not isSafeBoundary(text, match.start()):
+    match = paragraphBreak.search(text, match.end())
+  return match
+
+def findFallbackBreak(text, searchFrom, limit):
+  """
+  This method finds where to cut a text which has no safe break before a limit: at the first paragraph break after searchFrom, or failing that the first line break, or the first whitespace, or else at the limit.
+  Punkt almost always ends a sentence at a paragraph break, so a cut there rarely changes any tokens (only e.g. after an abbreviation which Punkt runs on into the next paragraph).  A cut at a line break or a space can fall inside a sentence, and change how the words either side of it are tokenised; a cut at the limit can split a word in two.
+
+  Parameters
+  ----------
+  text: string
+    The text to search.
+  searchFrom: int
+    Where to start searching.
+  limit: int
+    Where the cut must be made by.
+
+  Returns
+  -------
+  int
+    Where to cut.
+  """
+  for pattern in fallbackBreaks:
+    match = pattern.search(text, searchFrom, limit)
+    if match is not None:
+      return match.end()
+  return limit
+
+def iterateChunks(text, chunkSize=defaultChunkSize):
+  """
+  This method, given a text, yields it in pieces of roughly chunkSize characters, cut only at safe paragraph breaks.
+
+  Parameters
+  ----------
+  text: string
+    The text to split.
+  chunkSize: int
+    The minimum size of each piece, other than the last.  A piece is larger if there is no safe break nearby.
+
+  Yields
+  ------
+  string
+    The pieces of the text, in order.  Joined together, they give back the original text.
+  """
+  start = 0
+  while start < len(text):
+    match = findSafeBreak(text, start + chunkSize)
+    cut = match.end() if match is not None else len(text)
+    yield text[start:cut]
+    start = cut
+
+class StreamChunker:
+  '''
+  StreamChunker
+
+  Cuts a text which arrives a block at a time into pieces, under the same rules as iterateChunks, as the blocks are pushed in.  For callers which are handed blocks (e.g. by a network read) rather than pulling them from an iterable.
+  No piece is longer than maxChunkSize characters, so only that much of the text is held at once: a piece with no safe break by then is cut at a fallback break (see findFallbackBreak).
+  '''
+
+  def __init__(self, chunkSize=defaultChunkSize, maxChunkSize=None):
+    '''
+    Constructor for a chunker.
+
+    Parameters
+    ----------
+    chunkSize: int
+      The minimum size of each piece, other than the last.
+    maxChunkSize: int
+      The largest size of each piece.  maxChunkSizeFactor times chunkSize if None.
+    '''
+    self.chunkSize = chunkSize
+    self.maxChunkSize = maxChunkSize or maxChunkSizeFactor * chunkSize
+    self.blocks = [] # The text not yet given out as a piece, joined only when a piece is.
+    self.length = 0 # How long it is.
+    self.searchFrom = chunkSize
+    self.fallbackCuts = 0 # How many pieces had no safe break, and may have changed a few tokens.
+
+  def feed(self, block):
+    '''
+    Adds the next block of the text.
+
+    Parameters
+    ----------
+    block: string
+      The block, of any size.
+
+    Returns
+    -------
+    list
+      The pieces completed by this block, in order.  Often none.
+    '''
+    pieces = []
+    if self.blocks and len(self.blocks[-1]) < smallBlock:
+      self.blocks[-1] += block # Copies at most smallBlock characters.
+    else:
+      self.blocks.append(block)
+    self.length += len(block)
+    while self.length > self.searchFrom:
+      windowStart = max(0, self.searchFrom - boundaryContext) # Only the text not yet searched, and what isSafeBoundary needs before it.
+      match = findSafeBreak(self.tail(windowStart), self.searchFrom - windowStart)
+      if match is not None and windowStart + match.end() <= self.maxChunkSize:
+        if windowStart + match.end() == self.length:
+          self.searchFrom = windowStart + match.start() # The break may carry on into the next block.
+          break
+        text = "".join(self.blocks)
+        cut = searched = windowStart + match.end()
+      elif self.length >= self.maxChunkSize:
+        text = "".join(self.blocks)
+        cut = self.fallbackCut(text)
+        searched = windowStart + match.start() if match is not None else self.length - breakOverlap # No safe break before here, so none to look for again in what is left.
+      else:
+        self.searchFrom = max(self.chunkSize, self.length - breakOverlap) # Only the end of the text could still turn into a break.
+        break
+      pieces.append(text[:cut])
+      rest = text[cut:]
+      self.blocks = [rest] if rest else []
+      self.length = len(rest)
+      self.searchFrom = max(self.chunkSize, searched - cut)
+    return pieces
+
+  def tail(self, start):
+    '''
+    Gets the end of the text not yet given out, joining only the blocks it is in.
+
+    Parameters
+    ----------
+    start: int
+      Where the end starts.
+
+    Returns
+    -------
+    string
+      The text from start on.
+    '''
+    parts = []
+    position = self.length
+    for block in reversed(self.blocks):
+      if position <= start:
+        break
+      parts.append(block)
+      position -= len(block)
+    return "".join(reversed(parts))[start - position:]
+
+  def fallbackCut(self, text):
+    '''
+    Finds where to cut a piece which has reached maxChunkSize characters without a safe break, warning the first time.
+
+    Parameters
+    ----------
+    text: string
+      The text not yet given out.
+
+    Returns
+    -------
+    int
+      Where to cut it.
+    '''
+    if not self.fallbackCuts:
+      warnings.warn("No safe break in " + str(self.maxChunkSize) + " characters of text; cutting it at a fallback break, which may change a few of its tokens (see textChunking.py).", RuntimeWarning, stacklevel=3)
+    self.fallbackCuts += 1
+    return findFallbackBreak(text, self.chunkSize, self.maxChunkSize)
+
+  def finish(self):
+    '''
+    Ends the text.
+
+    Returns
+    -------
+    list
+      The last piece, if any of the text is left.
+    '''
+    text = "".join(self.blocks)
+    pieces = [text] if text else []
+    self.blocks = []
+    self.length = 0
+    return pieces
+
+def iterateStreamChunks(blocks, chunkSize=defaultChunkSize, maxChunkSize=None):
+  """
+  This method does the same as iterateChunks, but for a text which arrives a block at a time (e.g. read from a file or the network), so the whole text never has to be in memory.
+
+  Parameters
+  ----------
+  blocks: iterable
+    The text, as consecutive strings of any size.
+  chunkSize: int
+    The minimum size of each piece, other than the last.
+  maxChunkSize: int
+    The largest size of each piece.  maxChunkSizeFactor times chunkSize if None.
+
+  Yields
+  ------
+  string
+    The pieces of the text, in order, cut under the same rules as iterateChunks, except that a piece with no safe break in maxChunkSize characters is cut at a fallback break (see StreamChunker).
+  """
+  chunker = StreamChunker(chunkSize, maxChunkSize)
+  for block in blocks:
+    yield from chunker.feed(block)
+  yield from chunker.finish()
+
+def splitText(text, chunkSize=defaultChunkSize):
+  """
+  This method, given a text, splits it into a list of pieces which can be tokenised independently.
+
+  Parameters
+  ----------
+  text: string
+    The text to split.
+  chunkSize: int
+    The minimum size of each piece, other than the last.
+
+  Returns
+  -------
+  list
+    The pieces of the text, in order.
+  """
+  return list(iterateChunks(text, chunkSize))
@@ -5,15 +5,16 @@ Testing word tokenisation of a large natural language text using NLTK.
 
 Sample Data used: https://cy.wikipedia.org/wiki/COVID-19
 
+The page's text is pulled out as it downloads, by a streaming extractor (see htmlText.py), and tokenised a piece at a time (see streamingPipeline.py), so the page's tree is never built.
+
 Authors
 -------
   Jesse Phillips <james@jamesphillipsuk.com>
 
 """
-import nltk # Natural Language Processing Toolkit
 import urllib.request # Python Website Crawler
-from bs4 import BeautifulSoup # Python HTML Disassembler
-import string # String lib - used to remove punctuation
+import htmlText # Streaming HTML text extraction
+import streamingPipeline # Piecewise tokenisation and counting
 # nltk.download() # Open NLTK package Downloader
 def main():
   """
@@ -24,19 +25,12 @@ def main():
   """
   # get the page from the URL
   response = urllib.request.urlopen(urllib.request.Request(url='https://cy.wikipedia.org/wiki/COVID-19', headers={'User-Agent': 'Mozilla/5.0'}))
-  soup = BeautifulSoup(response.read(), 'html5lib') # parse it as HTML
-
-  # strip the contents of head, script, or style tags.
-  for erroneousData in soup(["head", "script", "style"]):
-    erroneousData.extract()
 
-  text = soup.get_text(strip = True) # Get the text from the HTML
-  tokens = nltk.tokenize.word_tokenize(text) # Tokenise the text
-  # Strip out punctuation tokens
-  tokItems = ["".join(j.lower() for j in i if j not in string.punctuation)
-    for i in tokens]
+  # Get the text from the HTML as it arrives, without the contents of head, script, or style tags.
+  text = htmlText.iterateText(streamingPipeline.readBlocks(response))
 
-  freq = nltk.FreqDist(tokItems) # Build the frequency data
+  # Tokenise the text, stripping out punctuation (engine set by NATLANG_TOKENISER), and build the frequency data
+  freq = streamingPipeline.streamFrequencyDistributionData(text)
   for key, value in freq.items():
     print(str(key) + ':' + str(value))
   freq.plot(cumulative=False) # Plot a frequency graph
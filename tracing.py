@@ -0,0 +1,317 @@
+"""
+tracing.py
+
+Named spans around the stages of a run, timed in every process of the pool, and exported as a Chrome trace with a summary table.
+
+Set the NATLANG_TRACE environment variable to a file path to turn tracing on, e.g.:
+  NATLANG_TRACE=trace.json python3 stemmingAndLemmatising/stem.py
+
+Each span records its wall time, CPU time, peak memory allocated (by tracemalloc, from its start) and, if the stage says, how many items it processed.  Every process appends its spans to its own file as they finish, so the pool's workers need no way of sending them back; when the run ends, the process which started it gathers them into NATLANG_TRACE (open it at chrome://tracing or https://ui.perfetto.dev) and prints a table of the time spent in each stage.
+tracemalloc slows everything it traces; set NATLANG_TRACE_MEMORY=0 to trace time only.
+
+With NATLANG_TRACE unset, span gives one shared object which does nothing, and traced gives back the function it is given, so tracing costs next to nothing when it's off.
+
+Usage:
+  with tracing.span("tokenise") as span:
+    tokens = nltk.word_tokenize(text)
+    span.items = len(tokens)
+
+  python3 tracing.py trace.json   Print the summary table of a trace.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import atexit # Exporting the trace at exit
+import json # Span and trace format
+import os # Filesystem paths and environment
+import sys # Command line arguments
+import threading # Spans nest per thread
+import time # time library
+
+# Where the trace is exported to.  Tracing is off if this isn't set.
+tracePath = os.environ.get("NATLANG_TRACE") or None
+enabled = tracePath is not None
+traceMemory = enabled and os.environ.get("NATLANG_TRACE_MEMORY", "1") != "0"
+
+# Each process's spans are written to a file of its own in here.
+spansPath = tracePath + ".spans" if enabled else None
+
+# The open spans of each thread, innermost last.
+openSpans = threading.local()
+
+# This process's span file, and the process it was opened in (a forked worker must open its own).
+spanFile = None
+spanFilePid = None
+
+class DisabledSpan:
+  '''
+  DisabledSpan
+
+  The span given when tracing is off.  It does nothing, and one is shared by every caller.
+  '''
+  items = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception):
+    return False
+
+disabledSpan = DisabledSpan()
+
+class Span:
+  '''
+  Span
+
+  A named stage of a run, timed from entering it to leaving it.  Set items to the number of things it processed, for throughput.
+  '''
+
+  def __init__(self, name, items=None):
+    '''
+    Constructor for a span.
+
+    Parameters
+    ----------
+    name: string
+      The name of the stage.
+    items: int
+      The number of items processed, if known before it starts.
+    '''
+    self.name = name
+    self.items = items
+
+  def __enter__(self):
+    '''
+    Starts the span.
+    '''
+    stack = openSpans.__dict__.setdefault("stack", [])
+    self.parent = stack[-1] if stack else None
+    stack.append(self)
+    if traceMemory:
+      self.startMemory = tracemalloc.get_traced_memory()[0]
+      self.highWater = self.startMemory # The highest a span inside this one reached, as each resets the peak.
+      tracemalloc.reset_peak()
+    self.start = time.time()
+    self.startWall = time.perf_counter()
+    self.startCpu = time.process_time()
+    return self
+
+  def __exit__(self, *exception):
+    '''
+    Ends the span, and records it.
+    '''
+    wall = time.perf_counter() - self.startWall
+    cpu = time.process_time() - self.startCpu
+    peak = None
+    if traceMemory:
+      highest = max(tracemalloc.get_traced_memory()[1], self.highWater)
+      peak = highest - self.startMemory
+      if self.parent is not None:
+        self.parent.highWater = max(self.parent.highWater, highest)
+    openSpans.stack.pop()
+    record({"name": self.name, "start": self.start, "wall": wall, "cpu": cpu, "peakBytes": peak, "items": self.items, "pid": os.getpid(), "tid": threading.get_ident(), "error": exception[0].__name__ if exception[0] else None})
+    return False
+
+def span(name, items=None):
+  """
+  This method gives a span for a stage, to use in a with statement.
+
+  Parameters
+  ----------
+  name: string
+    The name of the stage.
+  items: int
+    The number of items processed, if known before it starts.
+
+  Returns
+  -------
+  Span
+    The span, or the shared do-nothing span if tracing is off.
+  """
+  if not enabled:
+    return disabledSpan
+  return Span(name, items)
+
+def traced(name):
+  """
+  This method makes a decorator which wraps each call of a function in a span.
+
+  Parameters
+  ----------
+  name: string
+    The name of the stage.
+
+  Returns
+  -------
+  function
+    The decorator.  It gives back the function unchanged if tracing is off.
+  """
+  def decorate(function):
+    if not enabled:
+      return function
+    def wrapper(*arguments, **keywordArguments):
+      with Span(name):
+        return function(*arguments, **keywordArguments)
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+  return decorate
+
+def record(event):
+  """
+  This method appends a finished span to this process's span file.
+
+  Parameters
+  ----------
+  event: dict
+    The span.
+  """
+  global spanFile, spanFilePid
+  if spanFilePid != os.getpid():
+    os.makedirs(spansPath, exist_ok=True)
+    spanFile = open(os.path.join(spansPath, str(os.getpid()) + ".jsonl"), "a", encoding="utf-8")
+    spanFilePid = os.getpid()
+  spanFile.write(json.dumps(event) + "\n")
+  spanFile.flush() # Pool workers exit without running atexit, so nothing can wait in a buffer.
+
+def readSpans(path):
+  """
+  This method reads every span recorded by every process.
+
+  Parameters
+  ----------
+  path: string
+    The directory of span files.
+
+  Returns
+  -------
+  list
+    The spans, in order of starting.
+  """
+  spans = []
+  if os.path.isdir(path):
+    for name in sorted(os.listdir(path)):
+      if name.endswith(".jsonl"):
+        with open(os.path.join(path, name), "r", encoding="utf-8") as file:
+          spans.extend(json.loads(line) for line in file if line.strip())
+  spans.sort(key=lambda event: event["start"])
+  return spans
+
+def summarise(spans):
+  """
+  This method totals the spans of each stage, across every process.
+
+  Parameters
+  ----------
+  spans: list
+    The spans.
+
+  Returns
+  -------
+  dict
+    For each stage: how many spans, their total wall and CPU times, the highest peak memory of any of them, the items processed, and items per second of wall time.
+  """
+  summary = {}
+  for event in spans:
+    stage = summary.setdefault(event["name"], {"count": 0, "wall": 0.0, "cpu": 0.0, "peakBytes": None, "items": None, "itemsPerSecond": None})
+    stage["count"] += 1
+    stage["wall"] += event["wall"]
+    stage["cpu"] += event["cpu"]
+    if event["peakBytes"] is not None:
+      stage["peakBytes"] = max(stage["peakBytes"] or 0, event["peakBytes"])
+    if event["items"] is not None:
+      stage["items"] = (stage["items"] or 0) + event["items"]
+  for stage in summary.values():
+    if stage["items"] is not None and stage["wall"] > 0:
+      stage["itemsPerSecond"] = stage["items"] / stage["wall"]
+  return summary
+
+def printSummary(summary):
+  """
+  This method prints the summary of a trace as a table, the stages which took longest first.
+
+  Parameters
+  ----------
+  summary: dict
+    The summary, as summarise gives it.
+  """
+  print ("Stage".ljust(28) + "Count".rjust(7) + "Wall (s)".rjust(12) + "CPU (s)".rjust(12) + "Peak (MB)".rjust(12) + "Items".rjust(12) + "Items/s".rjust(14))
+  for name, stage in sorted(summary.items(), key=lambda item: item[1]["wall"], reverse=True):
+    peak = "-" if stage["peakBytes"] is None else format(stage["peakBytes"] / 1e6, ".1f")
+    items = "-" if stage["items"] is None else str(stage["items"])
+    rate = "-" if stage["itemsPerSecond"] is None else format(stage["itemsPerSecond"], ".0f")
+    print (name[:27].ljust(28) + str(stage["count"]).rjust(7) + format(stage["wall"], ".3f").rjust(12) + format(stage["cpu"], ".3f").rjust(12) + peak.rjust(12) + items.rjust(12) + rate.rjust(14))
+
+def export(path=None):
+  """
+  This method gathers every process's spans into a Chrome trace, and prints the summary table.
+
+  Parameters
+  ----------
+  path: string
+    The trace file.  NATLANG_TRACE if None.
+
+  Returns
+  -------
+  dict
+    The summary of the trace.
+  """
+  path = path or tracePath
+  spans = readSpans(path + ".spans")
+  events = []
+  for pid in sorted({event["pid"] for event in spans}):
+    events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": ("main " if pid == ownerPid else "worker ") + str(pid)}})
+  for event in spans:
+    events.append({
+      "name": event["name"], "cat": "stage", "ph": "X",
+      "ts": event["start"] * 1e6, "dur": event["wall"] * 1e6,
+      "pid": event["pid"], "tid": event["tid"],
+      "args": {key: event[key] for key in ["cpu", "peakBytes", "items", "error"] if event[key] is not None}
+    })
+  summary = summarise(spans)
+  temporaryPath = path + "." + str(os.getpid()) + ".tmp"
+  with open(temporaryPath, "w", encoding="utf-8") as file:
+    json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"summary": summary}}, file)
+  os.replace(temporaryPath, path)
+  print ("Trace of " + str(len(spans)) + " spans in " + str(len({event["pid"] for event in spans})) + " processes written to " + path)
+  printSummary(summary)
+  return summary
+
+def exportAtExit():
+  """
+  This method exports the trace when the process which turned tracing on exits.  Forked processes inherit the exit handler, so it checks.
+  """
+  if os.getpid() == ownerPid:
+    export()
+
+# The process which turned tracing on exports the trace.  Its environment is inherited by the processes it starts, so they know it isn't them.
+ownerPid = None
+if enabled:
+  if "NATLANG_TRACE_OWNER" not in os.environ:
+    os.environ["NATLANG_TRACE_OWNER"] = str(os.getpid())
+    if os.path.isdir(spansPath): # Spans from an earlier run.
+      for name in os.listdir(spansPath):
+        if name.endswith(".jsonl"):
+          os.remove(os.path.join(spansPath, name))
+    atexit.register(exportAtExit)
+  ownerPid = int(os.environ["NATLANG_TRACE_OWNER"])
+  if traceMemory:
+    import tracemalloc # Peak allocations
+    if not tracemalloc.is_tracing():
+      tracemalloc.start()
+
+def main():
+  """
+  Entrypoint: prints the summary table of a trace file.
+  """
+  if not sys.argv[1:]:
+    print(__doc__)
+    return
+  with open(sys.argv[1], "r", encoding="utf-8") as file:
+    printSummary(json.load(file)["otherData"]["summary"])
+
+if __name__ == "__main__":
+  main()
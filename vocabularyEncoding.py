@@ -0,0 +1,323 @@
+"""
+vocabularyEncoding.py
+
+Counting words as integers rather than as strings.
+
+A Vocabulary interns each distinct word once and gives it an integer id, so a list of millions of token strings becomes one compact numpy array of ids.  Frequencies are then a single vectorised bincount over that array, and the top N words (all that FreqDist.plot(100) or FreqDist.tabulate(10) look at) are found by partial selection rather than sorting the whole vocabulary.
+A FreqDist is only built when asked for, and then only of the words needed.
+
+Ids are given out in order of first appearance, so ties in the top N are broken the same way a FreqDist breaks them.
+
+Usage:
+  python3 vocabularyEncoding.py [source ...]   Compare memory per token and counting time against FreqDist.
+
+Each source is a path to a UTF-8 text file, or the name of a text in the corpus store (the four sample books by default).
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import numpy # Vectorised arrays
+import os # Filesystem paths
+import sys # Command line arguments
+import time # time library
+import tracemalloc # Memory measurement
+
+class Vocabulary:
+  '''
+  Vocabulary
+
+  Interns words, giving each distinct word an integer id in order of first appearance.
+  '''
+
+  def __init__(self):
+    '''
+    Constructor for the vocabulary.
+    '''
+    self.ids = {} # Word to id.
+    self.words = [] # Id to word.
+
+  def __len__(self):
+    '''
+    The number of distinct words in the vocabulary.
+    '''
+    return len(self.words)
+
+  def encode(self, tokItems):
+    '''
+    Converts a list of tokens into an array of ids, adding any new words to the vocabulary.
+
+    Parameters
+    ----------
+    tokItems: list
+      The tokens.
+
+    Returns
+    -------
+    numpy.ndarray
+      The ids of the tokens, as 32-bit integers.
+    '''
+    ids = self.ids
+    words = self.words
+    get = ids.get
+    encoded = numpy.empty(len(tokItems), dtype=numpy.int32)
+    for position, word in enumerate(tokItems):
+      wordId = get(word)
+      if wordId is None:
+        wordId = ids[word] = len(words)
+        words.append(word)
+      encoded[position] = wordId
+    return encoded
+
+  def decode(self, encoded):
+    '''
+    Converts an array of ids back into a list of tokens.
+
+    Parameters
+    ----------
+    encoded: numpy.ndarray
+      The ids.
+
+    Returns
+    -------
+    list
+      The tokens.
+    '''
+    words = self.words
+    return [words[wordId] for wordId in encoded.tolist()]
+
+class EncodedFrequencies:
+  '''
+  EncodedFrequencies
+
+  The frequency distribution of an array of word ids, held as an array of counts indexed by id.
+  '''
+
+  def __init__(self, vocabulary, counts):
+    '''
+    Constructor for the frequencies.
+
+    Parameters
+    ----------
+    vocabulary: Vocabulary
+      The vocabulary the ids belong to.
+    counts: numpy.ndarray
+      The count of each id.
+    '''
+    self.vocabulary = vocabulary
+    self.counts = counts
+
+  @classmethod
+  def fromEncoded(cls, vocabulary, encoded):
+    '''
+    Counts an array of ids.
+
+    Parameters
+    ----------
+    vocabulary: Vocabulary
+      The vocabulary the ids belong to.
+    encoded: numpy.ndarray
+      The ids.
+
+    Returns
+    -------
+    EncodedFrequencies
+      Their frequencies.
+    '''
+    return cls(vocabulary, numpy.bincount(encoded, minlength=len(vocabulary)))
+
+  @classmethod
+  def fromTokens(cls, tokItems, vocabulary=None):
+    '''
+    Encodes and counts a list of tokens.
+
+    Parameters
+    ----------
+    tokItems: list
+      The tokens.
+    vocabulary: Vocabulary
+      The vocabulary to encode with.  A new one is made if this is None.
+
+    Returns
+    -------
+    EncodedFrequencies
+      Their frequencies.
+    '''
+    if vocabulary is None:
+      vocabulary = Vocabulary()
+    return cls.fromEncoded(vocabulary, vocabulary.encode(tokItems))
+
+  @classmethod
+  def fromCounts(cls, words, counts, vocabulary=None):
+    '''
+    Builds frequencies from words which have already been counted.  A word may appear more than once, and its counts are added together (e.g. the counts of several word types which share a stem).
+
+    Parameters
+    ----------
+    words: list
+      The words.
+    counts: list
+      The count of each word.
+    vocabulary: Vocabulary
+      The vocabulary to encode with.  A new one is made if this is None.
+
+    Returns
+    -------
+    EncodedFrequencies
+      Their frequencies.
+    '''
+    if vocabulary is None:
+      vocabulary = Vocabulary()
+    encoded = vocabulary.encode(words)
+    totals = numpy.zeros(len(vocabulary), dtype=numpy.int64)
+    numpy.add.at(totals, encoded, numpy.asarray(counts, dtype=numpy.int64))
+    return cls(vocabulary, totals)
+
+  def N(self):
+    '''
+    The total number of tokens counted, as FreqDist.N().
+    '''
+    return int(self.counts.sum())
+
+  def B(self):
+    '''
+    The number of distinct words counted, as FreqDist.B().
+    '''
+    return int(numpy.count_nonzero(self.counts))
+
+  def keys(self):
+    '''
+    The words counted, in order of first appearance.
+    '''
+    words = self.vocabulary.words
+    return [words[wordId] for wordId in numpy.flatnonzero(self.counts).tolist()]
+
+  def values(self):
+    '''
+    The counts of the words, in the same order as keys().
+    '''
+    return self.counts[self.counts > 0].tolist()
+
+  def mostCommon(self, n):
+    '''
+    Finds the n most common words, as FreqDist.most_common(n), without sorting the whole vocabulary.
+
+    Parameters
+    ----------
+    n: int
+      How many words to find.
+
+    Returns
+    -------
+    list
+      (word, count) tuples, most common first.  Ties are broken by first appearance.
+    '''
+    counts = self.counts
+    n = min(n, self.B())
+    if n <= 0:
+      return []
+    threshold = numpy.partition(counts, len(counts) - n)[len(counts) - n] # The nth largest count.
+    candidates = numpy.flatnonzero(counts >= threshold) # Everything above it, and every tie with it.
+    order = numpy.lexsort((candidates, -counts[candidates]))[:n] # By count descending, then by id.
+    words = self.vocabulary.words
+    return [(words[wordId], int(counts[wordId])) for wordId in candidates[order].tolist()]
+
+  def toFreqDist(self, n=None):
+    '''
+    Converts the frequencies into a FreqDist.
+
+    Parameters
+    ----------
+    n: int
+      If given, only the n most common words are included, which is all FreqDist.plot(n) and FreqDist.tabulate(n) need.
+
+    Returns
+    -------
+    FreqDist
+      The frequency distribution.
+    '''
+    from nltk import FreqDist # Imported on first use; counting itself needs only numpy
+    if n is not None:
+      return FreqDist(dict(self.mostCommon(n)))
+    return FreqDist(dict(zip(self.keys(), self.values())))
+
+def tracedBytes(function, *arguments):
+  """
+  This method runs a function under tracemalloc, measuring how much memory its result holds on to.
+
+  Parameters
+  ----------
+  function: function
+    The function to run.
+  arguments: list
+    Its arguments.
+
+  Returns
+  -------
+  tuple
+    The result, and the bytes still allocated once the function has returned.
+  """
+  tracemalloc.start()
+  result = function(*arguments)
+  allocated = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return (result, allocated)
+
+def runTests(text):
+  """
+  This method compares the FreqDist path with the encoded path on a text.
+
+  Parameters
+  ----------
+  text: string
+    The text to tokenise and count.
+  """
+  import nltk # Natural Language Processing Toolkit
+  import wordTokenisers # Word tokenisation engines
+  tokItems, listBytes = tracedBytes(wordTokenisers.tokeniseText, text) # The list of token strings the FreqDist path counts.
+  tokenCount = max(len(tokItems), 1)
+
+  startTime = time.time()
+  freq = nltk.FreqDist(tokItems)
+  freqTime = time.time() - startTime
+  startTime = time.time()
+  expectedTopWords = freq.most_common(100)
+  freqTopTime = time.time() - startTime
+
+  vocabulary = Vocabulary()
+  startTime = time.time()
+  encoded = vocabulary.encode(tokItems)
+  encodeTime = time.time() - startTime
+  startTime = time.time()
+  encodedFreq = EncodedFrequencies.fromEncoded(vocabulary, encoded)
+  countTime = time.time() - startTime
+  startTime = time.time()
+  topWords = encodedFreq.mostCommon(100)
+  encodedTopTime = time.time() - startTime
+  if topWords != expectedTopWords:
+    print ("  WARNING: the encoded top 100 differs from FreqDist's.")
+  encodedBytes = encoded.nbytes + sum(sys.getsizeof(word) for word in vocabulary.words) + sys.getsizeof(vocabulary.words) + sys.getsizeof(vocabulary.ids)
+
+  print ("  FreqDist build time: \t", freqTime, "\ttop 100 time: \t", freqTopTime)
+  print ("  Encoding time: \t", encodeTime, "\tbincount time: \t", countTime, "\ttop 100 time: \t", encodedTopTime)
+  print ("  Counting throughput (tokens/s): \tFreqDist: \t", tokenCount / max(freqTime, 1e-9), "\tbincount: \t", tokenCount / max(countTime, 1e-9))
+  print ("  Bytes per token: \tlist of strings: \t", listBytes / tokenCount, "\tid array and vocabulary: \t", encodedBytes / tokenCount)
+
+def main():
+  """
+  Entrypoint: benchmarks both paths on each source given on the command line.
+  """
+  import corpusStore # Offline corpus store
+  for source in (sys.argv[1:] or ["kjv", "shakespeare", "timeMachine", "lesMiserables"]):
+    print ("Counting " + source + ": ")
+    if os.path.exists(source):
+      with open(source, "r", encoding="utf-8-sig", newline="") as file:
+        text = file.read()
+    else:
+      text = corpusStore.loadText(source)
+    runTests(text)
+
+if __name__ == "__main__":
+  main()
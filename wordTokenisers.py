@@ -0,0 +1,279 @@
+"""
+wordTokenisers.py
+
+Interchangeable word tokenisation engines, selectable by name, which all produce the scripts' usual output: NLTK's word_tokenize, lower-cased, with punctuation stripped out of every token.
+
+Engines:
+  nltk - word_tokenize, then a per-character join over every token.  This is what the scripts have always done.
+  fast - the same output, with tokenisation, lower-casing and punctuation stripping fused into one memoised step per distinct word.
+
+The fast engine still splits sentences with Punkt, but then splits each sentence on whitespace and looks every word up in a table of already-tokenised words.  The Treebank-style rules that word_tokenize applies are all local to a whitespace-separated word, except the handling of a sentence's final full stop, so each word only has to go through NLTK once per process.
+Words in the middle of a sentence are tokenised with a sentinel word after them so they see the same context they would in the sentence, and the end of each sentence is tokenised as it is.
+The one other rule sensitive to context, splitting off a closing single quote, only applies before a space; the rare sentence with a closing single quote before a line break is tokenised whole.
+
+The default engine is nltk, and can be changed with the NATLANG_TOKENISER environment variable.
+
+Usage:
+  python3 wordTokenisers.py [source ...]   Check the engines give identical tokens on each text, and time them.
+
+Each source is a path to a UTF-8 text file, or the name of a text in the corpus store (the four sample books by default).
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import os # Filesystem paths and environment
+import re # Regular expressions
+import string # String lib - used to remove punctuation
+import sys # Command line arguments
+import time # time library
+
+# The engine the scripts use unless told otherwise.
+defaultEngine = os.environ.get("NATLANG_TOKENISER", "nltk")
+
+# Removes all punctuation from a string in one call.
+punctuationTable = str.maketrans("", "", string.punctuation)
+
+# Characters which may follow a sentence's final full stop and still have it split off.
+closingCharacters = "\"')]}>»”’"
+
+# A closing single quote followed by whitespace other than a space.  NLTK only splits a closing single quote off when a space follows it, so sentences containing this are tokenised whole.
+quoteBeforeOtherWhitespace = re.compile(r"'[^\S ]")
+
+# A word placed after a mid-sentence word, so it is tokenised as though more of the sentence follows.
+sentinel = "x"
+
+def nltkTokeniseText(text):
+  """
+  This method, given a text string containing words, will attempt to tokenise it using NLTK.
+
+  Parameters
+  ----------
+  text: string
+    The text to tokenise.
+
+  Returns
+  -------
+  list
+    The list of tokenised words.
+  """
+  from nltk.tokenize import word_tokenize # Imported on first use, so importing this module stays cheap
+  tokens = word_tokenize(text) # Tokenise the text
+  # Strip out punctuation tokens
+  tokItems = ["".join(j.lower() for j in i if j not in string.punctuation)
+    for i in tokens]
+  return tokItems
+
+def stripToken(token):
+  """
+  This method lower-cases a token and strips its punctuation, giving exactly the same result as the per-character join in nltkTokeniseText.
+
+  Parameters
+  ----------
+  token: string
+    The token.
+
+  Returns
+  -------
+  string
+    The lower-cased token, without punctuation.
+  """
+  stripped = token.translate(punctuationTable)
+  if "Σ" in stripped: # str.lower() turns a word-final capital sigma into 'ς', whereas lower-casing one character at a time always gives 'σ'.
+    return "".join(j.lower() for j in stripped)
+  return stripped.lower()
+
+class FastWordTokeniser:
+  '''
+  FastWordTokeniser
+
+  Tokenises text to the same output as nltkTokeniseText, tokenising each distinct word only once.
+  '''
+
+  def __init__(self):
+    '''
+    Constructor for the tokeniser.
+    '''
+    from nltk.tokenize import NLTKWordTokenizer
+    self.wordTokeniser = NLTKWordTokenizer() # The tokeniser word_tokenize uses on each sentence.
+    self.words = {} # Stripped tokens of each word, when in the middle of a sentence.
+    self.sentenceEnds = {} # Stripped tokens of each sentence ending.
+
+  def tokeniseWord(self, word):
+    '''
+    Tokenises a word which is followed by more of its sentence.
+
+    Parameters
+    ----------
+    word: string
+      The word, without whitespace.
+
+    Returns
+    -------
+    tuple
+      The word's lower-cased tokens, without punctuation.
+    '''
+    tokens = self.wordTokeniser.tokenize(word + " " + sentinel)[:-1]
+    return tuple(stripToken(token) for token in tokens)
+
+  def tokeniseSentenceEnd(self, sentenceEnd):
+    '''
+    Tokenises the end of a sentence: its last word, plus anything after it made only of closing brackets and quotes.
+
+    Parameters
+    ----------
+    sentenceEnd: string
+      The end of the sentence, exactly as it is in the text.
+
+    Returns
+    -------
+    tuple
+      The lower-cased tokens, without punctuation.
+    '''
+    return tuple(stripToken(token) for token in self.wordTokeniser.tokenize(sentenceEnd))
+
+  def tokenise(self, text):
+    '''
+    Tokenises text.
+
+    Parameters
+    ----------
+    text: string
+      The text to tokenise.
+
+    Returns
+    -------
+    list
+      The list of tokenised words.
+    '''
+    tokItems = []
+    extend = tokItems.extend
+    words = self.words
+    sentenceEnds = self.sentenceEnds
+    from nltk.tokenize import sent_tokenize
+    for sentence in sent_tokenize(text):
+      sentenceWords = sentence.split()
+      if not sentenceWords:
+        continue
+      if "'" in sentence and quoteBeforeOtherWhitespace.search(sentence):
+        extend(stripToken(token) for token in self.wordTokeniser.tokenize(sentence))
+        continue
+      last = len(sentenceWords) - 1
+      while last > 0 and sentenceWords[last].strip(closingCharacters) == "":
+        last -= 1 # The final full stop rule reaches past any trailing closing brackets and quotes.
+      for index in range(last):
+        word = sentenceWords[index]
+        tokens = words.get(word)
+        if tokens is None:
+          tokens = words[word] = self.tokeniseWord(word)
+        extend(tokens)
+      if last == len(sentenceWords) - 1:
+        sentenceEnd = sentenceWords[last]
+      else:
+        sentenceEnd = sentence[sentence.rindex(sentenceWords[last]):] # Keep the original whitespace, which the rule is sensitive to.
+      tokens = sentenceEnds.get(sentenceEnd)
+      if tokens is None:
+        tokens = sentenceEnds[sentenceEnd] = self.tokeniseSentenceEnd(sentenceEnd)
+      extend(tokens)
+    return tokItems
+
+# One tokeniser per process, so its tables of words carry over between texts.
+fastWordTokeniser = None
+
+def fastTokeniseText(text):
+  """
+  This method, given a text string containing words, will tokenise it to the same output as nltkTokeniseText, using the fast engine.
+
+  Parameters
+  ----------
+  text: string
+    The text to tokenise.
+
+  Returns
+  -------
+  list
+    The list of tokenised words.
+  """
+  global fastWordTokeniser
+  if fastWordTokeniser is None:
+    fastWordTokeniser = FastWordTokeniser()
+  return fastWordTokeniser.tokenise(text)
+
+# The engines, by name.
+engines = {
+  "nltk": nltkTokeniseText,
+  "fast": fastTokeniseText
+}
+
+def tokeniseText(text, engine=None):
+  """
+  This method, given a text string containing words, will tokenise it with the named engine.
+
+  Parameters
+  ----------
+  text: string
+    The text to tokenise.
+  engine: string
+    The name of the engine (nltk, fast).  Defaults to defaultEngine.
+
+  Returns
+  -------
+  list
+    The list of tokenised words.
+  """
+  return engines[engine or defaultEngine](text)
+
+def verifyParity(text):
+  """
+  This method checks that every engine gives exactly the same tokens as the nltk engine, and times each of them.
+
+  Parameters
+  ----------
+  text: string
+    The text to check.
+
+  Returns
+  -------
+  boolean
+    True if every engine matched the nltk engine token for token.
+  """
+  startTime = time.time()
+  expectedTokens = nltkTokeniseText(text)
+  referenceTime = time.time() - startTime
+  print ("  nltk: \t", referenceTime, "\t", len(expectedTokens), "tokens")
+  matched = True
+  for name, engine in engines.items():
+    if name == "nltk":
+      continue
+    startTime = time.time()
+    tokItems = engine(text)
+    engineTime = time.time() - startTime
+    print ("  " + name + ": \t", engineTime, "\tspeedup: \t", referenceTime / engineTime)
+    if tokItems != expectedTokens:
+      matched = False
+      mismatch = next((i for i, (a, b) in enumerate(zip(tokItems, expectedTokens)) if a != b), min(len(tokItems), len(expectedTokens)))
+      print ("  MISMATCH at token " + str(mismatch) + ": " + str(tokItems[mismatch - 5:mismatch + 5]) + " should be " + str(expectedTokens[mismatch - 5:mismatch + 5]))
+  return matched
+
+def main():
+  """
+  Entrypoint: checks the engines against each other on each source given on the command line.
+  """
+  import corpusStore # Offline corpus store
+  sources = sys.argv[1:] or ["kjv", "shakespeare", "timeMachine", "lesMiserables"]
+  allMatched = True
+  for source in sources:
+    print ("Checking " + source + ": ")
+    if os.path.exists(source):
+      with open(source, "r", encoding="utf-8-sig", newline="") as file:
+        text = file.read()
+    else:
+      text = corpusStore.loadText(source)
+    allMatched = verifyParity(text) and allMatched
+  print ("All engines match." if allMatched else "Engines differ!")
+  sys.exit(0 if allMatched else 1)
+
+if __name__ == "__main__":
+  main()
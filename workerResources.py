@@ -0,0 +1,290 @@
+"""
+workerResources.py
+
+Loading NLTK's heavy resources once per process, and a long-lived pool of worker processes which have them preloaded.
+
+The scripts used to create their resources inside the function each pool task runs: the stopword list, the stemmers, the WordNet lemmatiser, and the Punkt and perceptron tagger models which word_tokenize and pos_tag load lazily.  Every task paid for that again.
+Here, each resource is loaded the first time it is asked for and kept for the life of the process, and getPool() gives a pool whose workers load them all as they start, which is reused for every text and every stage of a run.
+
+Usage:
+  python3 workerResources.py   Measure first-task latency and per-task overhead, with and without preloading.
+
+Authors
+-------
+  Jesse Phillips <james@jamesphillipsuk.com>
+
+"""
+
+import atexit # Closing the pool at exit
+import multiprocessing # multithreading
+import os # The number of CPUs
+import time # time library
+import warnings # Warning of resources the shared pool didn't preload
+
+# The resources loaded so far in this process, by name.
+resources = {}
+
+def loadStopWords():
+  """
+  This method loads the English stopwords.
+
+  Returns
+  -------
+  frozenset
+    The stopwords, lower-cased.
+  """
+  from nltk.corpus import stopwords
+  return frozenset(word.lower() for word in stopwords.words('english'))
+
+def loadPunkt():
+  """
+  This method loads the Punkt sentence tokeniser model which word_tokenize uses, by tokenising a sentence.  NLTK caches the model from then on.
+
+  Returns
+  -------
+  boolean
+    True, once loaded.
+  """
+  import nltk
+  nltk.tokenize.word_tokenize("Warm up the tokeniser.")
+  return True
+
+def loadLemmatiser():
+  """
+  This method loads the WordNet lemmatiser, and WordNet itself (which would otherwise load on the first word lemmatised).
+
+  Returns
+  -------
+  WordNetLemmatizer
+    The lemmatiser.
+  """
+  from nltk.stem import WordNetLemmatizer
+  lemmatiser = WordNetLemmatizer()
+  lemmatiser.lemmatize("warming")
+  return lemmatiser
+
+def loadTagger():
+  """
+  This method loads the averaged perceptron tagger.  Its tag method gives the same results as nltk.pos_tag.
+
+  Returns
+  -------
+  PerceptronTagger
+    The tagger.
+  """
+  from nltk.tag.perceptron import PerceptronTagger
+  return PerceptronTagger()
+
+def loadSnowball():
+  """
+  This method creates the English Snowball stemmer.
+
+  Returns
+  -------
+  SnowballStemmer
+    The stemmer.
+  """
+  from nltk.stem import SnowballStemmer
+  return SnowballStemmer("english")
+
+def loadPorter():
+  """
+  This method creates the Porter stemmer.
+
+  Returns
+  -------
+  PorterStemmer
+    The stemmer.
+  """
+  from nltk.stem import PorterStemmer
+  return PorterStemmer()
+
+def loadLancaster():
+  """
+  This method creates the Lancaster stemmer.
+
+  Returns
+  -------
+  LancasterStemmer
+    The stemmer.
+  """
+  from nltk.stem import LancasterStemmer
+  return LancasterStemmer()
+
+# How to load each resource, by name.
+loaders = {
+  "stopwords": loadStopWords,
+  "punkt": loadPunkt,
+  "lemmatiser": loadLemmatiser,
+  "tagger": loadTagger,
+  "snowball": loadSnowball,
+  "porter": loadPorter,
+  "lancaster": loadLancaster
+}
+
+def get(name):
+  """
+  This method gets a resource, loading it if this process hasn't yet.
+
+  Parameters
+  ----------
+  name: string
+    The name of the resource (stopwords, punkt, lemmatiser, tagger, snowball, porter, lancaster).
+
+  Returns
+  -------
+  object
+    The resource.
+  """
+  resource = resources.get(name)
+  if resource is None:
+    resource = resources[name] = loaders[name]()
+  return resource
+
+def initialiseWorker(names=None):
+  """
+  This method loads resources into this process, ready for the tasks it will be given.  It is the initialiser for getPool's workers.
+
+  Parameters
+  ----------
+  names: list
+    The names of the resources to load.  All of them if None.
+  """
+  for name in (names if names is not None else loaders):
+    get(name)
+
+# The pool shared by every stage of a run, how many workers it has, and the names of the resources they preload (None for all of them).
+sharedPool = None
+sharedPoolProcesses = None
+sharedPoolNames = None
+
+def getPool(names=None, processes=None):
+  """
+  This method gets the long-lived pool of worker processes, starting it on first use.  Its workers preload resources as they start.
+  Once the pool is running, its size can't change, so asking for a different number of workers is an error.  Asking for resources it didn't preload gives a warning: the workers still load them, but on first use, in the middle of a task.
+
+  Parameters
+  ----------
+  names: list
+    The names of the resources each worker should preload.  All of them if None.
+  processes: int
+    The number of workers.  One per CPU if None.
+
+  Returns
+  -------
+  multiprocessing.Pool
+    The pool.  Don't close it; it is closed when the program exits.
+  """
+  global sharedPool, sharedPoolProcesses, sharedPoolNames
+  if sharedPool is None:
+    sharedPool = multiprocessing.Pool(processes, initializer=initialiseWorker, initargs=(names,))
+    sharedPoolProcesses = processes if processes is not None else (os.cpu_count() or 1)
+    sharedPoolNames = None if names is None else set(names)
+    return sharedPool
+  if processes is not None and processes != sharedPoolProcesses:
+    raise ValueError("The shared pool is already running with " + str(sharedPoolProcesses) + " workers, not " + str(processes) + "; call closePool() first to start one of a different size.")
+  if sharedPoolNames is not None:
+    missing = [name for name in (names if names is not None else loaders) if name not in sharedPoolNames]
+    if missing:
+      warnings.warn("The shared pool's workers didn't preload " + ", ".join(missing) + "; they will load on first use in each worker.", RuntimeWarning, stacklevel=2)
+      sharedPoolNames.update(missing) # Only warned about once.
+  return sharedPool
+
+def closePool():
+  """
+  This method closes the long-lived pool, waiting for its workers to finish.
+  """
+  global sharedPool, sharedPoolProcesses, sharedPoolNames
+  if sharedPool is not None:
+    sharedPool.close()
+    sharedPool.join()
+    sharedPool = None
+    sharedPoolProcesses = None
+    sharedPoolNames = None
+
+atexit.register(closePool)
+
+def coldTask(text):
+  """
+  This method does a small task the way the scripts used to, creating every resource inside the task.
+
+  Parameters
+  ----------
+  text: string
+    A sentence.
+
+  Returns
+  -------
+  int
+    The number of tagged words which aren't stopwords.
+  """
+  import nltk
+  from nltk.corpus import stopwords
+  from nltk.stem import WordNetLemmatizer
+  stopWords = set(stopwords.words('english'))
+  lem = WordNetLemmatizer()
+  taggedWords = nltk.pos_tag(nltk.word_tokenize(text))
+  return len([lem.lemmatize(word) for word, tag in taggedWords if word.lower() not in stopWords])
+
+def warmTask(text):
+  """
+  This method does the same small task as coldTask, using this process's preloaded resources.
+
+  Parameters
+  ----------
+  text: string
+    A sentence.
+
+  Returns
+  -------
+  int
+    The number of tagged words which aren't stopwords.
+  """
+  import nltk
+  stopWords = get("stopwords")
+  lem = get("lemmatiser")
+  taggedWords = get("tagger").tag(nltk.word_tokenize(text))
+  return len([lem.lemmatize(word) for word, tag in taggedWords if word.lower() not in stopWords])
+
+def measure(pool, task, repeats=50):
+  """
+  This method measures how long a pool takes to return its first task, and how long each task takes after that.
+
+  Parameters
+  ----------
+  pool: multiprocessing.Pool
+    The pool, freshly started.
+  task: function
+    The task to run.
+  repeats: int
+    How many tasks to average the per-task time over.
+
+  Returns
+  -------
+  tuple
+    The first-task latency, and the mean time per task after it, in seconds.
+  """
+  sentence = "The quick brown foxes were jumping over the lazy dogs."
+  startTime = time.time()
+  pool.apply(task, (sentence,))
+  firstTaskTime = time.time() - startTime
+  startTime = time.time()
+  for _ in range(repeats):
+    pool.apply(task, (sentence,))
+  return (firstTaskTime, (time.time() - startTime) / repeats)
+
+def main():
+  """
+  Entrypoint: compares a pool which creates resources in every task with one whose workers preload them.
+  """
+  with multiprocessing.Pool(1) as pool:
+    firstTaskTime, perTaskTime = measure(pool, coldTask)
+  print ("Before (resources created in each task): ")
+  print ("  First-task latency: \t", firstTaskTime, "\tPer-task time: \t", perTaskTime)
+  with multiprocessing.Pool(1, initializer=initialiseWorker) as pool:
+    firstTaskTime, perTaskTime = measure(pool, warmTask)
+  print ("After (resources preloaded once per worker): ")
+  print ("  First-task latency: \t", firstTaskTime, "\tPer-task time: \t", perTaskTime)
+
+if __name__ == "__main__":
+  main()